@@ -0,0 +1,69 @@
+"""
+Compares screen-frame codecs on synthetic content.
+Usage: python bench_codecs.py [frames]
+"""
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import config
+from modules.frame_codecs import ALL_CODECS, classify_frame, encode_image
+
+W, H = config.SCREEN_STREAM_SIZE
+
+
+def text_frame(i):
+    """IDE-like frame: flat background with lines of 'text'."""
+    img = Image.new("RGB", (W, H), (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    for row in range(0, H, 18):
+        width = 80 + (row * 7 + i * 13) % (W - 120)
+        draw.rectangle((20, row + 4, 20 + width, row + 12), fill=(200, 200, 200) if row % 36 else (120, 180, 250))
+    return img
+
+
+def photo_frame(i):
+    """Video-like frame: smooth gradients plus noise."""
+    rng = np.random.default_rng(i)
+    x, y = np.meshgrid(np.linspace(0, 1, W), np.linspace(0, 1, H))
+    base = np.stack([x * 255, y * 255, (x + y + i * 0.05) % 1 * 255], axis=2)
+    noisy = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(noisy, "RGB")
+
+
+def ui_frame(i):
+    """Dashboard-like frame: a few flat panels and buttons."""
+    img = Image.new("RGB", (W, H), (240, 240, 245))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, W, 48), fill=(40, 90, 160))
+    for n in range(12):
+        x, y = 40 + (n % 4) * 220, 90 + (n // 4) * 140
+        draw.rectangle((x, y, x + 190, y + 110), fill=(255, 255, 255), outline=(200, 200, 210))
+        draw.rectangle((x + 20, y + 70, x + 20 + (n * 37 + i * 5) % 150, y + 85), fill=(80, 170, 90))
+    return img
+
+
+SCENES = {"text": text_frame, "ui": ui_frame, "photo": photo_frame}
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    quality = config.SCREEN_STREAM_QUALITY
+    print(f"{frames} frames per scene at {W}x{H}, quality {quality}\n")
+    print(f"{'scene':8} {'class':6} {'codec':14} {'KB/frame':>9} {'ms/frame':>9}")
+
+    for scene, make in SCENES.items():
+        images = [make(i) for i in range(frames)]
+        frame_type = classify_frame(images[0])
+        for codec in ALL_CODECS:
+            start = time.perf_counter()
+            total = sum(len(encode_image(img, codec, quality)) for img in images)
+            elapsed = time.perf_counter() - start
+            print(f"{scene:8} {frame_type:6} {codec:14} {total / frames / 1024:9.1f} {elapsed / frames * 1000:9.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
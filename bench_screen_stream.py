@@ -0,0 +1,154 @@
+"""
+Benchmarks the screen streaming pipeline (grab -> tile diff -> resize/encode ->
+multipart part) on synthetic desktops, so it runs headless (no display, no mss).
+
+Usage:
+  python bench_screen_stream.py [--duration 5] [--scenes static,idle,scrolling,video]
+                                [--workers N] [--format jpeg] [--json out.json]
+                                [--baseline old.json] [--tolerance 0.25]
+
+With --baseline the run fails (exit 1) if any scene's FPS drops, or its p99
+latency / CPU per frame / bytes per frame grows, by more than --tolerance.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+import psutil
+
+import config
+from modules.synthetic_screen import SCENES, SyntheticScreen
+
+
+def _cpu_seconds(proc):
+    """CPU time of this process plus its children (the encoder pool workers)."""
+    total = sum(proc.cpu_times()[:2])
+    for child in proc.children(recursive=True):
+        try:
+            total += sum(child.cpu_times()[:2])
+        except psutil.Error:
+            pass
+    return total
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_scene(scene, duration, codec=None):
+    from modules.screen_stream import ScreenBroadcaster
+
+    screen = ScreenBroadcaster(grabber=lambda: SyntheticScreen(scene))
+    proc = psutil.Process()
+    latencies, sizes = [], []
+    first_frame, stop = threading.Event(), threading.Event()
+
+    def consume():
+        # Plays the role of the HTTP server draining /video_feed instantly
+        for frame, part in screen.stream_parts(codec, stop_event=stop):
+            if first_frame.is_set():
+                latencies.append(time.time() - frame.timestamp)
+                sizes.append(len(part))
+            first_frame.set()
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    # The first part pays for pool start-up and the initial full frame; don't time it
+    first_frame.wait(30)
+    cpu_start, started = _cpu_seconds(proc), time.time()
+    time.sleep(duration)
+    frames, nbytes = len(latencies), sum(sizes[:len(latencies)])
+    elapsed = time.time() - started
+    cpu = _cpu_seconds(proc) - cpu_start
+    latencies = latencies[:frames]
+    stop.set()
+    consumer.join()
+
+    # Let the capture thread notice nobody is watching, then free its slots
+    deadline = time.time() + 5
+    while not screen.is_idle and time.time() < deadline:
+        time.sleep(0.05)
+    capture = screen.stats()
+    screen.close()
+
+    return {
+        "scene": scene,
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "cpu_ms_per_frame": round(cpu / max(1, frames) * 1000, 2),
+        "cpu_percent": round(cpu / elapsed * 100, 1),
+        "bytes_per_frame": int(nbytes / max(1, frames)),
+        "kbps": round(nbytes * 8 / 1000 / elapsed, 1),
+        "last_seq": capture["last_seq"]
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions against a previous --json run."""
+    previous = {r["scene"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result["scene"])
+        if not old:
+            continue
+        # FPS should not drop; the others should not grow
+        if old["fps"] and result["fps"] < old["fps"] * (1 - tolerance):
+            regressions.append(f"{result['scene']}: fps {old['fps']} -> {result['fps']}")
+        for key in ("p99_ms", "cpu_ms_per_frame", "bytes_per_frame"):
+            if old[key] and result[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{result['scene']}: {key} {old[key]} -> {result[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless screen streaming benchmark")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scene")
+    parser.add_argument("--scenes", default=",".join(SCENES), help="Comma-separated: " + ", ".join(SCENES))
+    parser.add_argument("--workers", type=int, default=config.SCREEN_ENCODER_WORKERS, help="Encoder processes (0 = inline)")
+    parser.add_argument("--format", default=None, help="Codec for the multipart stream (default: JPEG)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    config.SCREEN_ENCODER_WORKERS = args.workers
+    codec = None
+    if args.format:
+        from modules.frame_codecs import negotiate_codec
+        codec = negotiate_codec(args.format)
+
+    print(f"Screen stream benchmark: {args.duration}s per scene, {args.workers} encoder worker(s), "
+          f"{config.SCREEN_STREAM_SIZE[0]}x{config.SCREEN_STREAM_SIZE[1]} @ {config.SCREEN_STREAM_FPS} fps target\n")
+    print(f"{'scene':10} {'frames':>7} {'fps':>7} {'p50 ms':>8} {'p99 ms':>8} {'cpu ms/f':>9} {'cpu %':>6} {'KB/frame':>9} {'kbps':>9}")
+
+    results = []
+    for scene in [s.strip() for s in args.scenes.split(",") if s.strip()]:
+        r = run_scene(scene, args.duration, codec)
+        results.append(r)
+        print(f"{r['scene']:10} {r['frames']:7} {r['fps']:7.1f} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f} "
+              f"{r['cpu_ms_per_frame']:9.1f} {r['cpu_percent']:6.1f} {r['bytes_per_frame'] / 1024:9.1f} {r['kbps']:9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(f"- {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
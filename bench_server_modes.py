@@ -0,0 +1,248 @@
+"""
+Compares the threading server (main.py, Flask-SocketIO) with the asyncio
+server (server_async.py, FastAPI + python-socketio on uvicorn) under many
+concurrent screen viewers. Each mode is started in a subprocess on a
+synthetic desktop (no display, no microphone), then hammered with
+/video_feed MJPEG readers, /current_frame pollers and /screen push
+subscribers while the server's threads, memory and CPU are sampled.
+
+Usage:
+  python bench_server_modes.py [--modes threading,async] [--streams 50]
+                               [--pollers 10] [--push 5] [--duration 10]
+                               [--scene scrolling] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+from modules.synthetic_screen import SCENES
+
+BOUNDARY = b'--frame\r\n'
+
+
+def serve(mode, port, scene):
+    """Child process: runs one server mode on a synthetic screen."""
+    import main
+    from modules.screen_stream import ScreenHub
+    from modules.synthetic_screen import SyntheticScreen
+
+    main.init_services()
+    main.screen_hub = ScreenHub(grabber=lambda: SyntheticScreen(scene))
+    main.screen_push.hub = main.screen_hub
+    if mode == 'async':
+        import server_async
+        server_async.run('127.0.0.1', port, voice=False)
+    else:
+        main.warm_shared_pool()
+        main.socketio.run(main.create_app(), host='127.0.0.1', port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def _mjpeg_client(port, counts, index, stop):
+    """Reads /video_feed and counts multipart parts."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    writer.write(f"GET /video_feed HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode())
+    await writer.drain()
+    tail = b''
+    try:
+        while not stop.is_set():
+            chunk = await asyncio.wait_for(reader.read(256 * 1024), 1.0)
+            if not chunk:
+                break
+            data = tail + chunk
+            counts[index] += data.count(BOUNDARY)
+            tail = data[-(len(BOUNDARY) - 1):]
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _poll_client(port, counts, index, stop):
+    """Polls /current_frame with If-None-Match like the Flutter app."""
+    etag = None
+    while not stop.is_set():
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            headers = f"If-None-Match: {etag}\r\n" if etag else ""
+            writer.write(f"GET /current_frame HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n{headers}Connection: close\r\n\r\n".encode())
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5.0)
+            writer.close()
+        except (asyncio.TimeoutError, OSError):
+            continue
+        head = response.split(b'\r\n\r\n', 1)[0].decode(errors='replace')
+        if ' 200 ' in head.split('\r\n', 1)[0]:
+            counts[index] += 1
+        for line in head.split('\r\n'):
+            if line.lower().startswith('etag:'):
+                etag = line.split(':', 1)[1].strip()
+        await asyncio.sleep(0.1)
+
+
+def _push_client(port, counts, index, stop):
+    """A /screen subscriber that acks every frame (runs on its own thread)."""
+    import socketio
+
+    client = socketio.Client(reconnection=False)
+
+    @client.on('frame', namespace='/screen')
+    def on_frame(data):
+        counts[index] += 1
+        if not stop.is_set():
+            client.emit('ack', {'credits': 1}, namespace='/screen')
+
+    try:
+        client.connect(f'http://127.0.0.1:{port}', namespaces=['/screen'], transports=['polling'])
+        client.emit('subscribe', {'mode': 'frame', 'credits': 2}, namespace='/screen')
+        stop.wait()
+    except Exception as e:
+        print(f"push client {index}: {e}")
+    finally:
+        client.disconnect()
+
+
+def run_mode(mode, args):
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--port', str(port), '--scene', args.scene],
+                              stdout=subprocess.DEVNULL if not args.verbose else None,
+                              stderr=subprocess.DEVNULL if not args.verbose else None)
+    try:
+        if not _wait_for_port(port):
+            raise RuntimeError(f"{mode} server did not start")
+        proc = psutil.Process(server.pid)
+        idle_threads = proc.num_threads()
+
+        streams, polls, pushes = [0] * args.streams, [0] * args.pollers, [0] * args.push
+        stop_push = threading.Event()
+        push_threads = [threading.Thread(target=_push_client, args=(port, pushes, i, stop_push), daemon=True)
+                        for i in range(args.push)]
+        for t in push_threads:
+            t.start()
+
+        samples = []
+
+        async def drive():
+            stop = asyncio.Event()
+            tasks = [asyncio.create_task(_mjpeg_client(port, streams, i, stop)) for i in range(args.streams)]
+            tasks += [asyncio.create_task(_poll_client(port, polls, i, stop)) for i in range(args.pollers)]
+            # Warm up (capture start, first frames), then measure
+            await asyncio.sleep(2.0)
+            start_counts = (sum(streams), sum(polls), sum(pushes))
+            cpu_start, started = sum(proc.cpu_times()[:2]), time.time()
+            while time.time() - started < args.duration:
+                await asyncio.sleep(0.5)
+                samples.append((proc.num_threads(), proc.memory_info().rss))
+            elapsed = time.time() - started
+            cpu = sum(proc.cpu_times()[:2]) - cpu_start
+            end_counts = (sum(streams), sum(polls), sum(pushes))
+            stop.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return elapsed, cpu, start_counts, end_counts
+
+        elapsed, cpu, start_counts, end_counts = asyncio.run(drive())
+        stop_push.set()
+        for t in push_threads:
+            t.join(5)
+
+        per_stream = [c / elapsed for c in streams]
+        return {
+            "mode": mode,
+            "streams": args.streams,
+            "pollers": args.pollers,
+            "push": args.push,
+            "stream_fps_total": round((end_counts[0] - start_counts[0]) / elapsed, 1),
+            "stream_fps_min": round(min(per_stream), 2) if per_stream else 0.0,
+            "poll_rps": round((end_counts[1] - start_counts[1]) / elapsed, 1),
+            "push_fps_total": round((end_counts[2] - start_counts[2]) / elapsed, 1),
+            "threads_idle": idle_threads,
+            "threads_peak": max(s[0] for s in samples),
+            "rss_mb_peak": round(max(s[1] for s in samples) / 1024 / 1024, 1),
+            "cpu_percent": round(cpu / elapsed * 100, 1)
+        }
+    finally:
+        # The encoder pool workers are children of the server; stop them too
+        try:
+            children = psutil.Process(server.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+        server.terminate()
+        for child in children:
+            try:
+                child.terminate()
+            except psutil.Error:
+                pass
+        _, alive = psutil.wait_procs(children, timeout=5)
+        for child in alive:
+            child.kill()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Threading vs asyncio server benchmark")
+    parser.add_argument("--modes", default="threading,async", help="Comma-separated: threading, async")
+    parser.add_argument("--streams", type=int, default=50, help="Concurrent /video_feed viewers")
+    parser.add_argument("--pollers", type=int, default=10, help="Concurrent /current_frame pollers")
+    parser.add_argument("--push", type=int, default=5, help="Concurrent /screen push subscribers")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per mode")
+    parser.add_argument("--scene", default="scrolling", choices=list(SCENES))
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    parser.add_argument("--serve", choices=["threading", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=5000, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.scene)
+        return
+
+    print(f"Server mode benchmark: {args.streams} streams, {args.pollers} pollers, {args.push} push "
+          f"subscribers, {args.duration}s, scene '{args.scene}'\n")
+    print(f"{'mode':10} {'fps total':>10} {'fps min':>8} {'poll/s':>7} {'push fps':>9} "
+          f"{'threads':>12} {'RSS MB':>7} {'cpu %':>6}")
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        r = run_mode(mode, args)
+        results.append(r)
+        print(f"{r['mode']:10} {r['stream_fps_total']:10.1f} {r['stream_fps_min']:8.2f} {r['poll_rps']:7.1f} "
+              f"{r['push_fps_total']:9.1f} {str(r['threads_idle']) + '->' + str(r['threads_peak']):>12} "
+              f"{r['rss_mb_peak']:7.1f} {r['cpu_percent']:6.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__))) # server_async serves web/ relative to the repo
+    main()
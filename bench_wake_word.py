@@ -0,0 +1,195 @@
+"""
+Measures the offline wake-word detector on recorded audio: how often it
+fires on background speech (false accepts per hour) and how long after the
+wake word ends it fires (detection latency), per sensitivity. Audio goes
+through the same VAD and frame path as the live microphone.
+
+  --positives DIR   WAVs that each contain the wake word once (not the
+                    enrolled recordings); each is played between stretches
+                    of background noise
+  --negatives WAV.. Long recordings without the wake word (TV, conversation)
+
+Without recordings, --synthetic builds a vowel-formant stand-in for the wake
+word, its templates and background babble, so the pipeline can be checked
+anywhere (the numbers then say nothing about real voices).
+
+Usage:
+  python bench_wake_word.py --positives clips/ --negatives room.wav [--templates DIR]
+                            [--sensitivity 0.3,0.5,0.7] [--json out.json]
+  python bench_wake_word.py --synthetic [--negative-minutes 10]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import config
+from modules.mic_capture import EnergyVAD, MicCapture
+from modules.wake_word import WakeWordDetector, read_wav
+
+RATE = config.MIC_SAMPLE_RATE
+
+# (F1, F2) formants of a few vowels
+VOWELS = {'a': (730, 1090), 'e': (530, 1840), 'i': (270, 2290), 'o': (570, 840), 'u': (300, 870), 'ae': (660, 1720)}
+KEYWORD = ['e', 'i', 's', 'a', 'i'] # "hey sami"-ish: vowels with a fricative
+
+
+def _segment(sound, seconds, pitch, rng):
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    if sound == 's':
+        noise = rng.normal(0, 1, n)
+        spectrum = np.fft.rfft(noise)
+        spectrum[:int(len(spectrum) * 0.45)] = 0 # High-passed hiss
+        return np.fft.irfft(spectrum, n) * 0.6
+    f1, f2 = VOWELS[sound]
+    f0 = pitch * (1 + 0.05 * np.sin(2 * np.pi * 4 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / RATE
+    wave = np.zeros(n)
+    for h in range(1, int(3500 / pitch)):
+        freq = h * pitch
+        gain = np.exp(-((freq - f1) / 90) ** 2) + 0.6 * np.exp(-((freq - f2) / 120) ** 2) + 0.02
+        wave += gain * np.sin(h * phase)
+    envelope = np.minimum(1, np.minimum(t, t[::-1]) / 0.02)
+    return wave * envelope / 3
+
+
+def synth_word(sounds, rng, speed=1.0, pitch=None):
+    pitch = pitch or rng.uniform(110, 220)
+    parts = [_segment(s, (0.09 if s == 's' else 0.14) / speed, pitch, rng) for s in sounds]
+    return np.concatenate(parts) * 8000
+
+
+def synth_babble(seconds, rng):
+    """Background speech: random vowel strings with pauses."""
+    out, length = [], 0
+    while length < seconds * RATE:
+        sounds = list(rng.choice(list(VOWELS) + ['s'], size=rng.integers(2, 7)))
+        word = synth_word(sounds, rng, speed=rng.uniform(0.8, 1.3)) * rng.uniform(0.4, 1.0)
+        pause = np.zeros(int(rng.uniform(0.05, 0.6) * RATE))
+        out += [word, pause]
+        length += len(word) + len(pause)
+    return np.concatenate(out)[:int(seconds * RATE)]
+
+
+def noise(seconds, rng, level=40):
+    return rng.normal(0, level, int(seconds * RATE))
+
+
+def run_stream(detector, audio):
+    """Feeds int16 `audio` through a fresh capture+VAD like the live mic; returns fire positions (samples)."""
+    capture = MicCapture(open_stream=lambda: None, vad=EnergyVAD())
+    fired, position = [], [0]
+
+    def on_frame(frame, speech):
+        position[0] += len(frame)
+        if detector.feed(frame, speech):
+            fired.append(position[0])
+
+    capture.listeners.append(on_frame)
+    detector.reset()
+    capture.feed(np.clip(audio, -32768, 32767).astype(np.int16).tobytes())
+    return fired
+
+
+def synthetic_set(args):
+    rng = np.random.default_rng(7)
+    templates = [synth_word(KEYWORD, rng, speed=rng.uniform(0.9, 1.1), pitch=140 + 10 * i) for i in range(5)]
+    positives = [synth_word(KEYWORD, rng, speed=rng.uniform(0.8, 1.25)) for _ in range(args.trials)]
+    negatives = [synth_babble(args.negative_minutes * 60, rng)]
+    return templates, positives, negatives
+
+
+def recorded_set(args):
+    templates = None
+    if args.templates:
+        templates = [read_wav(os.path.join(args.templates, n))[0]
+                     for n in sorted(os.listdir(args.templates)) if n.lower().endswith('.wav')]
+    positives = [read_wav(os.path.join(args.positives, n))[0]
+                 for n in sorted(os.listdir(args.positives)) if n.lower().endswith('.wav')] if args.positives else []
+    negatives = [read_wav(path)[0] for path in args.negatives or []]
+    return templates, positives, negatives
+
+
+def evaluate(detector, positives, negatives, rng):
+    latencies, hits = [], 0
+    audio_seconds, started = 0.0, time.perf_counter()
+    for clip in positives:
+        clip = np.asarray(clip, dtype=np.float64)
+        lead = noise(1.0, rng)
+        stream = np.concatenate([lead, clip, noise(1.5, rng)])
+        # Where the wake word itself ends (clips may carry trailing silence)
+        loud = np.flatnonzero(np.abs(clip) > np.abs(clip).max() * 0.1)
+        word_end = len(lead) + (loud[-1] + 1 if len(loud) else len(clip))
+        fired = [p for p in run_stream(detector, stream) if p >= len(lead)]
+        audio_seconds += len(stream) / RATE
+        if fired:
+            hits += 1
+            # Negative when it fires on the start of the last syllable
+            latencies.append((fired[0] - word_end) / RATE * 1000)
+
+    false_accepts, negative_seconds = 0, 0.0
+    for audio in negatives:
+        false_accepts += len(run_stream(detector, np.asarray(audio, dtype=np.float64)))
+        negative_seconds += len(audio) / RATE
+    audio_seconds += negative_seconds
+    elapsed = time.perf_counter() - started
+
+    return {
+        "sensitivity": detector.sensitivity,
+        "threshold": round(detector.threshold, 3),
+        "detected": f"{hits}/{len(positives)}",
+        "detection_rate": round(hits / len(positives), 3) if positives else None,
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+        "latency_ms_p90": round(float(np.percentile(latencies, 90)), 1) if latencies else None,
+        "false_accepts": false_accepts,
+        "negative_hours": round(negative_seconds / 3600, 3),
+        "false_accepts_per_hour": round(false_accepts / (negative_seconds / 3600), 2) if negative_seconds else None,
+        "realtime_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline wake word benchmark")
+    parser.add_argument("--templates", help="Enrolled WAVs (default: config.WAKE_TEMPLATE_DIR)")
+    parser.add_argument("--positives", help="Directory of WAVs containing the wake word")
+    parser.add_argument("--negatives", nargs="*", help="WAVs without the wake word")
+    parser.add_argument("--synthetic", action="store_true", help="Use generated stand-in audio")
+    parser.add_argument("--trials", type=int, default=40, help="Synthetic wake word clips")
+    parser.add_argument("--negative-minutes", type=float, default=10.0, help="Synthetic background babble")
+    parser.add_argument("--sensitivity", default="0.2,0.5,0.8", help="Comma-separated values to sweep")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        templates, positives, negatives = synthetic_set(args)
+    elif args.positives or args.negatives:
+        templates, positives, negatives = recorded_set(args)
+    else:
+        parser.error("give --positives/--negatives recordings or --synthetic")
+
+    detector = (WakeWordDetector(templates, rate=RATE) if templates is not None
+                else WakeWordDetector.from_directory(rate=RATE))
+    print(f"{len(detector.templates)} templates, {len(positives)} wake word clips, "
+          f"{sum(len(a) for a in negatives) / RATE / 60:.1f} min of background\n")
+    print(f"{'sens':>5} {'thresh':>7} {'detected':>9} {'p50 ms':>7} {'p90 ms':>7} {'FA':>4} {'FA/hour':>8} {'RTF':>7}")
+
+    results = []
+    for value in [float(v) for v in args.sensitivity.split(",") if v.strip()]:
+        detector.set_sensitivity(value)
+        r = evaluate(detector, positives, negatives, np.random.default_rng(1))
+        results.append(r)
+        fmt = lambda v: "-" if v is None else v
+        print(f"{r['sensitivity']:5.2f} {r['threshold']:7.3f} {r['detected']:>9} {fmt(r['latency_ms_p50']):>7} "
+              f"{fmt(r['latency_ms_p90']):>7} {r['false_accepts']:4} {fmt(r['false_accepts_per_hour']):>8} "
+              f"{fmt(r['realtime_factor']):>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,11 +13,12 @@ SPEECH_RATE = 175
 USE_FAST_TTS = False # If True, uses local pyttsx3. False = Default
 USE_LIFELIKE_TTS = True # Uses Edge-TTS (High Quality, Neural)
 EDGE_TTS_VOICE = "en-US-AriaNeural" # Options: en-US-AriaNeural, en-US-GuyNeural, en-IN-NeerjaNeural, etc.
+EDGE_TTS_RATE = "+0%" # Edge TTS speaking rate, e.g. "+10%" or "-5%"
 
 CONTINUOUS_MODE = True # Keeps listening for follow-ups
 CONTINUOUS_TIMEOUT = 8 # Seconds to wait for follow-up
 
-QUICK_RESPONSE_MODE = True # Default to True for speed
+QUICK_RESPONSE_MODE = True # Default to True for speed (each client session starts from this)
 
 # Quick Mode Prompt (Streamlined for speed)
 QUICK_SYSTEM_PROMPT = """
@@ -46,6 +47,87 @@ DEEPSEEK_API_KEY = "" # Leave empty if using Local Mode
 DEEPSEEK_MODEL = "deepseek-chat"
 
 VISION_MODEL_NAME = 'gemini-2.0-flash-exp' # Vision always needs Cloud for now
+VISION_MAX_EDGE = 1536 # Images are downscaled to this long edge before a vision call
+VISION_HASH_SIZE = 16 # Perceptual hash grid (16 -> 528 bits; screens need the detail)
+VISION_HASH_MAX_DISTANCE = 8 # Bits two hashes may differ by and still count as the same image
+VISION_CACHE_SIZE = 128 # Cached vision answers
+VISION_CACHE_TTL = 900 # Seconds a cached answer stays valid
+VISION_UPLOAD_MAX_MB = 20 # Largest /analyze_image upload
+VISION_MAX_PIXELS = 40_000_000 # Larger images are rejected before decoding
+VISION_UPLOAD_SPOOL_KB = 1024 # Raw uploads above this spill from memory to a temp file
+VISION_JOB_WORKERS = 2 # Concurrent vision calls for /analyze_image?async=1
+VISION_JOB_MAX_QUEUE = 8 # Queued + running jobs before new ones get HTTP 429
+VISION_JOB_HISTORY = 100 # Finished jobs kept for GET /jobs/<id>
+
+# Microphone Capture (always-on, feeds listen())
+MIC_ALWAYS_ON = True # Keep the mic open with VAD; False = open it per listen() like before
+MIC_DEVICE_INDEX = None # PyAudio input device (None = system default)
+MIC_SAMPLE_RATE = 16000
+MIC_FRAME_MS = 30 # VAD frame length (webrtcvad accepts 10, 20 or 30)
+MIC_VAD = 'auto' # 'webrtc' (pip install webrtcvad), 'energy', or 'auto' (webrtc if installed)
+MIC_VAD_AGGRESSIVENESS = 2 # webrtcvad 0-3, higher rejects more noise
+MIC_ENERGY_THRESHOLD = 300 # Minimum RMS the energy VAD counts as speech
+MIC_START_MS = 90 # Continuous speech needed to start an utterance
+MIC_PRE_ROLL = 0.3 # Seconds of audio kept from before speech was detected
+MIC_HANGOVER = 0.6 # Seconds of silence that end an utterance
+MIC_MIN_UTTERANCE = 0.2 # Shorter bursts (clicks, bumps) are dropped
+MIC_MAX_UTTERANCE = 10 # Longer speech is cut into pieces of this many seconds
+MIC_QUEUE_MAX = 4 # Utterances waiting for listen() before the oldest are dropped
+MIC_LISTEN_TIMEOUT = 5 # Seconds listen() waits for speech
+
+# Speech Recognition
+STT_BACKENDS = ['google', 'vosk'] # Fallback order: 'google' (online), 'vosk' (offline, needs VOSK_MODELS), 'stub' (tests)
+STT_LANGUAGE_BACKENDS = {} # Per-language order, e.g. {'en': ['vosk', 'google'], 'hi-in': ['google']}
+STT_TIMEOUT = 4 # Seconds before an online request counts as failed
+STT_FAILURE_LIMIT = 3 # Consecutive failures before a backend is tried last
+STT_RETRY_AFTER = 60 # Seconds it stays at the back of the line
+VOSK_MODELS = {} # Language (or prefix) -> model dir, e.g. {'en': 'models/vosk-model-small-en-us-0.15'} (alphacephei.com/vosk/models)
+STT_STUB_RESPONSES = [] # What the 'stub' backend hears
+
+# Command Handling
+COMMAND_WORKERS = 2 # Commands processed at once (history and modes are per session; speech is serialized)
+COMMAND_QUEUE_MAX = 10 # Waiting text commands before new ones get a busy reply
+
+# Client Sessions
+SESSION_IDLE_TIMEOUT = 24 * 3600 # Seconds a disconnected device keeps its modes in memory
+
+# UI Events
+UI_EMIT_WINDOW = 0.02 # Seconds to gather a burst of UI events into one flush
+UI_EMIT_MAX_PENDING = 200 # Queued conversation events before the oldest are dropped
+
+# System Stats
+STATS_INTERVAL = 2 # Seconds between samples / system_stats broadcasts
+STATS_HISTORY_SECONDS = 6 * 3600 # Kept in memory for /stats/history
+STATS_HISTORY_POINTS = 300 # Max points per series returned by /stats/history
+STATS_DEFAULT_RANGE = 900 # Seconds of history when ?range= is omitted
+STATS_DISK_PATH = None # Disk shown in the UI (None = the drive SAMi runs from)
+
+# Turn Tracing (/metrics)
+TRACE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60) # Histogram bucket bounds (seconds)
+TRACE_HISTORY = 50 # Finished turns kept for the UI waterfall
+
+# Screen Streaming (Live Screen view)
+SCREEN_STREAM_SIZE = (960, 540) # Max output resolution for whole-monitor streams
+SCREEN_REGION_MAX_SIZE = (1920, 1080) # Max output resolution for region/window streams (native up to this)
+SCREEN_MAX_SOURCES = 6 # Distinct monitors/regions/windows streamed at once
+SCREEN_STREAM_QUALITY = 70 # JPEG/WebP quality (0-100)
+SCREEN_STREAM_CODEC = "jpeg" # Default codec: jpeg, webp, webp-lossless, png-palette or auto
+SCREEN_TILE_CODEC = "auto" # Codec for /screen patches ("auto" = smallest per frame type)
+SCREEN_FLAT_MAX_COLORS = 512 # Frames with fewer colours count as flat UI/text
+SCREEN_CODEC_TRIAL_EVERY = 30 # Auto codec: re-measure all candidates every N frames
+SCREEN_STREAM_FPS = 25 # Capture rate while someone is watching
+SCREEN_STREAM_BUFFER = 4 # Frames kept in the shared ring buffer
+SCREEN_STREAM_IDLE_TIMEOUT = 3 # Seconds to keep capturing after the last /current_frame poll
+SCREEN_TILE_SIZE = 64 # Change-detection tile size (source pixels)
+SCREEN_TILE_MAX_DIRTY = 0.5 # Above this fraction of changed tiles, send a full frame instead of patches
+SCREEN_PUSH_CREDITS = 2 # Frames a /screen subscriber may have in flight before it acks
+SCREEN_PUSH_MAX_CREDITS = 8
+SCREEN_ENCODER_WORKERS = 2 # Encoder processes (0 = encode on the capture thread)
+SCREEN_ENCODER_SLOTS = 3 # Shared-memory frame slots in flight
+# Adaptive streaming bounds (per client, adjusted from measured write throughput)
+SCREEN_ADAPT_QUALITY = (30, 70) # (min, max) JPEG quality
+SCREEN_ADAPT_SCALE = (0.4, 1.0) # (min, max) fraction of SCREEN_STREAM_SIZE
+SCREEN_ADAPT_FPS = (2, 25) # (min, max) frames per second
 
 # Spotify Configuration
 SPOTIPY_CLIENT_ID = "" 
@@ -62,6 +144,41 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+# Image Proxy (/proxy_image)
+PROXY_CACHE_DIR = os.path.join(DATA_DIR, "image_cache")
+PROXY_CACHE_MAX_MB = 200 # On-disk LRU size
+PROXY_CACHE_TTL = 3600 # Seconds before revalidating when the upstream sends no max-age
+PROXY_MAX_IMAGE_MB = 25 # Upstream images larger than this are refused (or, sent without a length, not cached)
+PROXY_POOL_SIZE = 8 # Pooled upstream connections per host
+PROXY_TIMEOUT = 15 # Seconds to wait on the upstream (connect / between bytes)
+PROXY_THUMB_STEP = 64 # ?w= thumbnails are rounded up to this many px
+PROXY_THUMB_MAX = 2048
+
+# Image Generation Jobs
+IMAGE_JOB_WORKERS = 2 # Renders fetched in parallel
+IMAGE_JOB_TIMEOUT = 90 # Seconds to wait on Pollinations while it renders
+IMAGE_JOB_HISTORY = 100 # Finished image jobs ImageJobQueue remembers for GET /jobs/<id> (vision jobs: VISION_JOB_HISTORY)
+IMAGE_PROMPT_MEMO_FILE = os.path.join(DATA_DIR, "image_prompts.json")
+IMAGE_PROMPT_MEMO_SIZE = 500 # Enhanced prompts remembered
+
+# Wake Word (offline keyword spotting on the always-on mic in standby)
+WAKE_ENGINE = 'template' # 'template' = MFCC/DTW against your recordings (enroll_wake_word.py), 'stt' = cloud STT on every utterance
+WAKE_TEMPLATE_DIR = os.path.join(DATA_DIR, "wake_word") # Enrolled "hey sami" WAVs
+WAKE_SENSITIVITY = 0.5 # 0 = strict (fewer false wakes) .. 1 = loose (fewer misses)
+WAKE_CHECK_MS = 50 # How often the last stretch of audio is matched while someone is speaking
+WAKE_REFRACTORY = 1.5 # Seconds after a detection before the next can fire
+
+# TTS Audio Cache (repeated phrases play without a network call)
+TTS_CACHE_DIR = os.path.join(DATA_DIR, "tts_cache")
+TTS_CACHE_MAX_MB = 50 # On-disk LRU size
+TTS_CACHE_MEMORY_MB = 8 # Most recently played phrases kept in RAM
+TTS_CACHE_MAX_CHARS = 300 # Longer replies are one-offs and aren't cached
+TTS_PRERENDER = True # Synthesize the fixed phrases (greetings, status lines) at startup
+
+# Reply Streaming (LLM -> TTS)
+SPEECH_PIPELINE = True # Speak replies sentence by sentence while the local model is still generating
+SPEECH_CLAUSE_CHARS = 80 # A long sentence is spoken in clauses once this much of it is pending
+
 CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 VS_CODE_PATH = r"C:\Users\sagar\AppData\Local\Programs\Microsoft VS Code\Code.exe" # Adjust as needed
 
@@ -102,7 +219,7 @@ Style:
 Goal: maximize user happiness and engagement. Make it feel like a real hangout.
 """
 
-PERSONA = "professional" # Options: 'professional' (default), 'friendly'
+PERSONA = "professional" # Options: 'professional' (default), 'friendly', per session
 
 # Wake Word
 WAKE_WORD = "hey sami"
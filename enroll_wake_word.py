@@ -0,0 +1,61 @@
+"""
+Records the wake word for the offline detector (modules/wake_word.py).
+Say it once per prompt, the way you normally would; the recordings are
+saved as WAVs in config.WAKE_TEMPLATE_DIR and picked up on the next start.
+
+Usage: python enroll_wake_word.py [--count 5] [--replace]
+"""
+import argparse
+import os
+import queue
+
+import numpy as np
+
+import config
+from modules.mic_capture import MicCapture
+from modules.wake_word import WakeWordDetector, trim_silence, write_wav
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record the offline wake word")
+    parser.add_argument("--count", type=int, default=5, help="Recordings to take (at least 2, 5 or more is better)")
+    parser.add_argument("--replace", action="store_true", help="Delete the existing recordings first")
+    args = parser.parse_args()
+
+    os.makedirs(config.WAKE_TEMPLATE_DIR, exist_ok=True)
+    if args.replace:
+        for name in os.listdir(config.WAKE_TEMPLATE_DIR):
+            if name.lower().endswith('.wav'):
+                os.remove(os.path.join(config.WAKE_TEMPLATE_DIR, name))
+    existing = len([n for n in os.listdir(config.WAKE_TEMPLATE_DIR) if n.lower().endswith('.wav')])
+
+    capture = MicCapture().start()
+    taken = 0
+    while taken < args.count:
+        input(f"[{taken + 1}/{args.count}] Press Enter, then say '{config.WAKE_WORD}'...")
+        capture.clear()
+        try:
+            utterance = capture.get(timeout=5)
+        except queue.Empty:
+            print("  Heard nothing, try again.")
+            continue
+        if not utterance.wait(timeout=config.MIC_MAX_UTTERANCE + 1):
+            print("  Didn't catch that, try again.")
+            continue
+        samples = trim_silence(np.frombuffer(utterance.pcm, dtype=np.int16), capture.rate)
+        if len(samples) < capture.rate * 0.3:
+            print("  Too short, try again.")
+            continue
+        path = os.path.join(config.WAKE_TEMPLATE_DIR, f"wake_{existing + taken + 1:02d}.wav")
+        write_wav(path, samples, capture.rate)
+        taken += 1
+        print(f"  Saved {path} ({len(samples) / capture.rate:.2f}s)")
+    capture.stop()
+
+    detector = WakeWordDetector.from_directory()
+    print(f"\n{len(detector.templates)} recordings, match threshold {detector.threshold:.2f} "
+          f"at sensitivity {detector.sensitivity}. Tune WAKE_SENSITIVITY with bench_wake_word.py.")
+
+
+if __name__ == "__main__":
+    main()
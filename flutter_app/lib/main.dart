@@ -1,3 +1,5 @@
+import 'dart:math';
+import 'dart:typed_data';
 import 'package:flutter/material.dart';
 import 'package:speech_to_text/speech_to_text.dart' as stt;
 import 'package:url_launcher/url_launcher.dart';
@@ -6,6 +8,7 @@ import 'package:permission_handler/permission_handler.dart';
 import 'package:avatar_glow/avatar_glow.dart';
 import 'package:google_fonts/google_fonts.dart';
 import 'package:socket_io_client/socket_io_client.dart' as IO;
+import 'package:shared_preferences/shared_preferences.dart';
 
 void main() {
   runApp(const SamiApp());
@@ -54,6 +57,8 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
   IO.Socket? socket;
   String _backendUrl = "http://192.168.0.101:5000"; 
   bool _isConnected = false;
+  // Keeps this phone's conversation and modes separate from other clients across reconnects and restarts
+  String? _deviceToken;
 
   @override
   void initState() {
@@ -82,6 +87,7 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
     _speech.stop();
     _flutterTts.stop();
     _breathingController.dispose();
+    _stopScreenPush();
     socket?.dispose();
     super.dispose();
   }
@@ -140,8 +146,21 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
   // ... (dispose and other methods) ... Note: I need to be careful with replace context. 
   // Let's target _initSocket and listeners specifically.
 
-  void _initSocket() {
+  // Created once and stored, like the web client's localStorage token
+  Future<String> _loadDeviceToken() async {
+    if (_deviceToken != null) return _deviceToken!;
+    final prefs = await SharedPreferences.getInstance();
+    String? token = prefs.getString('sami-device');
+    if (token == null) {
+      token = 'phone-' + List.generate(16, (_) => Random.secure().nextInt(16).toRadixString(16)).join();
+      await prefs.setString('sami-device', token);
+    }
+    return _deviceToken = token;
+  }
+
+  Future<void> _initSocket() async {
     print("Connecting to $_backendUrl...");
+    final deviceToken = await _loadDeviceToken();
     
     // Cleanup existing socket if any
     socket?.disconnect();
@@ -150,6 +169,7 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
     socket = IO.io(_backendUrl, <String, dynamic>{
       'transports': ['websocket', 'polling'], // Allow polling for better stability
       'autoConnect': false,
+      'auth': {'device': deviceToken},
     });
     
     socket!.connect();
@@ -165,8 +185,8 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
     });
     
     socket!.on('conversation_update', (data) {
-       // Check for both 'model' (old) and 'sami' (new audio engine)
-       if (data != null && (data['role'] == 'model' || data['role'] == 'sami')) {
+       // Check for both 'model' (old) and 'sami' (new audio engine); skip streaming deltas, the full reply follows
+       if (data != null && (data['role'] == 'model' || data['role'] == 'sami') && data['text'] != null) {
           String reply = data['text'];
           setState(() { _text = reply; });
           _speak(reply); 
@@ -227,25 +247,56 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
   // View State
   String _currentView = 'avatar'; // 'avatar' or 'screen'
 
-  // Polling Timer for Live Screen
-  int _frameTimestamp = 0;
-  
+  // Live Screen frames pushed by the brain on the /screen namespace
+  IO.Socket? _screenSocket;
+  Uint8List? _frameBytes;
+
   void _toggleView(String view) {
     setState(() {
       _currentView = view;
-      if (view == 'screen') {
-        _updateFrameTimestamp();
-      }
     });
+    if (view == 'screen') {
+      _startScreenPush();
+    } else {
+      _stopScreenPush();
+    }
   }
 
-  void _updateFrameTimestamp() async {
-    while (_currentView == 'screen' && mounted) {
-      await Future.delayed(const Duration(milliseconds: 200)); // 5 FPS polling
-      setState(() {
-        _frameTimestamp = DateTime.now().millisecondsSinceEpoch;
+  void _startScreenPush() {
+    _stopScreenPush();
+    _screenSocket = IO.io('$_backendUrl/screen', <String, dynamic>{
+      'transports': ['websocket'],
+      'autoConnect': false,
+      'forceNew': true,
+    });
+    _screenSocket!.onConnect((_) {
+      // Two frames in flight at most; each ack returns one credit.
+      // Image.memory decodes all of these, so the server may pick the smallest.
+      _screenSocket!.emit('subscribe', {
+        'mode': 'frame',
+        'credits': 2,
+        'format': 'auto',
+        'accept': ['jpeg', 'webp', 'webp-lossless', 'png-palette'],
       });
-    }
+    });
+    _screenSocket!.on('frame', (data) {
+      if (data == null || !mounted) return;
+      final raw = data['data'];
+      final bytes = raw is ByteBuffer ? raw.asUint8List() : Uint8List.fromList(List<int>.from(raw));
+      setState(() => _frameBytes = bytes);
+      // Ack after the frame is painted so a slow phone never builds a backlog
+      WidgetsBinding.instance.addPostFrameCallback((_) {
+        _screenSocket?.emit('ack', {'seq': data['seq'], 'credits': 1});
+      });
+    });
+    _screenSocket!.connect();
+  }
+
+  void _stopScreenPush() {
+    _screenSocket?.emit('unsubscribe');
+    _screenSocket?.disconnect();
+    _screenSocket?.dispose();
+    _screenSocket = null;
   }
 
   @override
@@ -530,14 +581,15 @@ class _VoiceAssistantScreenState extends State<VoiceAssistantScreen> with Ticker
       ),
       child: ClipRRect(
         borderRadius: BorderRadius.circular(8),
-        child: _isConnected 
-          ? Image.network(
-              "$_backendUrl/current_frame?t=$_frameTimestamp",
-              fit: BoxFit.contain,
-              gaplessPlayback: true,
-              errorBuilder: (ctx, _, __) => const Center(child: Text("Connecting to Feed...", style: TextStyle(color: Colors.white54))),
-            )
-          : const Center(child: Text("OFFLINE", style: TextStyle(color: Colors.red))),
+        child: !_isConnected
+          ? const Center(child: Text("OFFLINE", style: TextStyle(color: Colors.red)))
+          : _frameBytes == null
+            ? const Center(child: Text("Connecting to Feed...", style: TextStyle(color: Colors.white54)))
+            : Image.memory(
+                _frameBytes!,
+                fit: BoxFit.contain,
+                gaplessPlayback: true,
+              ),
       ),
     );
   }
@@ -5,158 +5,284 @@ import os
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit
+from flask import Blueprint, Flask, render_template, request
+from flask_socketio import SocketIO, emit, join_room
 import threading
 import time
-from modules.voice_engine import VoiceEngine
-from modules.nova_engine import NovaEngine
+import queue
+from modules.screen_stream import CaptureSource, ScreenHub
+from modules.frame_codecs import CODEC_MIME, negotiate_codec
+from modules.frame_encoder import warm_shared_pool
+from modules.image_proxy import get_image_proxy
+from modules.image_upload import UploadTooLarge, open_image, read_image_upload
+from modules.vision_cache import prepare_image
+from modules.vision_jobs import VisionJobQueue
+from modules.command_executor import CommandExecutor, PRIORITY_VOICE
+from modules.ui_emitter import UIEmitter
+from modules.screen_push import ScreenPushManager
+from modules.stats_sampler import StatsSampler, parse_range
+from modules.turn_trace import get_tracer
+from modules.session_manager import get_session_manager
 import config
-import psutil
 import datetime
-import io
-import base64
-from PIL import Image
 from flask import Response, jsonify
 
 # Flask Setup
-app = Flask(__name__, template_folder="web/templates", static_folder="web/static")
-# Force threading mode to avoid eventlet/gevent compatibility issues on Py3.12
-socketio = SocketIO(app, async_mode='threading')
+# Nothing is built on import: on spawn platforms (Windows, macOS) every encoder worker
+# process re-imports this module. create_app() and init_services() do it for __main__.
+routes = Blueprint('sami', __name__)
+socketio = SocketIO()
+app = None
 
-# Global instances
+# Global instances (see init_services)
 voice = None
 nova = None
 is_listening_enabled = True # Default On
-
-@app.route('/')
+image_proxy = None
+vision_jobs = None
+ui_emitter = None
+command_executor = None
+tracer = None
+stats_sampler = None
+sessions = None
+screen_hub = None
+screen_push = None
+
+def create_app():
+    """The Flask app with the routes below and Socket.IO attached (run it with socketio.run)."""
+    global app
+    app = Flask(__name__, template_folder="web/templates", static_folder="web/static")
+    app.register_blueprint(routes)
+    # Force threading mode to avoid eventlet/gevent compatibility issues on Py3.12
+    socketio.init_app(app, async_mode='threading')
+    return app
+
+def init_services():
+    """Builds the shared services once; both servers call it before they start."""
+    global image_proxy, vision_jobs, ui_emitter, command_executor, tracer, stats_sampler, sessions, screen_hub, screen_push
+    if ui_emitter is not None:
+        return
+    image_proxy = get_image_proxy() # Disk-cached /proxy_image fetches
+    vision_jobs = VisionJobQueue(
+        run=lambda prompt, img: nova.process_vision(prompt, img) if nova else "SAMi is still starting up.",
+        on_result=lambda job, rooms: on_vision_result(job, rooms)
+    )
+    ui_emitter = UIEmitter(emit=lambda event, data, to: socket_emit(event, data, to))
+    command_executor = CommandExecutor() # Shared by text and voice commands
+    tracer = get_tracer() # Per-turn stage timings for /metrics and the UI waterfall
+    tracer.on_turn = lambda trace: ui_emitter.publish('turn_trace', trace)
+    stats_sampler = StatsSampler() # system_stats history rings + delta tracking
+    sessions = get_session_manager() # Per-client history partition and modes (sid or device token)
+    screen_hub = ScreenHub() # Shared screen capture, one worker per monitor/region/window
+    screen_push = ScreenPushManager(
+        screen_hub,
+        emit=lambda event, data, sid: socketio.emit(event, data, to=sid, namespace='/screen'),
+        spawn=socketio.start_background_task
+    )
+
+@routes.route('/')
 def index():
     return render_template('index.html')
 
-def gen_frames():
-    import mss
-    from PIL import Image
-    import numpy as np
-    
-    with mss.mss() as sct:
-        # Get monitor 1 bounds
-        monitor = sct.monitors[1]
-        
-        while True:
-            try:
-                # Capture screen using mss (very fast)
-                sct_img = sct.grab(monitor)
-                
-                # Convert to PIL Image
-                img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-                
-                # Resize for performance (optional, but good for streaming)
-                img = img.resize((960, 540)) 
-                
-                # Convert to byte stream
-                frame_buffer = io.BytesIO()
-                img.save(frame_buffer, format='JPEG', quality=70)
-                frame_bytes = frame_buffer.getvalue()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                
-                time.sleep(0.04) # Limit FPS (~25 FPS)
-            except Exception as e:
-                print(f"Screen capture error: {e}")
-                time.sleep(1)
-
-@app.route('/video_feed')
+# Both screen endpoints accept ?monitor=N, ?region=x,y,w,h (on that monitor) or ?window=<title>,
+# plus ?format=jpeg|webp|webp-lossless|png-palette|auto
+@routes.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-
-@app.route('/current_frame')
+    try:
+        screen = screen_hub.get(CaptureSource.from_args(request.args))
+        # MJPEG viewers (<img> tags) stay on JPEG unless they ask for a format
+        codec = None
+        if request.args.get('format'):
+            codec = negotiate_codec(request.args.get('format'), request.headers.get('Accept'))
+    except ValueError as e:
+        return f"Bad screen source: {e}", 400
+    except RuntimeError as e:
+        return f"Error: {e}", 503
+    return Response(screen.stream(codec), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@routes.route('/current_frame')
 def current_frame():
     """Returns a single snapshot for the Flutter app polling."""
-    import mss
-    from PIL import Image
-    
     try:
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            sct_img = sct.grab(monitor)
-            img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-            
-        img = img.resize((960, 540)) # Optimize network
-        frame_buffer = io.BytesIO()
-        img.save(frame_buffer, format='JPEG', quality=60)
-        frame_buffer.seek(0)
-        return Response(frame_buffer, mimetype='image/jpeg')
+        screen = screen_hub.get(CaptureSource.from_args(request.args))
+        spec = negotiate_codec(request.args.get('format'), request.headers.get('Accept'))
+    except ValueError as e:
+        return f"Bad screen source: {e}", 400
+    except RuntimeError as e:
+        return f"Error: {e}", 503
+    try:
+        frame = screen.snapshot(codec=spec)
+        if frame is None:
+            return "Error: Screen capture unavailable", 503
+        codec, data = frame.encoded_as(spec)
+        # Unchanged screens keep the same sequence number -> 304 for If-None-Match
+        response = Response(data, mimetype=CODEC_MIME[codec])
+        response.set_etag(f"{frame.seq}-{codec}")
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept'
+        return response.make_conditional(request)
     except Exception as e:
         return f"Error: {e}", 500
 
-@app.route('/proxy_image')
+@routes.route('/monitors')
+def list_monitors():
+    """Monitors available for ?monitor=N (0 is all monitors combined)."""
+    try:
+        return jsonify({'monitors': screen_hub.monitors()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/proxy_image')
 def proxy_image():
-    """Proxies image requests to bypass CORS/Network issues."""
+    """Proxies image requests to bypass CORS/Network issues. ?w=<px> returns a thumbnail."""
     image_url = request.args.get('url')
     if not image_url:
         print("Proxy Error: No URL provided") 
         return "No URL provided", 400
-    
-    print(f"Proxying Image: {image_url}")
-    try:
-        import requests
-        # Fake a browser user agent to avoid blocking
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        resp = requests.get(image_url, headers=headers, timeout=15)
-        
-        if resp.status_code != 200:
-             print(f"Proxy Upstream Error: {resp.status_code}")
-             return f"Upstream Error: {resp.status_code}", 502
 
-        excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-        resp_headers = [(name, value) for (name, value) in resp.raw.headers.items()
-                   if name.lower() not in excluded_headers]
-        
-        response = Response(resp.content, resp.status_code, resp_headers)
-        return response
+    try:
+        width = request.args.get('w', type=int)
+        image = image_proxy.get(image_url, width=width if width and width > 0 else None)
+    except ValueError as e:
+        return f"Bad proxy request: {e}", 400
+    except RuntimeError as e:
+        print(f"Proxy Upstream Error: {e}")
+        return str(e), 502
     except Exception as e:
         print(f"Proxy Exception: {e}")
         return f"Proxy Error: {e}", 500
 
-@app.route('/analyze_image', methods=['POST'])
+    print(f"Proxying Image ({image.cache_status}): {image_url}")
+    response = Response(image.chunks, mimetype=image.content_type)
+    if image.length is not None:
+        response.content_length = image.length
+    response.set_etag(image.etag)
+    response.headers['Cache-Control'] = f'public, max-age={image.max_age}'
+    response.headers['X-Cache'] = image.cache_status
+    return response.make_conditional(request)
+
+@routes.route('/stats/history')
+def stats_history():
+    """Downsampled system/brain metrics: ?range=15m|6h|<seconds>&points=N."""
+    try:
+        seconds = parse_range(request.args.get('range'))
+    except ValueError as e:
+        return jsonify({'error': f"Bad range: {e}"}), 400
+    return jsonify(stats_sampler.history(seconds, request.args.get('points', type=int)))
+
+@routes.route('/metrics')
+def metrics():
+    """Prometheus text exposition of the turn/stage latency histograms."""
+    return Response(tracer.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@routes.route('/traces')
+def recent_traces():
+    """Most recent finished turns (stage waterfall data), newest last."""
+    return jsonify({'turns': tracer.recent(request.args.get('limit', 20, type=int))})
+
+@routes.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a background vision or image job (clients normally wait for the socket event)."""
+    job = vision_jobs.get(job_id) or (nova.images.get(job_id) if nova else None)
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@routes.route('/analyze_image', methods=['POST'])
 def analyze_image():
-    """Receives an image (upload or camera) and processes it with Vision."""
+    """
+    Receives an image (upload or camera) and processes it with Vision.
+    Accepts multipart/form-data ('image' file + 'message'), a raw image/* body
+    (?message=...) or the older JSON {"image": base64, "message": ...}.
+    With ?async=1 it answers 202 with a job id at once; the result follows as
+    a 'vision_result' event and on GET /jobs/<id>.
+    """
     global nova
+    upload = None
     try:
-        data = request.json
-        image_data = data.get('image') # Base64 string
-        message = data.get('message', 'What is in this image?')
-        
-        if not image_data:
-            return jsonify({'response': "No image received."}), 400
-
-        # Decode base64
-        if "base64," in image_data:
-            image_data = image_data.split("base64,")[1]
-            
-        img_bytes = base64.b64decode(image_data)
-        img = Image.open(io.BytesIO(img_bytes))
+        upload, message = read_image_upload(request)
+        message = message or 'What is in this image?'
+
+        # Header-only open, limits checked, then a single downscaling decode
+        img = prepare_image(open_image(upload))
+        upload.close()
+        upload = None
+
+        # ?sid= is the uploading page's Socket.IO id; the result only goes to its session
+        room = sessions.room_for_sid(request.args.get('sid'))
+        if request.args.get('async') in ('1', 'true'):
+            job = vision_jobs.submit(message, img, room)
+            return jsonify(job), 202
         
         # Process with Nova Vision
         response = nova.process_vision(message, img)
         
         # Speak response
-        threading.Thread(target=voice.speak, args=(response,)).start()
+        speak_in_background(response, to=room)
         
         return jsonify({'response': response})
 
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except queue.Full as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    except ValueError as e:
+        return jsonify({'response': str(e)}), 400
     except Exception as e:
         print(f"Image Analysis Error: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        if upload is not None:
+            upload.close()
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    # Clients that send auth={'device': token} keep their session across reconnects
+    # Each session has a room, so a text turn's updates reach only the tabs/devices it came from
+    join_room(sessions.connect(request.sid, auth).id)
+    # Later system_stats events only carry changes, so start new clients from the full picture
+    if stats_sampler.latest:
+        emit('system_stats', stats_sampler.latest)
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    sessions.disconnect(request.sid)
+
+# Push delivery of screen frames over Socket.IO (/screen namespace)
+@socketio.on('subscribe', namespace='/screen')
+def handle_screen_subscribe(data=None):
+    data = data or {}
+    try:
+        source = CaptureSource.from_args(data)
+        # Clients list the codecs they can decode in 'accept' (JPEG only if omitted)
+        codec = negotiate_codec(data.get('format'), accepted=data.get('accept') or ['jpeg'])
+        screen_push.subscribe(request.sid, mode=data.get('mode', 'frame'), credits=data.get('credits'),
+                              source=source, codec=codec)
+    except (ValueError, RuntimeError) as e:
+        emit('error', {'error': str(e)})
+
+@socketio.on('ack', namespace='/screen')
+def handle_screen_ack(data=None):
+    data = data or {}
+    screen_push.ack(request.sid, int(data.get('credits', 1)))
+
+@socketio.on('unsubscribe', namespace='/screen')
+def handle_screen_unsubscribe(data=None):
+    screen_push.unsubscribe(request.sid)
+
+@socketio.on('disconnect', namespace='/screen')
+def handle_screen_disconnect():
+    screen_push.unsubscribe(request.sid)
 
 @socketio.on('toggle_listening')
 def handle_toggle_listening(data):
+    apply_listening_action(data.get('action'))
+
+def apply_listening_action(action):
     global is_listening_enabled
     # Simple toggle logic or specific action
-    action = data.get('action')
     if action == 'start':
         is_listening_enabled = True
         print("Mic activated.")
@@ -171,6 +297,8 @@ def handle_toggle_listening(data):
         status = 'Listening...' if is_listening_enabled else 'Mic Off'
         notify_ui('status', {'status': status})
         notify_ui('mic_state', {'active': is_listening_enabled})
+    if voice:
+        voice.set_listening(is_listening_enabled) # Releases the mic while it is off
 
 @socketio.on('text_command')
 def handle_text_command(data):
@@ -179,92 +307,159 @@ def handle_text_command(data):
     print(f"Text Input Received: {text}")
     
     # Process using Nova Engine (same as voice)
-    # We run this in a background thread to avoid blocking the socket
-    threading.Thread(target=process_text_input, args=(text,)).start()
-
-def process_text_input(text):
+    # Queued on the command workers to avoid blocking the socket
+    turn = tracer.start_turn('text')
+    session = sessions.for_sid(request.sid)
+    join_room(session.id) # Already in it unless connect was missed
+    try:
+        command_executor.submit(process_text_input, text, turn, session)
+    except queue.Full:
+        tracer.finish(turn, 'busy')
+        print("Text command rejected: command queue is full")
+        notify_ui('conversation', {'role': 'sami', 'text': "I'm busy with other requests. Please try again in a moment.", 'busy': True},
+                  to=request.sid)
+        notify_ui('status', {'status': 'Busy'}, to=request.sid)
+
+def process_text_input(text, turn=None, session=None):
     global nova, voice
     if not nova: return
+    to = session.room if session else None
 
     # Notify UI
-    notify_ui('conversation', {'role': 'user', 'text': text})
-    notify_ui('status', {'status': 'Processing Text...'})
-    
-    # Process
-    response = nova.process(text) # Language defaults to English for text
+    notify_ui('conversation', {'role': 'user', 'text': text}, to=to)
+    notify_ui('status', {'status': 'Processing Text...'}, to=to)
     
-    # Respond
-    if response:
+    # Process (a local model's reply is spoken sentence by sentence while it is generated)
+    reply = voice.reply_stream(turn=turn, to=to) if config.SPEECH_PIPELINE else None
+    try:
+        response = nova.process(text, turn=turn, session=session,
+                                on_delta=reply.feed if reply else None) # Language defaults to English for text
+        
+        # Respond
         if isinstance(response, dict):
             # Rich response (Text + Image)
             text_resp = response.get('text', '')
             image_url = response.get('image')
             
             # Speak text
-            voice.speak(text_resp)
+            speak_reply(text_resp, turn=turn, reply=reply, to=to)
             
-            # Send to UI with image
-            notify_ui('conversation', {'role': 'sami', 'text': text_resp, 'image': image_url})
+            # Send to UI with image (or the job that will deliver it via 'image_ready')
+            notify_ui('conversation', {'role': 'sami', 'text': text_resp, 'image': image_url,
+                                       'job_id': response.get('job_id')}, to=to)
             
         else:
             # Simple text response
-            voice.speak(response)
+            speak_reply(response, turn=turn, reply=reply, to=to)
+    finally:
+        if reply:
+            reply.cancel() # Releases the speech lock if process() or speaking failed
     
-    notify_ui('status', {'status': 'Idle'})
-
-def notify_ui(event_type, data):
-    """Callback to send updates to the UI."""
-    socketio.emit(f'{event_type}_update', data)
-    time.sleep(0.01)
+    tracer.finish(turn, 'ok' if response else 'empty')
+    notify_ui('status', {'status': 'Idle'}, to=to)
+
+def speak_reply(text, language='en', turn=None, reply=None, to=None):
+    """Speaks a Nova reply, finishing `reply` (the ReplySpeech it was streamed into) if there is one."""
+    if reply:
+        reply.finish(text)
+    elif text:
+        voice.speak(text, language=language, turn=turn, to=to)
+
+def on_vision_result(job, rooms):
+    """
+    Delivers an async /analyze_image result to the sessions that submitted it
+    and speaks it. A job nobody is connected for is only on GET /jobs/<id>.
+    """
+    for room in rooms:
+        ui_emitter.publish('vision_result', job, room)
+    if job.get('response') and rooms:
+        speak_in_background(job['response'], to=tuple(rooms))
+
+def speak_in_background(text, to=None):
+    """voice.speak() on the command workers, for callers that must not wait for the speech."""
+    if not voice or not text:
+        return
+    try:
+        command_executor.submit(voice.speak, text, to=to)
+    except queue.Full:
+        print("Not speaking: command queue is full")
+
+def on_image_ready(job, rooms):
+    """Delivers a finished image job to the sessions that asked for it (everyone if rooms is None)."""
+    for room in rooms or [None]:
+        ui_emitter.publish('image_ready', job, room)
+
+def socket_emit(event, data, to=None):
+    """Transport for UI events. The asyncio server (server_async.py) swaps this out."""
+    socketio.emit(event, data, to=to)
+
+def notify_ui(event_type, data, to=None):
+    """Callback to send updates to the UI. Queued on the emitter thread, never blocks."""
+    ui_emitter.publish(f'{event_type}_update', data, to)
+
+def collect_system_stats():
+    """Snapshot for the system_stats event. CPU/RAM/disk and the brain's own usage go into the history rings."""
+    metrics = stats_sampler.sample()
+    
+    # Time & Date
+    now = datetime.datetime.now()
+    current_time = now.strftime("%I:%M %p")
+    current_date = now.strftime("%A, %b %d")
+    
+    # Weather Mock
+    weather = "25°C Clear" 
+    
+    return {
+        **metrics,
+        "time": current_time,
+        "date": current_date,
+        "weather": weather,
+        "stream": {"sources": screen_hub.stats(), "push": screen_push.stats()},
+        "vision_jobs": vision_jobs.stats(),
+        "commands": command_executor.stats(),
+        "ui_events": ui_emitter.stats(),
+        "sessions": sessions.stats(),
+        "mic": voice.capture.stats() if voice and voice.capture else None,
+        "stt": voice.stt.stats() if voice else None,
+        "tts_cache": voice.tts_cache.stats() if voice else None
+    }
 
 def emit_system_stats():
     """Background thread to emit system statistics."""
     while True:
         try:
-            # Memory
-            memory = psutil.virtual_memory()
-            ram_usage = memory.percent
-            
-            # CPU
-            cpu_usage = psutil.cpu_percent(interval=None)
-            
-            # Disk (C: drive)
-            try:
-                disk = psutil.disk_usage('C:\\')
-                disk_usage = disk.percent
-            except:
-                disk_usage = 0
-            
-            # Time & Date
-            now = datetime.datetime.now()
-            current_time = now.strftime("%I:%M %p")
-            current_date = now.strftime("%A, %b %d")
-            
-            # Weather Mock
-            weather = "25°C Clear" 
-            
-            stats = {
-                "ram": ram_usage,
-                "cpu": cpu_usage,
-                "disk": disk_usage,
-                "time": current_time,
-                "date": current_date,
-                "weather": weather
-            }
-            
-            socketio.emit('system_stats', stats)
-            time.sleep(2)
+            # Only fields that changed since the last broadcast; new clients get the rest on connect
+            changes = stats_sampler.changes(collect_system_stats())
+            if changes:
+                socket_emit('system_stats', changes)
+            time.sleep(config.STATS_INTERVAL)
         except Exception as e:
             print(f"Error fetching stats: {e}")
             time.sleep(5)
 
+# Said by the voice loop itself (see also NovaEngine's STATIC_REPLIES)
+STATIC_PHRASES = [
+    "SAMi online.",
+    "Yes? I'm listening.",
+    "Going to sleep.",
+    "I encountered an error.",
+    "Sorry, my speech service is down."
+]
+
 def run_voice_assistant():
     """Main voice loop running in a separate thread."""
     global voice, nova
+    # Imported here: the engines pull in every agent, which encoder worker processes must not
+    from modules.voice_engine import VoiceEngine
+    from modules.nova_engine import NovaEngine, STATIC_REPLIES
     
     # Initialize with callback
     voice = VoiceEngine(on_update=notify_ui)
-    nova = NovaEngine()
+    nova = NovaEngine(on_image_ready=on_image_ready)
+
+    if config.TTS_PRERENDER:
+        # Fixed phrases go into the TTS cache in the background; later runs find them on disk
+        threading.Thread(target=voice.prerender, args=(STATIC_PHRASES + STATIC_REPLIES,), daemon=True).start()
 
     time.sleep(1) # Allow UI to load
     voice.speak("SAMi online.")
@@ -274,6 +469,7 @@ def run_voice_assistant():
 
     current_lang = config.DEFAULT_LANG
     is_active = False
+    turn = None
 
     last_interaction_time = time.time()
     
@@ -289,9 +485,20 @@ def run_voice_assistant():
                 print(f"Waiting for wake word '{config.WAKE_WORD}'...")
                 notify_ui('status', {'status': 'Standby...'})
                 
-                command = voice.listen(language='en-in') 
+                if voice.wake:
+                    # Offline keyword spotting: nothing goes to STT until the wake word is heard
+                    if not voice.wait_for_wake(timeout=config.MIC_LISTEN_TIMEOUT):
+                        continue
+                    turn = tracer.start_turn('voice')
+                    command = voice.listen(language='en-in', turn=turn)
+                    heard_wake = True
+                else:
+                    # Every listen starts a traced turn; it only gets reported if something was said
+                    turn = tracer.start_turn('voice')
+                    command = voice.listen(language='en-in', turn=turn) 
+                    heard_wake = config.WAKE_WORD in command
                 
-                if config.WAKE_WORD in command:
+                if heard_wake:
                     is_active = True
                     last_interaction_time = time.time()
                     # Check if command was spoken WITH wake word
@@ -300,9 +507,11 @@ def run_voice_assistant():
                         print(f"One-shot command detected: {remaining_command}")
                         command = remaining_command # Set as command to process
                     else:
-                        voice.speak("Yes? I'm listening.", language='en')
+                        voice.speak("Yes? I'm listening.", language='en', turn=turn)
+                        tracer.finish(turn, 'wake')
                         continue 
                 else:
+                    tracer.discard(turn)
                     continue 
 
             # 2. Active Listening (Processing Commands)
@@ -316,7 +525,10 @@ def run_voice_assistant():
 
             if is_active and not command: 
                 # Listen for command
-                command = voice.listen(language=current_lang)
+                turn = tracer.start_turn('voice')
+                command = voice.listen(language=current_lang, turn=turn)
+                if not command:
+                    tracer.discard(turn)
                 if not command and config.CONTINUOUS_MODE:
                     # Silence in active mode -> check timeout next loop
                     continue
@@ -333,7 +545,8 @@ def run_voice_assistant():
 
             # Check for exit commands
             if "exit" in command or "stop" in command or "quit" in command or "go to sleep" in command:
-                voice.speak("Going to sleep.", language=current_lang)
+                voice.speak("Going to sleep.", language=current_lang, turn=turn)
+                tracer.finish(turn, 'sleep')
                 is_active = False
                 command = None
                 continue
@@ -343,32 +556,38 @@ def run_voice_assistant():
                 for lang_name, lang_code in config.LANGUAGES.items():
                     if f"speak in {lang_name}" in command or f"change language to {lang_name}" in command:
                         current_lang = lang_code
-                        voice.speak(f"Okay, switching to {lang_name}.", language=lang_code)
+                        voice.speak(f"Okay, switching to {lang_name}.", language=lang_code, turn=turn)
+                        tracer.finish(turn, 'language')
                         command = None 
                         break
 
                 if command:
                     # Process command via Nova Engine
-                    response = nova.process(command, language=current_lang)
-                    
-                    # Speak response
-                    if response:
+                    # Voice goes ahead of any queued text commands; a local model's reply is spoken as it streams
+                    reply = voice.reply_stream(current_lang, turn) if config.SPEECH_PIPELINE else None
+                    try:
+                        response = command_executor.submit(
+                            nova.process, command, language=current_lang, turn=turn,
+                            on_delta=reply.feed if reply else None, priority=PRIORITY_VOICE).result()
+                        
+                        # Speak response
                         if isinstance(response, dict):
                              # Rich response
                              text_resp = response.get('text', '')
                              image_url = response.get('image')
-                             voice.speak(text_resp, language=current_lang)
-                             notify_ui('conversation', {'role': 'sami', 'text': text_resp, 'image': image_url})
+                             speak_reply(text_resp, current_lang, turn, reply)
+                             notify_ui('conversation', {'role': 'sami', 'text': text_resp, 'image': image_url,
+                                                        'job_id': response.get('job_id')})
                         else:
-                             voice.speak(response, language=current_lang)
-                             # voice.speak handles the UI notification internally for text only, usually? 
-                             # Wait, checking voice engine implementation... 
-                             # If voice engine notifies UI, we might duplicate text log if we did it above.
-                             # But for images we NEED to send the image.
-                             
+                             speak_reply(response, current_lang, turn, reply)
+                    finally:
+                        if reply:
+                            reply.cancel() # Otherwise the error reply below would wait on the speech lock forever
+                    if response:
                         # In continuous mode, we stay active
                         last_interaction_time = time.time()
                     
+                    tracer.finish(turn, 'ok' if response else 'empty')
                     command = None # Reset for next turn
 
         except KeyboardInterrupt:
@@ -377,10 +596,16 @@ def run_voice_assistant():
         except Exception as e:
             print(f"An error occurred: {e}")
             voice.speak("I encountered an error.")
+            tracer.finish(turn, 'error')
             is_active = False
 
 if __name__ == "__main__":
     import webbrowser
+
+    # Encoder processes first, while this is still a single-threaded process
+    warm_shared_pool()
+    init_services()
+    create_app()
     
     # Start voice assistant thread
     assistant_thread = threading.Thread(target=run_voice_assistant)
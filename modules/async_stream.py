@@ -0,0 +1,179 @@
+import asyncio
+import time
+import weakref
+
+import config
+from modules.frame_codecs import CODEC_MIME
+from modules.screen_push import ScreenPushManager, ScreenPushSession, frame_payload
+from modules.stream_controller import AdaptiveStreamController
+
+
+class AsyncFrameFeed:
+    """
+    Bridges a ScreenBroadcaster into an asyncio event loop. One executor call
+    at a time waits on the broadcaster's condition variable and wakes every
+    coroutine waiting for a newer frame, so any number of async viewers of a
+    source cost one blocked thread instead of one each.
+    """
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self._frame = None
+        self._changed = asyncio.Event()
+        self._users = 0
+        self._pump = None
+
+    def attach(self, tiles=False, controller=None, codec=None):
+        self.broadcaster.attach(tiles=tiles, controller=controller, codec=codec)
+        self._users += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.get_running_loop().create_task(self._run())
+
+    def detach(self, tiles=False, controller=None, codec=None):
+        self._users = max(0, self._users - 1)
+        self.broadcaster.detach(tiles=tiles, controller=controller, codec=codec)
+
+    async def wait_for_frame(self, after_seq=0, timeout=1.0):
+        """Like ScreenBroadcaster.wait_for_frame, but awaitable. Returns None on timeout."""
+        deadline = time.time() + timeout
+        while self._frame is None or self._frame.seq <= after_seq:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self._frame
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        seq = self._frame.seq if self._frame else 0
+        while self._users > 0:
+            frame = await loop.run_in_executor(None, self.broadcaster.wait_for_frame, seq, 0.5)
+            if frame is None:
+                # Capture thread may have died on an error; bring it back
+                self.broadcaster.ensure_running()
+                continue
+            seq = frame.seq
+            self._frame = frame
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+
+_feeds = weakref.WeakKeyDictionary() # broadcaster -> AsyncFrameFeed
+
+
+def frame_feed(broadcaster):
+    """The shared AsyncFrameFeed of a broadcaster (call from the event loop)."""
+    feed = _feeds.get(broadcaster)
+    if feed is None:
+        feed = _feeds[broadcaster] = AsyncFrameFeed(broadcaster)
+    return feed
+
+
+async def stream_parts_async(broadcaster, codec=None):
+    """
+    ScreenBroadcaster.stream() for ASGI servers: yields MJPEG parts with the
+    same adaptive quality/rate control, without holding a thread per viewer.
+    """
+    feed = frame_feed(broadcaster)
+    controller = AdaptiveStreamController(broadcaster.size, codec or broadcaster.codec)
+    feed.attach(controller=controller)
+    try:
+        seq = 0
+        while True:
+            wait = controller.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            frame = await feed.wait_for_frame(seq, timeout=2.0)
+            if frame is None:
+                broadcaster.ensure_running()
+                continue
+            seq = frame.seq
+            part_codec, data = frame.encoded(controller.profile)
+            part = (b'--frame\r\n'
+                    b'Content-Type: ' + CODEC_MIME[part_codec].encode() + b'\r\n\r\n' + data + b'\r\n')
+
+            # We are resumed once the server has sent the part, as with the WSGI stream
+            write_started = time.time()
+            yield part
+            controller.record(len(part), time.time() - write_started, (broadcaster.latest() or frame).seq - seq)
+    finally:
+        # Runs when the client disconnects and the server closes the generator
+        feed.detach(controller=controller)
+
+
+class AsyncPushSession(ScreenPushSession):
+    """ScreenPushSession whose credit wait is awaitable. Only touched from the event loop."""
+
+    def __init__(self, sid, broadcaster, mode='frame', credits=None, codec=None):
+        super().__init__(sid, broadcaster, mode, credits, codec)
+        self._credit = asyncio.Event()
+
+    def grant(self, credits=1):
+        self.credits = min(config.SCREEN_PUSH_MAX_CREDITS, self.credits + max(0, credits))
+        if self.credits > 0:
+            self._credit.set()
+
+    def stop(self):
+        self._stopped = True
+        self._credit.set()
+
+    async def wait_for_credit(self, timeout=1.0):
+        if self.credits <= 0 and not self._stopped:
+            self._credit.clear()
+            try:
+                await asyncio.wait_for(self._credit.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.credits > 0 and not self._stopped
+
+    def spend_credit(self):
+        self.credits -= 1
+
+
+class AsyncScreenPushManager(ScreenPushManager):
+    """
+    ScreenPushManager for an asyncio Socket.IO server: each subscriber is a
+    task on the event loop and `emit(event, data, sid)` is a coroutine.
+    """
+
+    session_class = AsyncPushSession
+
+    def __init__(self, hub, emit):
+        super().__init__(hub, emit, spawn=self._spawn_task)
+        self._tasks = set()
+
+    def _spawn_task(self, target, *args):
+        task = asyncio.get_running_loop().create_task(target(*args))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, session):
+        tiles = session.mode == 'tiles'
+        broadcaster = session.broadcaster
+        feed = frame_feed(broadcaster)
+        feed.attach(tiles=tiles, codec=session.codec)
+        try:
+            while not session.stopped:
+                if not await session.wait_for_credit(timeout=1.0):
+                    continue
+                frame = await feed.wait_for_frame(session.last_seq, timeout=1.0)
+                if frame is None:
+                    broadcaster.ensure_running()
+                    continue
+                if session.stopped:
+                    break
+
+                payload = frame_payload(session, frame)
+                session.spend_credit()
+                session.last_seq = frame.seq
+                session.frames_sent += 1
+                await self._emit('frame', payload, session.sid)
+        except Exception as e:
+            print(f"Screen push error ({session.sid}): {e}")
+        finally:
+            feed.detach(tiles=tiles, codec=session.codec)
@@ -0,0 +1,105 @@
+import queue
+import threading
+
+# Edge TTS (and gTTS) send 24 kHz mono MP3
+TTS_SAMPLE_RATE = 24000
+
+
+class ChunkBuffer:
+    """
+    Bytes written by a producer (a TTS download) and read by a decoder on
+    another thread as they arrive. read() blocks until data is there and
+    returns b'' once the producer has closed it and everything was read.
+    """
+
+    def __init__(self):
+        self._chunks = queue.Queue()
+        self._pending = b''
+        self._closed = False
+
+    def write(self, data):
+        if data:
+            self._chunks.put(bytes(data))
+
+    def close(self):
+        self._chunks.put(None)
+
+    def read(self, num_bytes):
+        while not self._pending and not self._closed:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._closed = True
+            else:
+                self._pending = chunk
+        data, self._pending = self._pending[:num_bytes], self._pending[num_bytes:]
+        return data
+
+
+def decode_mp3(buffer, rate=TTS_SAMPLE_RATE, channels=1, frames=256):
+    """
+    Yields 16-bit PCM blocks of the MP3 in `buffer` (a ChunkBuffer) while it
+    is still arriving. Small blocks (256 frames, ~11 ms) let the first one
+    out after the first couple of MP3 frames.
+    """
+    import miniaudio
+
+    class Source(miniaudio.StreamableSource):
+        def read(self, num_bytes):
+            return buffer.read(num_bytes)
+
+    stream = miniaudio.stream_any(Source(), source_format=miniaudio.FileFormat.MP3,
+                                  output_format=miniaudio.SampleFormat.SIGNED16,
+                                  nchannels=channels, sample_rate=rate, frames_to_read=frames)
+    for block in stream:
+        yield block.tobytes()
+
+
+class AudioPlayer:
+    """
+    Plays 16-bit PCM through a PyAudio output stream that stays open between
+    phrases, so playback starts without device setup. `streaming` is False
+    when PyAudio or miniaudio (the MP3 decoder) is missing; callers then
+    fall back to pygame.
+    """
+
+    def __init__(self):
+        self._audio = None
+        self._stream = None
+        self._format = None
+        self._lock = threading.Lock()
+        try:
+            import miniaudio # noqa: F401
+            import pyaudio # noqa: F401
+            self.streaming = True
+        except ImportError:
+            self.streaming = False
+
+    def _output(self, rate, channels):
+        import pyaudio
+
+        if self._format != (rate, channels):
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            if self._audio is None:
+                self._audio = pyaudio.PyAudio()
+            self._stream = self._audio.open(format=pyaudio.paInt16, channels=channels, rate=rate, output=True)
+            self._format = (rate, channels)
+        return self._stream
+
+    def play(self, pcm_blocks, rate=TTS_SAMPLE_RATE, channels=1):
+        """Writes each block as it comes; returns when the last one has been handed to the device."""
+        with self._lock:
+            stream = None
+            for block in pcm_blocks:
+                if stream is None:
+                    stream = self._output(rate, channels)
+                stream.write(block)
+
+    def close(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+            if self._audio is not None:
+                self._audio.terminate()
+            self._stream = self._audio = self._format = None
@@ -0,0 +1,92 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import config
+
+# Lower runs first
+PRIORITY_VOICE = 0
+PRIORITY_TEXT = 10
+
+
+class CommandExecutor:
+    """
+    Runs assistant commands on a fixed set of worker threads fed from one
+    priority queue, so a burst of UI messages can't spawn unbounded threads
+    or pile onto the shared NovaEngine at once. Voice commands jump ahead of
+    queued text commands and are never rejected; text commands are refused
+    with queue.Full once COMMAND_QUEUE_MAX are waiting.
+    """
+
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or config.COMMAND_WORKERS
+        self.max_queue = max_queue or config.COMMAND_QUEUE_MAX
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count() # FIFO within a priority
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._waits = deque(maxlen=100) # Recent queue wait times (seconds)
+        self.completed = 0
+        self.rejected = 0
+        self._started = False # Workers start on the first submit, not on import of main
+
+    def _start_workers(self):
+        # Caller holds self._lock
+        if not self._started:
+            self._started = True
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, daemon=True, name=f"command-{i}").start()
+
+    def submit(self, fn, *args, priority=PRIORITY_TEXT, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a concurrent.futures.Future.
+        Raises queue.Full when a non-voice command finds the queue full.
+        """
+        with self._lock:
+            if priority > PRIORITY_VOICE and self._waiting >= self.max_queue:
+                self.rejected += 1
+                raise queue.Full("Command queue is full")
+            self._waiting += 1
+            self._start_workers()
+        future = Future()
+        self._queue.put((priority, next(self._order), time.time(), future, fn, args, kwargs))
+        return future
+
+    def _worker(self):
+        while True:
+            priority, _, queued_at, future, fn, args, kwargs = self._queue.get()
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+                self._waits.append(time.time() - queued_at)
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except Exception as e:
+                        print(f"Command error: {e}")
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+
+    def stats(self):
+        """Queue metrics for the system_stats event."""
+        with self._lock:
+            waits = sorted(self._waits)
+            waiting, running = self._waiting, self._running
+        return {
+            "waiting": waiting,
+            "running": running,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 1) if waits else 0.0
+        }
@@ -9,7 +9,8 @@ class DatabaseManager:
         self._create_tables()
 
     def _get_connection(self):
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+        # Several sessions write at once; wait for the lock instead of failing
+        return sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
 
     def _create_tables(self):
         with self._get_connection() as conn:
@@ -25,15 +26,25 @@ class DatabaseManager:
                 )
             """)
             
-            # Conversation History
+            # Conversation History (one partition per client session)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     role TEXT,
                     content TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    session_id TEXT NOT NULL DEFAULT 'local'
                 )
             """)
+
+            # Databases from before sessions: existing turns belong to the local session
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(history)")]
+            if 'session_id' not in columns:
+                cursor.execute("ALTER TABLE history ADD COLUMN session_id TEXT NOT NULL DEFAULT 'local'")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_session ON history (session_id, id)")
+
+            # Readers don't block the writer (persists in the database file)
+            cursor.execute("PRAGMA journal_mode=WAL")
             
             conn.commit()
 
@@ -63,22 +74,24 @@ class DatabaseManager:
             rows = cursor.fetchall()
             return {row[0]: row[1] for row in rows}
 
-    def add_history(self, role, content):
-        """Add a conversation turn."""
+    def add_history(self, role, content, session_id='local'):
+        """Add a conversation turn to a session's history."""
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO history (role, content) VALUES (?, ?)", (role, content))
+            cursor.execute("INSERT INTO history (role, content, session_id) VALUES (?, ?, ?)",
+                           (role, content, session_id))
             conn.commit()
             
             # Maintenance: Keep only last 50 entries to prevent infinite growth (optional for now, but good practice)
             # cursor.execute("DELETE FROM history WHERE id NOT IN (SELECT id FROM history ORDER BY id DESC LIMIT 50)")
             # conn.commit()
 
-    def get_history(self, limit=5):
-        """Get the last N history items."""
+    def get_history(self, limit=5, session_id='local'):
+        """Get the last N history items of a session."""
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT role, content FROM history ORDER BY id DESC LIMIT ?", (limit,))
+            cursor.execute("SELECT role, content FROM history WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                           (session_id, limit))
             rows = cursor.fetchall()
             # Return reversed so it is chronological
             return [{"role": row[0], "content": row[1]} for row in reversed(rows)]
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# A .tmp file untouched for this long is left over from a write that was cut off
+# (younger ones may still be written by another process sharing the directory)
+_STALE_TMP_SECONDS = 3600
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class DiskLRU:
+    """
+    Size-bounded LRU of the files in one directory, used by the image proxy
+    and the TTS cache. An entry is `<key><suffix>` (its size is what counts,
+    its mtime is its last access) plus optional side files `<key><extra>`
+    that are removed with it. Owners guard their own state with `lock`, so
+    it is one lock for both; `on_evict(key)` runs with it held.
+    """
+
+    def __init__(self, directory, max_bytes, suffix, extras=(), on_evict=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.extras = tuple(extras)
+        self.on_evict = on_evict
+        self.lock = threading.RLock()
+        self._index = OrderedDict() # key -> size of the main file, least recently used first
+        self.total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return (base + self.suffix,) + tuple(base + extra for extra in self.extras)
+
+    def _load(self):
+        """Rebuilds the LRU order from the directory (oldest access first)."""
+        entries = []
+        stale = time.time() - _STALE_TMP_SECONDS
+        for name in os.listdir(self.directory):
+            if not name.endswith(('.tmp', self.suffix)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                if stat.st_mtime < stale:
+                    remove_file(path)
+                continue
+            entries.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total += size
+        self._evict()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self._index
+
+    def __len__(self):
+        with self.lock:
+            return len(self._index)
+
+    def touch(self, key):
+        with self.lock:
+            if key not in self._index:
+                return
+            self._index.move_to_end(key)
+        try:
+            # mtime doubles as the access time the index is rebuilt from
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def store(self, key, tmp_path, write_extras=None):
+        """
+        Moves a finished write into the cache and accounts for it; `write_extras()`
+        runs under the lock right after. False (and `tmp_path` removed) if it is too big.
+        """
+        try:
+            size = os.path.getsize(tmp_path)
+        except OSError:
+            return False
+        if size > self.max_bytes:
+            remove_file(tmp_path)
+            return False
+        with self.lock:
+            os.replace(tmp_path, self.path(key))
+            if write_extras:
+                write_extras()
+            self.total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+        return True
+
+    def discard(self, key):
+        """Drops an entry (e.g. one whose file could not be read)."""
+        with self.lock:
+            if key in self._index:
+                self.total -= self._index.pop(key)
+            for path in self.paths(key):
+                remove_file(path)
+
+    def _evict(self):
+        with self.lock:
+            while self.total > self.max_bytes and self._index:
+                key, size = self._index.popitem(last=False)
+                self.total -= size
+                for path in self.paths(key):
+                    remove_file(path)
+                if self.on_evict:
+                    self.on_evict(key)
@@ -0,0 +1,132 @@
+import io
+
+import config
+
+# Output formats a screen frame can be encoded as
+CODEC_MIME = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "webp-lossless": "image/webp",
+    "png-palette": "image/png",
+}
+ALL_CODECS = tuple(CODEC_MIME)
+
+# Preference order before the selector has measured anything
+_DEFAULT_PREFERENCE = {
+    "flat": ("png-palette", "webp-lossless", "webp", "jpeg"),
+    "photo": ("webp", "jpeg"),
+}
+
+
+def encode_image(img, codec="jpeg", quality=70):
+    """Encodes a PIL RGB image with one of CODEC_MIME's codecs."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    if codec == "webp":
+        img.save(buffer, format="WEBP", quality=quality, method=2)
+    elif codec == "webp-lossless":
+        # Low effort keeps lossless WebP fast enough for live frames
+        img.save(buffer, format="WEBP", lossless=True, quality=20, method=1)
+    elif codec == "png-palette":
+        img.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buffer, format="PNG", compress_level=3)
+    else:
+        img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def classify_frame(img):
+    """
+    'flat' for low-colour frames (IDEs, terminals, UI), 'photo' for everything else.
+    Counts colours on a nearest-neighbour thumbnail so no blended colours are introduced.
+    """
+    from PIL import Image
+
+    w, h = img.size
+    sample = img.resize((max(1, w // 4), max(1, h // 4)), Image.NEAREST) if min(w, h) >= 64 else img
+    return "flat" if sample.getcolors(maxcolors=config.SCREEN_FLAT_MAX_COLORS) is not None else "photo"
+
+
+def auto_spec(candidates):
+    """Codec spec meaning 'pick the smallest of these per frame', e.g. 'auto:jpeg,webp'."""
+    return "auto:" + ",".join(c for c in ALL_CODECS if c in candidates)
+
+
+def spec_candidates(spec):
+    return spec.split(":", 1)[1].split(",") if spec.startswith("auto:") else [spec]
+
+
+def accepted_codecs(accept_header):
+    """Codecs a client can decode, judged from its Accept header. JPEG is always assumed."""
+    accept = (accept_header or "").lower()
+    codecs = ["jpeg"]
+    if "image/png" in accept or "image/*" in accept or "*/*" in accept:
+        codecs.append("png-palette")
+    if "image/webp" in accept:
+        codecs += ["webp", "webp-lossless"]
+    return codecs
+
+
+def negotiate_codec(requested=None, accept_header=None, accepted=None, default=None):
+    """
+    Picks the codec spec for a client: an explicit ?format= / subscription value
+    wins, otherwise clients that advertise WebP get 'auto' over what they accept,
+    and everyone else gets the configured default (JPEG). `accepted` is an
+    explicit codec list (push subscribers) and overrides the Accept header.
+    Raises ValueError for unknown formats.
+    """
+    default = default or config.SCREEN_STREAM_CODEC
+    if accepted:
+        accepted = [c for c in accepted if c in CODEC_MIME] or ["jpeg"]
+    if requested:
+        requested = requested.lower()
+        if requested == "auto":
+            candidates = accepted or (accepted_codecs(accept_header) if accept_header else ALL_CODECS)
+            return auto_spec(candidates)
+        if requested not in CODEC_MIME:
+            raise ValueError(f"Unknown format '{requested}'. Options: auto, {', '.join(ALL_CODECS)}")
+        return requested
+
+    candidates = accepted or accepted_codecs(accept_header)
+    if "webp" in candidates:
+        return auto_spec(candidates)
+    return default
+
+
+class CodecSelector:
+    """
+    Learns which codec is smallest for each frame type under one 'auto' spec.
+    Every SCREEN_CODEC_TRIAL_EVERY frames the encoder tries all candidates and
+    reports the sizes; in between, each frame type uses the current winner.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.candidates = spec_candidates(spec)
+        self._avg = {"flat": {}, "photo": {}}
+        self._frames = 0
+
+    def needs_trial(self):
+        self._frames += 1
+        return (self._frames - 1) % max(1, config.SCREEN_CODEC_TRIAL_EVERY) == 0
+
+    def record(self, frame_type, sizes):
+        averages = self._avg[frame_type]
+        for codec, size in sizes.items():
+            previous = averages.get(codec)
+            averages[codec] = size if previous is None else 0.7 * previous + 0.3 * size
+
+    def choice(self):
+        """{'flat': codec, 'photo': codec} for frames that aren't trials."""
+        choices = {}
+        for frame_type, averages in self._avg.items():
+            measured = {c: s for c, s in averages.items() if c in self.candidates}
+            if measured:
+                choices[frame_type] = min(measured, key=measured.get)
+            else:
+                preferred = [c for c in _DEFAULT_PREFERENCE[frame_type] if c in self.candidates]
+                choices[frame_type] = preferred[0] if preferred else self.candidates[0]
+        return choices
+
+    def stats(self):
+        return {t: {c: int(s) for c, s in a.items()} for t, a in self._avg.items() if a}
@@ -0,0 +1,230 @@
+import io
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import config
+from modules.frame_codecs import classify_frame, encode_image, spec_candidates
+
+
+def _encode_variant(img, spec, quality, job, trials):
+    """Encodes `img` for one codec spec. 'auto:' specs classify the frame and either
+    trial every candidate (keeping the smallest) or use the selector's current choice."""
+    if not spec.startswith("auto:"):
+        return spec, encode_image(img, spec, quality)
+
+    frame_type = classify_frame(img)
+    if spec in job.get("trials", ()) and spec not in trials:
+        results = {codec: encode_image(img, codec, quality) for codec in spec_candidates(spec)}
+        best = min(results, key=lambda codec: len(results[codec]))
+        trials[spec] = (frame_type, {codec: len(data) for codec, data in results.items()})
+        return best, results[best]
+
+    codec = job["choices"][spec][frame_type]
+    return codec, encode_image(img, codec, quality)
+
+
+def encode_frame(bgra, src_size, job):
+    """
+    Converts one raw BGRA frame and encodes everything `job` asks for:
+      job = {"size": (w, h), "quality": q, "codec": spec,
+             "profiles": [(w, h, q, spec), ...],      # extra variants for other clients
+             "choices": {auto_spec: {"flat": codec, "photo": codec}},
+             "trials": [auto_spec, ...],              # specs to re-measure this frame
+             "tiles": [(x, y, w, h), ...] | None,     # patch rects in output pixels
+             "tile_codec": spec}
+    Returns {"codec", "data", "encodings": {profile: (codec, bytes)},
+             "tiles": [(x, y, w, h, codec, bytes)] | None,
+             "trials": {auto_spec: (frame_type, {codec: nbytes})}}.
+    Runs inside pool workers, so it must only depend on picklable arguments.
+    """
+    from PIL import Image
+
+    raw = Image.frombytes("RGB", src_size, bgra, "raw", "BGRX")
+    size = tuple(job["size"])
+    quality = job["quality"]
+    img = raw.resize(size)
+    trials = {}
+    codec, data = _encode_variant(img, job.get("codec", "jpeg"), quality, job, trials)
+
+    # One resize per distinct size
+    encodings = {}
+    resized = {size: img}
+    for width, height, profile_quality, spec in job.get("profiles", ()):
+        if (width, height) not in resized:
+            resized[(width, height)] = raw.resize((width, height))
+        encodings[(width, height, profile_quality, spec)] = _encode_variant(
+            resized[(width, height)], spec, profile_quality, job, trials)
+
+    tiles = None
+    if job.get("tiles") is not None:
+        tiles = []
+        tile_codec = job.get("tile_codec", "jpeg")
+        # Patches are too small to be representative, so they never run trials
+        tile_job = {"choices": job.get("choices", {})}
+        for x, y, w, h in job["tiles"]:
+            patch_codec, patch = _encode_variant(img.crop((x, y, x + w, y + h)), tile_codec, quality, tile_job, {})
+            tiles.append((x, y, w, h, patch_codec, patch))
+
+    return {"codec": codec, "data": data, "encodings": encodings, "tiles": tiles, "trials": trials}
+
+
+def _encode_shared(shm_name, nbytes, src_size, job):
+    """Pool worker entry point: reads the raw frame straight out of shared memory."""
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    view = shm.buf[:nbytes]
+    try:
+        return encode_frame(view, src_size, job)
+    finally:
+        view.release()
+        shm.close()
+
+
+class InlineFrameEncoder:
+    """Encodes on the calling thread. Used when the process pool is disabled or unavailable."""
+
+    def __init__(self):
+        self._done = deque()
+
+    def submit(self, bgra, src_size, job, meta=None):
+        self._done.append((meta, encode_frame(bgra, src_size, job)))
+
+    def collect(self, block=False):
+        results = list(self._done)
+        self._done.clear()
+        return results
+
+    @property
+    def in_flight(self):
+        return 0
+
+    def close(self):
+        self._done.clear()
+
+
+# One worker pool for every capture source, created on first use
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(max_workers=config.SCREEN_ENCODER_WORKERS)
+        return _shared_pool
+
+
+def warm_shared_pool():
+    """
+    Starts the encoder processes now. Call before the web server accepts
+    connections: on POSIX the workers are forked, and a fork taken while a
+    client socket is open keeps that connection from ever closing.
+    """
+    if config.SCREEN_ENCODER_WORKERS > 0:
+        get_shared_pool().submit(int).result()
+
+
+def reset_shared_pool():
+    """Drops a crashed pool so the next encoder starts a fresh one."""
+    global _shared_pool
+    with _shared_pool_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessPoolFrameEncoder:
+    """
+    Moves frame conversion + JPEG encoding off the GIL into a small process pool.
+    Raw frames are copied once into a ring of shared-memory slots (not pickled);
+    workers attach by name and send back only the compressed bytes. Results are
+    handed out strictly in submission order. Each capture source owns one
+    encoder (its slots and ordering) while all of them share the worker pool.
+    """
+
+    def __init__(self, pool=None, slots=None):
+        self._pool = pool or get_shared_pool()
+        self.slot_count = max(slots or config.SCREEN_ENCODER_SLOTS, config.SCREEN_ENCODER_WORKERS)
+        self._slots = [] # SharedMemory blocks, sized for the current frame
+        self._slot_bytes = 0
+        self._free = deque()
+        self._pending = deque() # (future, slot_index, meta) in submission order
+        self._backlog = [] # Finished results collected while waiting for a free slot
+
+    def _ensure_slots(self, nbytes):
+        if nbytes <= self._slot_bytes:
+            return
+        # Frame size grew (first frame or a resolution change): reallocate the ring
+        self._backlog = self.collect(block=True)
+        self._release_slots()
+        from multiprocessing import shared_memory
+        self._slots = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(self.slot_count)]
+        self._slot_bytes = nbytes
+        self._free = deque(range(self.slot_count))
+
+    def submit(self, bgra, src_size, job, meta=None):
+        """Queues a frame for encoding. Blocks only if every slot is still being encoded."""
+        nbytes = len(bgra)
+        self._ensure_slots(nbytes)
+        while not self._free:
+            # Backpressure: wait for the oldest frame rather than overwrite a slot in use
+            wait([self._pending[0][0]])
+            self._backlog = self.collect()
+
+        index = self._free.popleft()
+        slot = self._slots[index]
+        slot.buf[:nbytes] = bgra
+        future = self._pool.submit(_encode_shared, slot.name, nbytes, tuple(src_size), job)
+        self._pending.append((future, index, meta))
+
+    def collect(self, block=False):
+        """Returns [(meta, encode_frame result), ...] for finished frames, in order."""
+        results = self._backlog
+        self._backlog = []
+        while self._pending:
+            future, index, meta = self._pending[0]
+            if not block and not future.done():
+                break
+            self._pending.popleft()
+            self._free.append(index)
+            try:
+                results.append((meta, future.result()))
+            except Exception as e:
+                print(f"Frame encode error: {e}")
+        return results
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def _release_slots(self):
+        for slot in self._slots:
+            try:
+                slot.close()
+                slot.unlink()
+            except Exception:
+                pass
+        self._slots = []
+        self._slot_bytes = 0
+
+    def close(self):
+        # Let in-flight encodes finish before their slots are unlinked
+        try:
+            self.collect(block=True)
+        except Exception:
+            pass
+        self._pending.clear()
+        self._release_slots()
+
+
+def create_frame_encoder():
+    """Returns a process-pool encoder, or an inline one if the pool is disabled or can't start."""
+    if config.SCREEN_ENCODER_WORKERS > 0:
+        try:
+            return ProcessPoolFrameEncoder()
+        except Exception as e:
+            print(f"Frame encoder pool unavailable ({e}). Encoding inline.")
+    return InlineFrameEncoder()
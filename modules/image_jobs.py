@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import OrderedDict
+
+import config
+from modules.image_proxy import get_image_proxy
+
+
+def image_seed(prompt, variant=0):
+    """Deterministic Pollinations seed for (prompt, variant), so repeats hit every cache."""
+    normalized = ' '.join(prompt.lower().split())
+    digest = hashlib.sha256(f"{normalized}|{variant}".encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % 1000000 + 1
+
+
+def pollinations_url(prompt, seed):
+    return f"https://image.pollinations.ai/prompt/{urllib.parse.quote(prompt)}?seed={seed}&nologo=true"
+
+
+class PromptMemo:
+    """
+    Enhanced prompt per input prompt, kept in a small JSON file so an LLM
+    rewrite (and therefore the image URL) stays stable across restarts.
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or config.IMAGE_PROMPT_MEMO_FILE
+        self.max_entries = max_entries or config.IMAGE_PROMPT_MEMO_SIZE
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._memo.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(prompt):
+        return ' '.join(prompt.lower().split())
+
+    def get(self, prompt):
+        with self._lock:
+            return self._memo.get(self._key(prompt))
+
+    def put(self, prompt, enhanced):
+        with self._lock:
+            key = self._key(prompt)
+            self._memo[key] = enhanced
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+            snapshot = dict(self._memo)
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"Prompt memo save failed: {e}")
+
+
+class ImageJobQueue:
+    """
+    Background image generation. submit() returns a job at once; worker threads
+    enhance the prompt (memoized), build a Pollinations URL with a seed derived
+    from (prompt, variant) and prefetch the render into the local image cache.
+    When it lands, `on_ready` receives the job with a local `/proxy_image` URL.
+    Identical requests that are still running share one job.
+    """
+
+    def __init__(self, enhance=None, on_ready=None, workers=None, proxy=None):
+        self._enhance = enhance # enhance(prompt) -> str or None (not enhanced), may block on an LLM
+        self.on_ready = on_ready # on_ready(job_dict, rooms): rooms of the requesters, None for everyone
+        self.proxy = proxy or get_image_proxy()
+        self.memo = PromptMemo()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict() # job_id -> job dict, most recent last
+        self._active = {} # (prompt, variant) -> job_id while queued/running
+        self._rooms = {} # job_id -> rooms that asked for it while queued/running
+        for i in range(workers or config.IMAGE_JOB_WORKERS):
+            threading.Thread(target=self._worker, daemon=True, name=f"image-job-{i}").start()
+
+    def submit(self, prompt, variant=0, quick=False, room=None):
+        """
+        Queues a render and returns its job dict ({'job_id', 'status', ...}).
+        `quick` (the requester's Quick Mode) skips the LLM rewrite unless one is memoized;
+        `room` (the requester's session room, None for everyone) gets the on_ready call.
+        """
+        key = (' '.join(prompt.lower().split()), variant)
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id in self._jobs:
+                self._rooms[job_id].add(room)
+                return dict(self._jobs[job_id])
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'prompt': prompt,
+                'variant': variant,
+                'seed': image_seed(prompt, variant),
+                'status': 'queued',
+                'created': time.time()
+            }
+            self._jobs[job['job_id']] = job
+            self._active[key] = job['job_id']
+            self._rooms[job['job_id']] = {room}
+            while len(self._jobs) > config.IMAGE_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        self._queue.put((key, job['job_id'], quick))
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def enhanced_prompt(self, prompt, quick=False):
+        cached = self.memo.get(prompt)
+        if cached:
+            return cached
+        if quick or not self._enhance:
+            return prompt
+        try:
+            enhanced = (self._enhance(prompt) or '').strip()
+        except Exception as e:
+            print(f"Prompt Enhancement Failed: {e}")
+            enhanced = ''
+        # Only real rewrites are memoized; a later request may still enhance a fallback
+        if not enhanced:
+            return prompt
+        self.memo.put(prompt, enhanced)
+        return enhanced
+
+    def _worker(self):
+        while True:
+            key, job_id, quick = self._queue.get()
+            job = self.get(job_id)
+            try:
+                if job is None:
+                    continue
+                self._update(job_id, status='running')
+                enhanced = self.enhanced_prompt(job['prompt'], quick)
+                remote_url = pollinations_url(enhanced, job['seed'])
+                print(f"Generating Image: {enhanced}")
+                started = time.time()
+                cache_status = self.proxy.prefetch(remote_url, timeout=config.IMAGE_JOB_TIMEOUT)
+                job = self._update(job_id, status='ready', enhanced_prompt=enhanced, remote_url=remote_url,
+                                   url='/proxy_image?url=' + urllib.parse.quote(remote_url, safe=''),
+                                   cache=cache_status, render_seconds=round(time.time() - started, 2))
+            except Exception as e:
+                print(f"Image job {job_id} failed: {e}")
+                job = self._update(job_id, status='failed', error=str(e))
+            finally:
+                with self._lock:
+                    if self._active.get(key) == job_id:
+                        del self._active[key]
+                    rooms = self._rooms.pop(job_id, set())
+                self._queue.task_done()
+
+            if job and self.on_ready:
+                try:
+                    # One requester without a room (the local mic) means everyone sees it
+                    self.on_ready(job, None if None in rooms else sorted(rooms))
+                except Exception as e:
+                    print(f"image_ready notify failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            statuses = [job['status'] for job in self._jobs.values()]
+        return {"jobs": {status: statuses.count(status) for status in set(statuses)}, "backlog": self._queue.qsize()}
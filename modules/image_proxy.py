@@ -0,0 +1,348 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+from modules.disk_lru import DiskLRU, remove_file
+
+# Fake a browser user agent to avoid blocking
+_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+               '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+_CHUNK = 64 * 1024
+
+
+class CachedImage:
+    """What the proxy hands back: headers to send and an iterator of body chunks."""
+
+    def __init__(self, content_type, chunks, etag, max_age, length=None, cache_status='MISS'):
+        self.content_type = content_type
+        self.chunks = chunks
+        self.etag = etag
+        self.max_age = max_age
+        self.length = length
+        self.cache_status = cache_status
+
+
+class _Body:
+    """
+    Iterates body chunks read from `source` (an upstream response or an open
+    cache file). close() also releases the source when the body was never
+    read (HEAD, 304 to the client), which closing an unstarted generator
+    would not do.
+    """
+
+    def __init__(self, chunks, source):
+        self._chunks = chunks
+        self._source = source
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        self._source.close()
+
+
+class ImageProxy:
+    """
+    Fetches remote images for /proxy_image through one pooled requests.Session
+    and keeps them in a size-bounded on-disk LRU cache keyed by URL.
+    Fresh entries are served straight from disk; stale ones are revalidated
+    with If-None-Match / If-Modified-Since (and still served if the upstream
+    is down). Misses stream to the client chunk by chunk while being written
+    to the cache. `?w=` thumbnails are rendered from the cached original and
+    cached alongside it.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or config.PROXY_CACHE_DIR
+        self.max_bytes = max_bytes or config.PROXY_CACHE_MAX_MB * 1024 * 1024
+        self._session = None
+        # key.bin is the body, key.json its headers/freshness
+        self.lru = DiskLRU(self.cache_dir, self.max_bytes, '.bin', extras=('.json',))
+
+    # --- HTTP ---
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.PROXY_POOL_SIZE, pool_maxsize=config.PROXY_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = _USER_AGENT
+            self._session = session
+        return self._session
+
+    # --- Disk LRU ---
+
+    def _paths(self, key):
+        return self.lru.paths(key)
+
+    def _read_meta(self, key):
+        body_path, meta_path = self._paths(key)
+        if key not in self.lru or not os.path.exists(body_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        meta_path = self._paths(key)[1]
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _store(self, key, tmp_path, meta):
+        """Moves a finished download into the cache and accounts for it."""
+        self.lru.store(key, tmp_path, lambda: self._write_meta(key, meta))
+
+    @staticmethod
+    def _file_chunks(f):
+        with f:
+            while True:
+                chunk = f.read(_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _from_disk(self, key, meta, cache_status):
+        """
+        The cached body of `key`, or None if it was evicted after `meta` was read.
+        The file is opened here, so a later eviction can't cut the response short.
+        """
+        try:
+            f = open(self._paths(key)[0], 'rb')
+        except FileNotFoundError:
+            return None
+        self.lru.touch(key)
+        return CachedImage(meta['content_type'], _Body(self._file_chunks(f), f), f"{key[:16]}-{int(meta['stored'])}",
+                           meta['max_age'], os.fstat(f.fileno()).st_size, cache_status)
+
+    # --- Freshness ---
+
+    @staticmethod
+    def _max_age(headers):
+        """Seconds the upstream lets us reuse a response for (0 = revalidate every time, None = don't store)."""
+        cache_control = headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control:
+            return None
+        if 'no-cache' in cache_control:
+            return 0
+        match = re.search(r'max-age=(\d+)', cache_control)
+        return int(match.group(1)) if match else config.PROXY_CACHE_TTL
+
+    @staticmethod
+    def _fresh(meta):
+        return time.time() - meta['fetched'] < meta['max_age']
+
+    # --- Public API ---
+
+    @staticmethod
+    def cache_key(url, width=None):
+        raw = url if not width else f"{url}#w={width}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def thumb_width(width):
+        """Rounds a requested width up to a cached step so nearby sizes share a thumbnail."""
+        step = config.PROXY_THUMB_STEP
+        return min(config.PROXY_THUMB_MAX, max(step, -(-int(width) // step) * step))
+
+    def get(self, url, width=None, timeout=None):
+        """
+        Returns a CachedImage for `url` (optionally scaled to at most `width` px wide).
+        Raises ValueError for bad input and RuntimeError when the upstream fails
+        and nothing is cached.
+        """
+        if urlparse(url).scheme not in ('http', 'https'):
+            raise ValueError("Only http(s) URLs can be proxied")
+        if width:
+            return self._thumbnail(url, self.thumb_width(width))
+
+        key = self.cache_key(url)
+        meta = self._read_meta(key)
+        if meta and self._fresh(meta):
+            image = self._from_disk(key, meta, 'HIT')
+            if image:
+                return image
+            meta = None # Evicted in the meantime: a miss
+        return self._fetch(url, key, meta, timeout or config.PROXY_TIMEOUT)
+
+    def prefetch(self, url, timeout=None):
+        """Downloads `url` into the cache without a client attached. Returns the cache status."""
+        image = self.get(url, timeout=timeout)
+        for _ in image.chunks:
+            pass
+        return image.cache_status
+
+    def _fetch(self, url, key, meta, timeout):
+        import requests
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            resp = self.session.get(url, headers=headers, timeout=timeout, stream=True)
+        except requests.RequestException as e:
+            stale = self._from_disk(key, meta, 'STALE') if meta else None
+            if stale:
+                print(f"Proxy upstream unreachable, serving stale copy: {e}")
+                return stale
+            raise RuntimeError(f"Upstream unreachable: {e}")
+
+        if resp.status_code == 304 and meta:
+            resp.close()
+            meta['fetched'] = time.time()
+            meta['max_age'] = self._max_age(resp.headers) or meta['max_age']
+            image = self._from_disk(key, meta, 'REVALIDATED')
+            if not image:
+                # Evicted while revalidating: fetch the body unconditionally
+                return self._fetch(url, key, None, timeout)
+            with self.lru.lock:
+                self._write_meta(key, meta)
+            return image
+
+        if resp.status_code != 200:
+            resp.close()
+            stale = self._from_disk(key, meta, 'STALE') if meta else None
+            if stale:
+                return stale
+            raise RuntimeError(f"Upstream Error: {resp.status_code}")
+
+        length = resp.headers.get('Content-Length')
+        length = int(length) if length and length.isdigit() else None
+        if length and length > config.PROXY_MAX_IMAGE_MB * 1024 * 1024:
+            resp.close()
+            raise RuntimeError("Upstream image is too large")
+
+        max_age = self._max_age(resp.headers)
+        new_meta = {
+            'url': url,
+            'content_type': resp.headers.get('Content-Type', 'application/octet-stream'),
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'fetched': time.time(),
+            'stored': time.time(),
+            'max_age': max_age or 0
+        }
+        etag = f"{key[:16]}-{int(new_meta['stored'])}"
+        chunks = _Body(self._tee(resp, key, new_meta if max_age is not None else None), resp)
+        # Content-Encoding is undone by iter_content, so only trust the length for identity bodies
+        if resp.headers.get('Content-Encoding'):
+            length = None
+        return CachedImage(new_meta['content_type'], chunks, etag, new_meta['max_age'], length, 'MISS')
+
+    def _tee(self, resp, key, meta):
+        """
+        Yields upstream chunks to the client while writing them to the cache
+        (if `meta` allows). A body that grows past PROXY_MAX_IMAGE_MB is still
+        passed on in full, just not cached.
+        """
+        limit = config.PROXY_MAX_IMAGE_MB * 1024 * 1024
+        tmp_path = f"{self._paths(key)[0]}.{threading.get_ident()}.tmp"
+        out = open(tmp_path, 'wb') if meta else None
+        received = 0
+        complete = False
+        try:
+            for chunk in resp.iter_content(_CHUNK):
+                received += len(chunk)
+                if out and received > limit:
+                    print("Proxy: upstream image exceeded PROXY_MAX_IMAGE_MB, not caching it")
+                    out.close()
+                    remove_file(tmp_path)
+                    out = None
+                if out:
+                    out.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            # Runs on normal completion and when the client disconnects early
+            resp.close()
+            if out:
+                out.close()
+                if complete:
+                    self._store(key, tmp_path, meta)
+                else:
+                    remove_file(tmp_path)
+
+    def _thumbnail(self, url, width):
+        thumb_key = self.cache_key(url, width)
+        original = self.get(url)
+        source_key = self.cache_key(url)
+        source_meta = self._read_meta(source_key)
+        if original.cache_status == 'MISS':
+            # Drain the download into the cache so the original can be decoded from disk
+            for _ in original.chunks:
+                pass
+            source_meta = self._read_meta(source_key)
+        else:
+            original.chunks.close()
+        if not source_meta:
+            raise RuntimeError("Image could not be cached for thumbnailing")
+
+        meta = self._read_meta(thumb_key)
+        # A thumbnail is valid for as long as the original it was made from
+        if meta and meta.get('source_stored') == source_meta['stored']:
+            image = self._from_disk(thumb_key, meta, original.cache_status)
+            if image:
+                return image
+
+        from PIL import Image, ImageOps
+
+        tmp_path = f"{self._paths(thumb_key)[0]}.{threading.get_ident()}.tmp"
+        try:
+            source = Image.open(self._paths(source_key)[0])
+        except FileNotFoundError:
+            raise RuntimeError("Image was evicted before it could be thumbnailed")
+        with source as img:
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                content_type, fmt, params = 'image/png', 'PNG', {'optimize': True}
+            else:
+                content_type, fmt, params = 'image/jpeg', 'JPEG', {'quality': 82}
+                img = img.convert('RGB')
+            img.save(tmp_path, format=fmt, **params)
+
+        meta = dict(source_meta, content_type=content_type, etag=None, last_modified=None,
+                    stored=time.time(), source_stored=source_meta['stored'])
+        self._store(thumb_key, tmp_path, meta)
+        meta = self._read_meta(thumb_key)
+        image = self._from_disk(thumb_key, meta, original.cache_status) if meta else None
+        if not image:
+            raise RuntimeError("Thumbnail could not be cached")
+        return image
+
+    def stats(self):
+        with self.lru.lock:
+            return {"entries": len(self.lru), "bytes": self.lru.total, "max_bytes": self.max_bytes}
+
+
+# One cache per process; /proxy_image and the image job queue share it
+_shared_proxy = None
+_shared_proxy_lock = threading.Lock()
+
+
+def get_image_proxy():
+    global _shared_proxy
+    with _shared_proxy_lock:
+        if _shared_proxy is None:
+            _shared_proxy = ImageProxy()
+        return _shared_proxy
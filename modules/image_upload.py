@@ -0,0 +1,103 @@
+import base64
+import io
+import tempfile
+
+import config
+
+# Formats the vision path accepts (PIL format names)
+_ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF', 'MPO'}
+_CHUNK = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Upload exceeds VISION_UPLOAD_MAX_MB or VISION_MAX_PIXELS (HTTP 413)."""
+
+
+def _max_bytes():
+    return config.VISION_UPLOAD_MAX_MB * 1024 * 1024
+
+
+def spool_stream(stream, max_bytes=None):
+    """
+    Copies a request body into a SpooledTemporaryFile: small bodies stay in
+    memory, large ones roll over to disk, and nothing is held twice.
+    """
+    max_bytes = max_bytes or _max_bytes()
+    spool = tempfile.SpooledTemporaryFile(max_size=config.VISION_UPLOAD_SPOOL_KB * 1024)
+    total = 0
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spool.close()
+            raise UploadTooLarge(f"Image is larger than {config.VISION_UPLOAD_MAX_MB} MB")
+        spool.write(chunk)
+    if total == 0:
+        spool.close()
+        raise ValueError("No image received.")
+    spool.seek(0)
+    return spool
+
+
+def read_image_upload(req):
+    """
+    Pulls the image out of an /analyze_image request. Accepts
+      - multipart/form-data with an 'image' file (and optional 'message' field),
+      - a raw image/* (or application/octet-stream) body, message in ?message=,
+      - the legacy JSON body {"image": "<base64 or data URL>", "message": ...}.
+    Returns (file_object, message). The caller closes the file object.
+    """
+    limit = _max_bytes()
+    check_upload_size(req.mimetype, req.content_length)
+
+    if req.mimetype == 'multipart/form-data':
+        # Werkzeug already spools large multipart files to a temp file
+        upload = req.files.get('image') or next(iter(req.files.values()), None)
+        if upload is None:
+            raise ValueError("No image received.")
+        return upload.stream, req.form.get('message')
+
+    if req.mimetype.startswith('image/') or req.mimetype == 'application/octet-stream':
+        return spool_stream(req.stream, limit), req.args.get('message')
+
+    return decode_json_image(req.get_json(silent=True) or {})
+
+
+def check_upload_size(mimetype, content_length):
+    """Rejects a body by its Content-Length before any of it is read."""
+    limit = _max_bytes()
+    # Base64 JSON is a third larger than the image it carries
+    allowed = limit * 4 // 3 + 4096 if mimetype == 'application/json' else limit + 64 * 1024
+    if content_length and content_length > allowed:
+        raise UploadTooLarge(f"Image is larger than {config.VISION_UPLOAD_MAX_MB} MB")
+
+
+def decode_json_image(data):
+    """Legacy JSON body -> (file_object, message)."""
+    image_data = data.get('image') if isinstance(data, dict) else None
+    if not image_data:
+        raise ValueError("No image received.")
+    if "base64," in image_data:
+        image_data = image_data.split("base64,", 1)[1]
+    return io.BytesIO(base64.b64decode(image_data)), data.get('message')
+
+
+def open_image(fileobj):
+    """
+    Opens an upload lazily: only the header is parsed here, so the format and
+    pixel limits are checked before any pixel data is decoded.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        img = Image.open(fileobj)
+    except UnidentifiedImageError:
+        raise ValueError("Unsupported or corrupt image.")
+    if img.format not in _ALLOWED_FORMATS:
+        raise ValueError(f"Unsupported image format: {img.format}")
+    width, height = img.size
+    if width * height > config.VISION_MAX_PIXELS:
+        raise UploadTooLarge(f"Image is {width}x{height}; the limit is {config.VISION_MAX_PIXELS} pixels")
+    return img
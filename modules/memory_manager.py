@@ -2,6 +2,7 @@ import os
 import json
 import config
 from modules.database_manager import DatabaseManager
+from modules.session_manager import LOCAL_SESSION
 
 class MemoryManager:
     def __init__(self):
@@ -55,13 +56,13 @@ class MemoryManager:
             return self.db.get_setting(category, key)
         return self.db.get_all_settings(category)
 
-    def add_history(self, role, content):
-        """Adds a conversation turn to history."""
-        self.db.add_history(role, content)
+    def add_history(self, role, content, session_id=LOCAL_SESSION):
+        """Adds a conversation turn to a session's history."""
+        self.db.add_history(role, content, session_id)
 
-    def get_context_window(self, limit=5):
-        """Retrieves the last 'limit' items from history formatted as text."""
-        recent_history = self.db.get_history(limit=limit)
+    def get_context_window(self, limit=5, session_id=LOCAL_SESSION):
+        """Retrieves the last 'limit' items of a session's history formatted as text."""
+        recent_history = self.db.get_history(limit=limit, session_id=session_id)
         context_str = ""
         for item in recent_history:
             role = item.get("role", "unknown").upper()
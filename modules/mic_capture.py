@@ -0,0 +1,364 @@
+import contextlib
+import queue
+import threading
+import time
+
+import config
+
+
+class Utterance:
+    """
+    One stretch of speech (16-bit mono PCM), pre-roll and trailing silence
+    included. It is handed out as soon as speech starts and fills up while
+    the user talks: chunks() streams it, wait() blocks until it is complete.
+    A burst that turns out too short to be speech ends up `cancelled`.
+    """
+
+    def __init__(self, rate, started):
+        self.rate = rate
+        self.started = started # Wall time of the first sample (pre-roll included)
+        self.ended = None # Wall time it was complete (None while still being spoken)
+        self.cancelled = False
+        self._chunks = []
+        self._cond = threading.Condition()
+
+    def append(self, pcm):
+        with self._cond:
+            self._chunks.append(pcm)
+            self._cond.notify_all()
+
+    def finish(self, cancelled=False):
+        with self._cond:
+            if self.ended is None:
+                self.ended = time.time()
+                self.cancelled = cancelled
+                self._cond.notify_all()
+
+    def chunks(self, timeout=None):
+        """Yields the audio as it arrives until the utterance is complete (or `timeout` passes without audio)."""
+        index = 0
+        while True:
+            with self._cond:
+                if index == len(self._chunks) and self.ended is None:
+                    if not self._cond.wait_for(lambda: index < len(self._chunks) or self.ended is not None, timeout):
+                        return
+                if self.cancelled:
+                    return
+                ready = self._chunks[index:]
+                done = self.ended is not None
+            index += len(ready)
+            yield from ready
+            if done and not ready:
+                return
+
+    def wait(self, timeout=None):
+        """True once the utterance is complete (False if cancelled or still going after `timeout`)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.ended is not None, timeout)
+            return self.ended is not None and not self.cancelled
+
+    @property
+    def pcm(self):
+        with self._cond:
+            return b''.join(self._chunks)
+
+    @property
+    def duration(self):
+        return len(self.pcm) / 2 / self.rate
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity by RMS energy against an adaptive noise floor:
+    a frame is speech when it is louder than both `threshold` and `ratio`
+    times the floor, which tracks the room while nobody is talking.
+    """
+    name = 'energy'
+
+    def __init__(self, threshold=None, ratio=3.0):
+        self.threshold = threshold or config.MIC_ENERGY_THRESHOLD
+        self.ratio = ratio
+        self.noise_floor = float(self.threshold) / ratio
+
+    def is_speech(self, samples):
+        import numpy as np
+
+        rms = float(np.sqrt(np.mean(samples.astype(np.float32) ** 2))) if len(samples) else 0.0
+        speech = rms > max(self.threshold, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+
+class WebRtcVAD:
+    """webrtcvad's GMM detector (needs 10/20/30 ms frames at 8/16/32/48 kHz)."""
+    name = 'webrtc'
+
+    def __init__(self, rate, aggressiveness=None):
+        import webrtcvad
+
+        self.rate = rate
+        self.vad = webrtcvad.Vad(config.MIC_VAD_AGGRESSIVENESS if aggressiveness is None else aggressiveness)
+
+    def is_speech(self, samples):
+        return self.vad.is_speech(samples.tobytes(), self.rate)
+
+
+def make_vad(kind=None, rate=None):
+    """'webrtc', 'energy' or 'auto' (webrtc when installed)."""
+    kind = kind or config.MIC_VAD
+    rate = rate or config.MIC_SAMPLE_RATE
+    if kind in ('auto', 'webrtc'):
+        try:
+            return WebRtcVAD(rate)
+        except ImportError:
+            if kind == 'webrtc':
+                print("Warning: webrtcvad not installed. Using the energy VAD.")
+    return EnergyVAD()
+
+
+class MicCapture:
+    """
+    Keeps the microphone open on a background thread. Every frame goes into
+    a NumPy ring buffer and through a voice-activity detector; once speech
+    has lasted MIC_START_MS and is followed by MIC_HANGOVER of silence, the
+    utterance - from MIC_PRE_ROLL before it started - is cut out of the ring
+    and queued. listen() only has to take the next one, so nothing said
+    between two turns (or during STT of the last one) is lost. Utterances
+    are queued as soon as speech starts and stream in from there, so
+    recognition can begin before the user has finished.
+
+    `open_stream()` must return an object with read(n_samples) -> bytes
+    (a PyAudio input stream by default), so recorded audio can be fed too.
+    """
+
+    def __init__(self, open_stream=None, rate=None, frame_ms=None, vad=None, max_queue=None):
+        import numpy as np
+
+        self.rate = rate or config.MIC_SAMPLE_RATE
+        self.frame = int(self.rate * (frame_ms or config.MIC_FRAME_MS) / 1000)
+        self.vad = vad or make_vad(rate=self.rate)
+        self.open_stream = open_stream or self._open_pyaudio
+        self.pre_roll = int(config.MIC_PRE_ROLL * self.rate)
+        self.hangover = int(config.MIC_HANGOVER * self.rate)
+        self.max_length = int(config.MIC_MAX_UTTERANCE * self.rate)
+        self.min_length = int(config.MIC_MIN_UTTERANCE * self.rate)
+        self.start_frames = max(1, int(config.MIC_START_MS * self.rate / 1000 / self.frame))
+        self.utterances = queue.Queue(maxsize=max_queue or config.MIC_QUEUE_MAX)
+        self.listeners = [] # listener(frame, speech) for every frame outside hold(), on the capture thread
+
+        # Ring holds the longest utterance plus its pre-roll and a spare second
+        self._ring = np.zeros(self.max_length + self.pre_roll + self.rate, dtype=np.int16)
+        self._written = 0 # Samples ever written; ring position is _written % len(_ring)
+        self._lock = threading.Lock()
+        self._held = 0 # hold() depth; no utterances start while > 0
+        self._enabled = threading.Event()
+        self._enabled.set()
+        self._running = False
+        self._thread = None
+        self._reset()
+        self.captured = 0
+        self.dropped = 0
+
+    def _reset(self):
+        self._speech_start = None # Sample index where the current utterance's speech began
+        self._live = None # The Utterance being filled
+        self._voiced_run = 0
+        self._silence = 0
+
+    def _cancel_live(self):
+        """Abandons the utterance in progress (caller holds the lock)."""
+        if self._live is not None:
+            self._live.finish(cancelled=True)
+        self._reset()
+
+    def _open_pyaudio(self):
+        import pyaudio
+
+        audio = pyaudio.PyAudio()
+        stream = audio.open(format=pyaudio.paInt16, channels=1, rate=self.rate, input=True,
+                            frames_per_buffer=self.frame, input_device_index=config.MIC_DEVICE_INDEX)
+        read = stream.read
+        stream.read = lambda n: read(n, exception_on_overflow=False)
+        return stream
+
+    def start(self):
+        """Opens the stream on the calling thread (so errors surface here) and starts capturing."""
+        stream = self.open_stream()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(stream,), daemon=True, name="mic-capture")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._enabled.set()
+
+    def _run(self, stream):
+        while self._running:
+            if not self._enabled.is_set():
+                # Mic switched off: release the device until it is back on
+                with self._lock:
+                    self._cancel_live()
+                self._close(stream)
+                stream = None
+                self._enabled.wait()
+                continue
+            try:
+                if stream is None:
+                    stream = self.open_stream()
+                data = stream.read(self.frame)
+            except (OSError, IOError) as e:
+                print(f"Mic capture error: {e}")
+                self._close(stream)
+                stream = None
+                time.sleep(1)
+                continue
+            if not data:
+                break # End of a recorded stream
+            self.feed(data)
+        self._close(stream)
+
+    @staticmethod
+    def _close(stream):
+        if stream is None:
+            return
+        for name in ('stop_stream', 'close'):
+            try:
+                getattr(stream, name, lambda: None)()
+            except Exception:
+                pass
+
+    def feed(self, data):
+        """Adds raw 16-bit frames to the ring and runs them through the VAD."""
+        import numpy as np
+
+        samples = np.frombuffer(data, dtype=np.int16)
+        for offset in range(0, len(samples) - self.frame + 1, self.frame):
+            frame = samples[offset:offset + self.frame]
+            speech = self._process(frame)
+            if speech is None:
+                continue
+            for listener in self.listeners:
+                try:
+                    listener(frame, speech)
+                except Exception as e:
+                    print(f"Mic listener error: {e}")
+
+    def _process(self, frame):
+        """Stores `frame` and advances the utterance state; returns the VAD verdict (None while held)."""
+        with self._lock:
+            size = len(self._ring)
+            pos = self._written % size
+            self._ring[pos:pos + len(frame)] = frame[:size - pos]
+            if pos + len(frame) > size:
+                self._ring[:pos + len(frame) - size] = frame[size - pos:]
+            self._written += len(frame)
+            if self._held:
+                return None
+            speech = self.vad.is_speech(frame)
+            end = self._written
+
+            if self._speech_start is None:
+                self._voiced_run = self._voiced_run + 1 if speech else 0
+                if self._voiced_run >= self.start_frames:
+                    self._speech_start = end - self._voiced_run * self.frame
+                    self._silence = 0
+                    self._open_live(self._speech_start, end)
+                return speech
+
+            self._live.append(frame.tobytes())
+            self._silence = 0 if speech else self._silence + len(frame)
+            length = end - self._speech_start
+            if self._silence >= self.hangover:
+                if length - self._silence >= self.min_length:
+                    self._live.finish()
+                    self.captured += 1
+                    self._reset()
+                else:
+                    self._cancel_live()
+            elif length >= self.max_length:
+                # Cut overlong speech here; whatever follows starts a new utterance
+                self._live.finish()
+                self.captured += 1
+                self._reset()
+        return speech
+
+    def _open_live(self, speech_start, end):
+        """Queues a new Utterance holding ring[speech_start - pre_roll : end] (caller holds the lock)."""
+        import numpy as np
+
+        start = max(speech_start - self.pre_roll, end - len(self._ring) + self.frame, 0)
+        size = len(self._ring)
+        utterance = Utterance(self.rate, time.time() - (end - start) / self.rate)
+        utterance.append(self._ring[np.arange(start, end) % size].tobytes())
+        self._live = utterance
+        while True:
+            try:
+                self.utterances.put_nowait(utterance)
+                return
+            except queue.Full:
+                # Nobody is listening: keep the newest speech
+                try:
+                    self.utterances.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Next utterance, possibly still being spoken (see Utterance); raises
+        queue.Empty after `timeout` seconds of silence.
+        """
+        return self.utterances.get(timeout=timeout)
+
+    def clear(self, before=None):
+        """Drops queued utterances (only those that ended before wall time `before`, if given)."""
+        keep = []
+        while True:
+            try:
+                utterance = self.utterances.get_nowait()
+            except queue.Empty:
+                break
+            if before is not None and (utterance.ended is None or utterance.ended >= before):
+                keep.append(utterance)
+        for utterance in keep:
+            self.utterances.put_nowait(utterance)
+
+    @contextlib.contextmanager
+    def hold(self):
+        """No new utterances start inside the block (e.g. while SAMi is speaking)."""
+        with self._lock:
+            self._held += 1
+            self._cancel_live()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held -= 1
+                self._reset()
+
+    def set_enabled(self, enabled):
+        """Mic Off closes the device and drops queued speech; Mic On reopens it."""
+        if enabled:
+            self._enabled.set()
+        else:
+            self._enabled.clear()
+            self.clear()
+
+    def recent(self, seconds):
+        """The last `seconds` of audio in the ring (int16 array)."""
+        import numpy as np
+
+        with self._lock:
+            count = min(int(seconds * self.rate), self._written, len(self._ring))
+            return self._ring[np.arange(self._written - count, self._written) % len(self._ring)]
+
+    def stats(self):
+        return {
+            'vad': self.vad.name,
+            'enabled': self._enabled.is_set(),
+            'queued': self.utterances.qsize(),
+            'captured': self.captured,
+            'dropped': self.dropped
+        }
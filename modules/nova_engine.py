@@ -1,5 +1,7 @@
+import contextvars
 import datetime
 import time
+import itertools
 import random
 import requests
 import json
@@ -18,10 +20,32 @@ from modules.web_agent import WebAgent
 from modules.kasa_agent import KasaAgent
 from modules.printer_agent import PrinterAgent
 from modules.authenticator import Authenticator
+from modules.image_jobs import ImageJobQueue
+from modules.vision_cache import VisionResultCache, perceptual_hash, prepare_image
+from modules.turn_trace import get_tracer
+from modules.session_manager import get_session_manager
 import PIL.Image
 
+# Receives reply tokens as the local model generates them (set by process(on_delta=...))
+_reply_listener = contextvars.ContextVar('sami_reply_listener', default=None)
+
+GREETINGS = ["Hello! I am listening.", "Hi there! How can I help?", "Greetings. Systems online."]
+
+# Fixed replies from _check_rules, pre-rendered into the TTS cache at startup
+STATIC_REPLIES = GREETINGS + [
+    "I am functioning at peak efficiency. Ready for your command.",
+    "You're welcome.",
+    "I was created by you, Sir.",
+    "Fast Mode activated. Responses will be concise.",
+    "Fast Mode deactivated.",
+    "Advanced Reasoning Mode activated. I will think carefully before answering.",
+    "Advanced Reasoning Mode deactivated.",
+    "Friendly Mode activated. Hey! Let's chat.",
+    "Professional Mode activated. Systems online."
+]
+
 class NovaEngine:
-    def __init__(self):
+    def __init__(self, on_image_ready=None):
         self.jarvis = JarvisInterface()
         self.memory = MemoryManager()
         self.google = GoogleIntegrations()
@@ -36,6 +60,8 @@ class NovaEngine:
         self.kasa = KasaAgent()
         self.printer = PrinterAgent()
         self.auth = Authenticator()
+        self.images = ImageJobQueue(enhance=self._enhance_image_prompt, on_ready=on_image_ready)
+        self.vision_cache = VisionResultCache()
         
         self.model = None # Default to None (Local/Rule-based)
 
@@ -59,7 +85,7 @@ class NovaEngine:
         Wraps generate_content with exponential backoff for 429 errors.
         """
         # In Quick Mode, do not retry. Fail fast to local model.
-        if config.QUICK_RESPONSE_MODE:
+        if self._session().quick_mode:
             retries = 0
 
         for attempt in range(retries + 1):
@@ -72,7 +98,7 @@ class NovaEngine:
             except Exception as e:
                 # 429 is the HTTP status code for Too Many Requests
                 if "429" in str(e):
-                    if config.QUICK_RESPONSE_MODE:
+                    if self._session().quick_mode:
                         print("Quota Exceeded (Fast Mode). Skipping retry.")
                         raise e # Raise immediately to trigger fallback
                         
@@ -84,21 +110,77 @@ class NovaEngine:
                         continue
                 raise e
 
-    def process(self, command, language='en-in', image=None):
+    def process(self, command, language='en-in', image=None, turn=None, session=None, on_delta=None):
         """
-        Nova's Core Logic Loop
+        Nova's Core Logic Loop. `turn` (a modules.turn_trace.Turn) collects
+        the NLU and LLM stage timings when the command is traced; `session`
+        (a modules.session_manager.Session, default: the local one) picks the
+        history partition and the mode flags the command runs with.
+        `on_delta(text)`, if given, gets the reply in pieces while the local
+        model is still generating it; the full reply is returned as usual.
         """
         if not command:
             return None
 
+        tracer = get_tracer()
+        sessions = get_session_manager()
+        token = _reply_listener.set(on_delta)
+        try:
+            with tracer.activate(turn or tracer.current()), \
+                    sessions.activate(session or sessions.current() or sessions.local):
+                return self._process(command, language)
+        finally:
+            _reply_listener.reset(token)
+
+    @staticmethod
+    def _ollama_generate(payload, timeout=None):
+        """
+        Runs an Ollama /api/generate payload; returns (status code, reply
+        text or None). Inside process(on_delta=...) the reply is streamed
+        and each token is handed to the listener as it arrives.
+        """
+        on_delta = _reply_listener.get()
+        if on_delta is None:
+            response = requests.post(config.OLLAMA_URL, json=payload, timeout=timeout)
+            return response.status_code, response.json()['response'] if response.status_code == 200 else None
+
+        with get_tracer().span('llm.first_token'):
+            response = requests.post(config.OLLAMA_URL, json=dict(payload, stream=True), timeout=timeout, stream=True)
+            lines = response.iter_lines()
+            first = next(lines, None) if response.status_code == 200 else None
+        with response:
+            if response.status_code != 200:
+                return response.status_code, None
+            parts = []
+            for line in itertools.chain([first], lines):
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('response'):
+                    parts.append(data['response'])
+                    on_delta(data['response'])
+                if data.get('done'):
+                    break
+            return 200, ''.join(parts)
+
+    @staticmethod
+    def _session():
+        """The session of the command being processed (the local one outside process())."""
+        sessions = get_session_manager()
+        return sessions.current() or sessions.local
+
+    def _process(self, command, language):
+        tracer = get_tracer()
+
         # 1. Spelling Correction (Pre-processing)
         original_command = command
-        command = self.nlu.autocorrect_sentence(command)
+        with tracer.span('nlu.autocorrect'):
+            command = self.nlu.autocorrect_sentence(command)
         if command != original_command:
             print(f"Auto-Corrected: '{original_command}' -> '{command}'")
 
         # 2. Update Memory History
-        self.memory.add_history("user", command)
+        self.memory.add_history("user", command, self._session().id)
         
         # 2. Pre-process: Handle Wake Word in Text
         command_lower = command.lower()
@@ -115,19 +197,24 @@ class NovaEngine:
         
         # 3. Rule-Based Quick Routes (Low Latency)
         # Check rule based logic first to save API calls
-        response = self._check_rules(command_lower)
+        with tracer.span('nlu.rules'):
+            response = self._check_rules(command_lower)
         if response:
-            self.memory.add_history("model", response)
+            self.memory.add_history("model", response, self._session().id)
             return response
 
+        with tracer.span('llm'):
+            return self._llm_reply(command, language)
+
+    def _llm_reply(self, command, language):
         # 4. LLM Processing
         # --- QUICK THINK MODE ---
-        if config.QUICK_RESPONSE_MODE:
+        if self._session().quick_mode:
             return self._quick_think(command, language)
             
         # --- DEEP THINK MODE (Advanced Reasoning) ---
         # If not in quick mode, use the advanced reasoning path
-        if getattr(config, 'DEEP_THINK_MODE', False):
+        if self._session().deep_mode:
              return self._deep_think(command, language)
 
         # --- STANDARD MODE ---
@@ -136,7 +223,7 @@ class NovaEngine:
         if config.AI_MODE == 'local':
             try:
                 # Build Prompt
-                history_context = self.memory.get_context_window(limit=5)
+                history_context = self.memory.get_context_window(limit=5, session_id=self._session().id)
                 prompt = f"""System: You are SAMi, an intelligent assistant. Be concise.
 Context: {history_context}
 User: {command}"""
@@ -148,14 +235,13 @@ User: {command}"""
                 }
                 
                 print(f"Thinking on Local Brain ({config.OLLAMA_MODEL})...")
-                response = requests.post(config.OLLAMA_URL, json=payload)
+                status, ai_text = self._ollama_generate(payload)
                 
-                if response.status_code == 200:
-                    ai_text = response.json()['response']
-                    self.memory.add_history("model", ai_text)
+                if status == 200:
+                    self.memory.add_history("model", ai_text, self._session().id)
                     return ai_text
                 else:
-                     return f"My local brain disconnected. (Status: {response.status_code})"
+                     return f"My local brain disconnected. (Status: {status})"
                      
             except requests.exceptions.ConnectionError:
                  return "I cannot connect to Ollama. Please ensure the Ollama app is running on your PC."
@@ -167,7 +253,7 @@ User: {command}"""
         elif self.model:
             try:
                 # Build Context from History
-                history_context = self.memory.get_context_window(limit=5)
+                history_context = self.memory.get_context_window(limit=5, session_id=self._session().id)
                 
                 # Construct Prompt
                 # We can use the chat history feature of Gemini, or just simple prompting for now
@@ -180,7 +266,7 @@ User: {command}"""
                 response = self._generate_with_retry(prompt)
                 ai_text = response.text
                 
-                self.memory.add_history("model", ai_text)
+                self.memory.add_history("model", ai_text, self._session().id)
                 return ai_text
                 
             except Exception as e:
@@ -208,13 +294,27 @@ User: {command}"""
         return ResponseWrapper(completion.choices[0].message.content)
 
     def process_vision(self, command, image):
-        """Processes an image + text command using Gemini Vision."""
+        """
+        Processes an image + text command using Gemini Vision.
+        The image is orientation-fixed and downscaled first, and answers are
+        cached by (perceptual hash, command) so repeat questions skip the API.
+        """
         if not self.model:
             return "I need Gemini API for vision capabilities."
+        if image is None:
+            return "I couldn't get an image to look at."
             
         try:
+            image = prepare_image(image)
+            image_hash = perceptual_hash(image)
+            cached = self.vision_cache.get(image_hash, command)
+            if cached is not None:
+                print("Vision: answered from cache.")
+                return cached
+
             prompt = [command, image]
             response = self.model.generate_content(prompt)
+            self.vision_cache.put(image_hash, command, response.text)
             return response.text
         except Exception as e:
             return f"Vision Error: {e}"
@@ -226,9 +326,7 @@ User: {command}"""
         
         # Greetings (Instant Response)
         if command_lower in ['hello', 'hi', 'hey', 'hello sami', 'hi sami', 'hey sami']:
-            import random
-            greetings = ["Hello! I am listening.", "Hi there! How can I help?", "Greetings. Systems online."]
-            return random.choice(greetings)
+            return random.choice(GREETINGS)
             
         # Common Chit-Chat (No AI Needed)
         if command_lower in ['how are you', 'how are you doing', "what's up"]:
@@ -243,36 +341,32 @@ User: {command}"""
         # Quick Mode Toggle
         if 'fast mode' in command_lower or 'quick mode' in command_lower:
             if 'on' in command_lower or 'enable' in command_lower or 'start' in command_lower:
-                config.QUICK_RESPONSE_MODE = True
-                config.DEEP_THINK_MODE = False
+                self._session().set_mode(quick=True)
                 return "Fast Mode activated. Responses will be concise."
             elif 'off' in command_lower or 'disable' in command_lower or 'stop' in command_lower:
-                config.QUICK_RESPONSE_MODE = False
+                self._session().set_mode(quick=False)
                 return "Fast Mode deactivated."
 
         # Deep Think Mode Toggle
         if 'deep mode' in command_lower or 'advanced thinking' in command_lower or 'reasoning' in command_lower:
              if 'on' in command_lower or 'enable' in command_lower or 'start' in command_lower:
-                 config.DEEP_THINK_MODE = True
-                 config.QUICK_RESPONSE_MODE = False # Mutually exclusive
+                 self._session().set_mode(deep=True) # Turns Fast Mode off
                  return "Advanced Reasoning Mode activated. I will think carefully before answering."
              elif 'off' in command_lower or 'disable' in command_lower or 'stop' in command_lower:
-                 config.DEEP_THINK_MODE = False
+                 self._session().set_mode(deep=False)
                  return "Advanced Reasoning Mode deactivated."
 
         # Persona / Friendly Mode Toggle
         if 'friend' in command_lower or 'casual' in command_lower:
-             config.PERSONA = 'friendly'
-             config.QUICK_RESPONSE_MODE = False 
+             self._session().set_mode(quick=False, persona='friendly')
              return "Friendly Mode activated. Hey! Let's chat."
         elif 'professional' in command_lower or 'jarvis' in command_lower or 'serious' in command_lower:
-             config.PERSONA = 'professional'
+             self._session().set_mode(persona='professional')
              return "Professional Mode activated. Systems online."
 
         # Conversation Starters (Friendly Interaction)
         if 'bored' in command_lower or ('talk' in command_lower and ('let\'s' in command_lower or 'can we' in command_lower)):
-             config.PERSONA = 'friendly' # Auto-switch to friendly
-             config.QUICK_RESPONSE_MODE = False
+             self._session().set_mode(quick=False, persona='friendly') # Auto-switch to friendly
              
              starters = [
                  "If you could travel anywhere right now, where would you go?",
@@ -687,7 +781,7 @@ USER: {command}
                          
                     return f"Executed {tool_name}."
             
-            self.memory.add_history("model", text_response)
+            self.memory.add_history("model", text_response, self._session().id)
             return text_response
 
         except Exception as e:
@@ -699,15 +793,15 @@ USER: {command}
         """Executes the command using the Local Ollama model."""
         try:
             # Build Prompt based on Mode and Persona
-            if config.QUICK_RESPONSE_MODE:
+            if self._session().quick_mode:
                  # Minimal Context for speed
                  prompt = f"{config.QUICK_SYSTEM_PROMPT}\nUser: {command}"
             else:
                  # Standard / Deep Mode
-                 history_context = self.memory.get_context_window(limit=10) # Increased context for chat
+                 history_context = self.memory.get_context_window(limit=10, session_id=self._session().id) # Increased context for chat
                  
                  # Select Persona Prompt
-                 if getattr(config, 'PERSONA', 'professional') == 'friendly':
+                 if self._session().persona == 'friendly':
                      system_prompt = config.FRIENDLY_SYSTEM_PROMPT
                  else:
                      system_prompt = config.SYSTEM_INSTRUCTION
@@ -723,14 +817,13 @@ USER: {command}
             print(f"Thinking on Local Brain ({config.OLLAMA_MODEL})...")
             # MAX TIMEOUT for slow systems (90s)
             timeout = 90
-            response = requests.post(config.OLLAMA_URL, json=payload, timeout=timeout)
+            status, ai_text = self._ollama_generate(payload, timeout=timeout)
             
-            if response.status_code == 200:
-                ai_text = response.json()['response']
-                self.memory.add_history("model", ai_text)
+            if status == 200:
+                self.memory.add_history("model", ai_text, self._session().id)
                 return ai_text
             else:
-                 return f"My local brain disconnected. (Status: {response.status_code})"
+                 return f"My local brain disconnected. (Status: {status})"
                  
         except requests.exceptions.ConnectionError:
                 return "I cannot connect to Ollama. Please ensure the Ollama app is running on your PC."
@@ -747,7 +840,7 @@ USER: {command}
         
         if config.AI_MODE == 'local':
              try:
-                history_context = self.memory.get_context_window(limit=5)
+                history_context = self.memory.get_context_window(limit=5, session_id=self._session().id)
                 
                 # Chain of Thought Prompt
                 cot_prompt = f"""System: You are SAMi. You are in 'Deep Reasoning Mode'.
@@ -773,19 +866,18 @@ User: {command}"""
                 }
                 
                 # Longer timeout for deep thinking
-                response = requests.post(config.OLLAMA_URL, json=payload, timeout=60)
+                status, raw_text = self._ollama_generate(payload, timeout=60)
                 
-                if response.status_code == 200:
-                    raw_text = response.json()['response']
+                if status == 200:
                     
                     # Store full thought process in memory for context
-                    self.memory.add_history("model", raw_text)
+                    self.memory.add_history("model", raw_text, self._session().id)
                     
                     # Return full text (Thinking + Answer) so user sees the "Work"
                     # Or we could strip it. User asked for "more thinking power", usually they like to see the thinking.
                     return raw_text
                 else:
-                     return f"Deep Think failed. Status: {response.status_code}"
+                     return f"Deep Think failed. Status: {status}"
                      
              except Exception as e:
                  print(f"Deep Think Error: {e}")
@@ -793,31 +885,26 @@ User: {command}"""
                  
         return self._think_and_act(command, language) # Fallback for cloud/other methods
 
-    def _generate_image(self, prompt):
-        """Generates an image using Pollinations.ai (Free/No-Key)."""
-        import urllib.parse
-        
-        # 1. Enhance Prompt if not in Quick Mode
-        enhanced_prompt = prompt
-        if not config.QUICK_RESPONSE_MODE and self.model:
-            try:
-                enhancement_prompt = f"Rewrite this image prompt to be highly detailed and artistic. Keep it under 50 words. Prompt: {prompt}"
-                response = self._generate_with_retry(enhancement_prompt)
-                enhanced_prompt = getattr(response, 'text', str(response)).strip()
-            except Exception as e:
-                print(f"Prompt Enhancement Failed: {e}")
-                
-        # 2. Construct URL
-        encoded_prompt = urllib.parse.quote(enhanced_prompt)
-        seed = random.randint(1, 10000)
-        # Using Pollinations.ai (Free, Fast, No Auth)
-        # Added seed to prevent caching issues
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?seed={seed}&nologo=true"
-        
-        print(f"Generating Image: {enhanced_prompt}")
-        
-        # 3. Return Structured Response (Dict)
+    def _enhance_image_prompt(self, prompt):
+        """LLM rewrite of an image prompt, or None without a model (runs on an image job worker)."""
+        if not self.model:
+            return None
+        enhancement_prompt = f"Rewrite this image prompt to be highly detailed and artistic. Keep it under 50 words. Prompt: {prompt}"
+        response = self._generate_with_retry(enhancement_prompt)
+        return getattr(response, 'text', str(response)).strip()
+
+    def _generate_image(self, prompt, variant=0):
+        """
+        Queues an image render on Pollinations.ai (Free/No-Key) and returns at once.
+        The job enhances the prompt (memoized), uses a seed derived from
+        (prompt, variant) and prefetches the image into the local cache;
+        an 'image_ready' event follows with the local URL.
+        """
+        # Job workers run outside the session context, so Quick Mode and the room are read here
+        session = self._session()
+        job = self.images.submit(prompt, variant, quick=session.quick_mode, room=session.room)
         return {
-            "text": f"Here is the generated image of {prompt}.",
-            "image": image_url
+            "text": f"Generating an image of {prompt}.",
+            "image": None,
+            "job_id": job['job_id']
         }
@@ -0,0 +1,147 @@
+import threading
+
+import config
+from modules.frame_codecs import spec_candidates
+
+
+class ScreenPushSession:
+    """
+    One subscriber on the /screen Socket.IO namespace.
+    Every pushed frame spends one credit and the client hands credits back
+    with 'ack' once it has drawn a frame, so a slow phone never has more than
+    `credits` frames in flight and simply skips to the newest frame.
+    """
+
+    def __init__(self, sid, broadcaster, mode='frame', credits=None, codec=None):
+        self.sid = sid
+        self.broadcaster = broadcaster
+        self.mode = 'tiles' if mode == 'tiles' else 'frame'
+        self.codec = codec or broadcaster.codec
+        self.decodable = set(spec_candidates(self.codec))
+        self.credits = min(config.SCREEN_PUSH_MAX_CREDITS, credits or config.SCREEN_PUSH_CREDITS)
+        self.last_seq = 0
+        self.frames_sent = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def grant(self, credits=1):
+        with self._cond:
+            self.credits = min(config.SCREEN_PUSH_MAX_CREDITS, self.credits + max(0, credits))
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def wait_for_credit(self, timeout=1.0):
+        """Blocks until a credit is available. Returns False on timeout or stop."""
+        with self._cond:
+            if self.credits <= 0 and not self._stopped:
+                self._cond.wait(timeout)
+            return self.credits > 0 and not self._stopped
+
+    def spend_credit(self):
+        with self._cond:
+            self.credits -= 1
+
+
+def frame_payload(session, frame):
+    """The 'frame' event for `session`: a whole frame or the changed tiles, each tagged with its codec."""
+    payload = {
+        "seq": frame.seq,
+        "width": frame.size[0],
+        "height": frame.size[1]
+    }
+    if session.mode == 'frame':
+        payload["format"], payload["data"] = frame.encoded_as(session.codec)
+        return payload
+
+    # Patches are deltas against seq - 1, only valid if this client has it
+    tiles = frame.tiles if session.last_seq and frame.seq == session.last_seq + 1 else None
+    if tiles and any(tile[4] not in session.decodable for tile in tiles):
+        tiles = None # Patch codec this client can't decode; resend in its own codec
+    payload["full"] = tiles is None
+    if tiles is None:
+        codec, data = frame.encoded_as(session.codec)
+        tiles = [(0, 0, frame.size[0], frame.size[1], codec, data)]
+    payload["tiles"] = [{"x": x, "y": y, "w": w, "h": h, "format": codec, "data": data}
+                        for x, y, w, h, codec, data in tiles]
+    return payload
+
+
+class ScreenPushManager:
+    """
+    Runs one push loop per /screen subscriber, each reading from the shared
+    ScreenBroadcaster of the source it asked for. 'frame' subscribers get whole
+    frames in their negotiated codec; 'tiles' subscribers get changed patches
+    (in the broadcaster's tile codec) when they saw the previous frame and a
+    full frame otherwise. Every payload names the codec it was encoded with.
+    """
+
+    session_class = ScreenPushSession
+
+    def __init__(self, hub, emit, spawn):
+        self.hub = hub
+        self._emit = emit # emit(event, data, sid)
+        self._spawn = spawn # spawn(target, *args) -> background task
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, sid, mode='frame', credits=None, source=None, codec=None):
+        broadcaster = self.hub.get(source)
+        with self._lock:
+            old = self._sessions.pop(sid, None)
+            session = self.session_class(sid, broadcaster, mode, credits, codec)
+            self._sessions[sid] = session
+        if old:
+            old.stop()
+        self._spawn(self._run, session)
+        return session
+
+    def ack(self, sid, credits=1):
+        with self._lock:
+            session = self._sessions.get(sid)
+        if session:
+            session.grant(credits)
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session:
+            session.stop()
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [{"source": s.broadcaster.source.label, "mode": s.mode, "codec": s.codec, "credits": s.credits,
+                 "frames": s.frames_sent, "seq": s.last_seq} for s in sessions]
+
+    def _run(self, session):
+        tiles = session.mode == 'tiles'
+        broadcaster = session.broadcaster
+        broadcaster.attach(tiles=tiles, codec=session.codec)
+        try:
+            while not session.stopped:
+                if not session.wait_for_credit(timeout=1.0):
+                    continue
+                frame = broadcaster.wait_for_frame(session.last_seq, timeout=1.0)
+                if frame is None:
+                    broadcaster.ensure_running()
+                    continue
+                if session.stopped:
+                    break
+
+                payload = frame_payload(session, frame)
+                session.spend_credit()
+                session.last_seq = frame.seq
+                session.frames_sent += 1
+                self._emit('frame', payload, session.sid)
+        except Exception as e:
+            print(f"Screen push error ({session.sid}): {e}")
+        finally:
+            broadcaster.detach(tiles=tiles, codec=session.codec)
@@ -0,0 +1,545 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from modules.frame_codecs import ALL_CODECS, CODEC_MIME, CodecSelector, auto_spec
+from modules.frame_diff import TileChangeDetector, scale_rect
+from modules.frame_encoder import InlineFrameEncoder, create_frame_encoder, reset_shared_pool
+from modules.stream_controller import AdaptiveStreamController
+
+# Seconds a broadcaster handed out by ScreenHub.get() is safe from eviction before its caller attaches
+_CLAIM_GRACE = 10.0
+
+
+def fit_size(size, bounds):
+    """Scales `size` down (never up) to fit inside `bounds`, keeping aspect and even dimensions."""
+    w, h = size
+    scale = min(1.0, bounds[0] / w, bounds[1] / h)
+    return max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2)
+
+
+def _find_window(title):
+    """Screen rectangle (left, top, width, height) of the first visible window matching `title`."""
+    import pygetwindow as gw
+
+    for win in gw.getWindowsWithTitle(title):
+        if getattr(win, 'isMinimized', False) or not getattr(win, 'visible', True):
+            continue
+        if win.width > 0 and win.height > 0:
+            return win.left, win.top, win.width, win.height
+    raise ValueError(f"Window '{title}' not found")
+
+
+class CaptureSource:
+    """
+    What a viewer wants to see: a whole monitor, a crop rectangle on a monitor,
+    or a window (matched by title). Regions and windows are streamed at native
+    resolution (up to SCREEN_REGION_MAX_SIZE); whole monitors are downscaled.
+    """
+
+    def __init__(self, monitor=1, region=None, window=None):
+        self.monitor = monitor
+        self.region = tuple(region) if region else None
+        self.window = window
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds a source from request/subscription args. Raises ValueError on bad input."""
+        args = args or {}
+        monitor = int(args.get('monitor', 1))
+        if monitor < 0:
+            raise ValueError("monitor must be >= 0")
+
+        region = args.get('region')
+        if region:
+            parts = region if isinstance(region, (list, tuple)) else str(region).split(',')
+            region = tuple(int(float(p)) for p in parts)
+            if len(region) != 4 or region[2] <= 0 or region[3] <= 0:
+                raise ValueError("region must be x,y,width,height")
+
+        window = (args.get('window') or '').strip() or None
+        return cls(monitor, region, window)
+
+    @property
+    def key(self):
+        return (self.monitor, self.region, self.window.lower() if self.window else None)
+
+    @property
+    def native(self):
+        return bool(self.region or self.window)
+
+    @property
+    def label(self):
+        if self.window:
+            return f"window '{self.window}'"
+        if self.region:
+            return f"monitor {self.monitor} region {','.join(map(str, self.region))}"
+        return f"monitor {self.monitor}"
+
+    def resolve(self, sct):
+        """Returns the mss grab area {'left', 'top', 'width', 'height'} for this source."""
+        monitors = sct.monitors
+        if self.monitor >= len(monitors):
+            raise ValueError(f"Monitor {self.monitor} not found")
+        bounds = monitors[self.monitor]
+
+        if self.window:
+            left, top, width, height = _find_window(self.window)
+            # Windows can hang off-screen; clip to the whole virtual desktop
+            bounds = monitors[0]
+        elif self.region:
+            x, y, width, height = self.region
+            left, top = bounds['left'] + x, bounds['top'] + y
+        else:
+            return {key: bounds[key] for key in ('left', 'top', 'width', 'height')}
+
+        right = min(left + width, bounds['left'] + bounds['width'])
+        bottom = min(top + height, bounds['top'] + bounds['height'])
+        left, top = max(left, bounds['left']), max(top, bounds['top'])
+        if right <= left or bottom <= top:
+            raise ValueError(f"{self.label} is outside the screen")
+        return {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+
+
+class Frame:
+    """
+    A single encoded screen frame published by the broadcaster.
+    `timestamp` is when the screen was grabbed, `data` is the default-profile
+    encode (in `codec`), `encodings` holds extra
+    (width, height, quality, codec_spec) -> (codec, bytes) variants for other
+    clients, and `tiles` holds (x, y, w, h, codec, bytes) patches relative to
+    the previous frame (seq - 1), or None when only a full frame is available.
+    """
+    __slots__ = ('seq', 'codec', 'data', 'timestamp', 'size', 'quality', 'tiles', 'encodings')
+
+    def __init__(self, seq, codec, data, timestamp, size, quality, tiles=None, encodings=None):
+        self.seq = seq
+        self.codec = codec
+        self.data = data
+        self.timestamp = timestamp
+        self.size = size
+        self.quality = quality
+        self.tiles = tiles
+        self.encodings = encodings or {}
+
+    def encoded(self, profile):
+        """(codec, bytes) for `profile`, falling back to the default encode."""
+        return self.encodings.get(tuple(profile), (self.codec, self.data))
+
+    def encoded_as(self, spec):
+        """(codec, bytes) for a codec spec at the frame's default size and quality."""
+        return self.encoded((self.size[0], self.size[1], self.quality, spec))
+
+
+class ScreenBroadcaster:
+    """
+    Captures one CaptureSource on ONE background thread and publishes the latest
+    encoded frame (with a sequence number) into a small shared ring buffer.
+    All MJPEG streams and snapshot requests read from that buffer, so N viewers
+    cost the same as one. The capture thread stops when nobody is watching,
+    and unchanged grabs are neither encoded nor published.
+    """
+
+    def __init__(self, source=None, max_size=None, quality=None, fps=None, buffer_size=None, idle_timeout=None,
+                 grabber=None):
+        self.source = source or CaptureSource()
+        # Factory for an mss-like context manager (monitors + grab()); benchmarks inject synthetic screens
+        self.grabber = grabber
+        default_bounds = config.SCREEN_REGION_MAX_SIZE if self.source.native else config.SCREEN_STREAM_SIZE
+        self.max_size = tuple(max_size or default_bounds)
+        # Output size; refined from the real capture area on the first grab
+        self.size = fit_size(self.source.region[2:], self.max_size) if self.source.region else tuple(config.SCREEN_STREAM_SIZE)
+        self.quality = quality or config.SCREEN_STREAM_QUALITY
+        self.codec = self._spec(config.SCREEN_STREAM_CODEC)
+        self.tile_codec = self._spec(config.SCREEN_TILE_CODEC)
+        self.interval = 1.0 / (fps or config.SCREEN_STREAM_FPS)
+        # Snapshot pollers don't hold a connection open, so keep capturing
+        # for a short while after the last poll instead of stopping at once.
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.SCREEN_STREAM_IDLE_TIMEOUT
+
+        self._frames = deque(maxlen=buffer_size or config.SCREEN_STREAM_BUFFER)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._clients = 0
+        self._tile_clients = 0
+        self._controllers = set()
+        self._codec_specs = {} # spec -> attached clients wanting it at the default size
+        self._poll_specs = {} # spec -> last snapshot poll asking for it
+        self._selectors = {} # 'auto:' spec -> CodecSelector
+        self._capture_times = deque(maxlen=50)
+        self._last_poll = 0.0
+        self._claimed = 0.0 # Last ScreenHub.get() that handed this broadcaster out
+        self._thread = None
+        self.detector = TileChangeDetector()
+        self._encoder = None # Created on first capture, reused across restarts
+        self._submitted = 0 # Frames handed to the encoder
+        self._published_id = 0 # Submission id of the last published frame
+
+    @staticmethod
+    def _spec(codec):
+        return auto_spec(ALL_CODECS) if codec == 'auto' else codec
+
+    # --- Client Bookkeeping ---
+
+    @property
+    def profile(self):
+        """Default (width, height, quality, codec) encode used by snapshots."""
+        return (self.size[0], self.size[1], self.quality, self.codec)
+
+    def attach(self, tiles=False, controller=None, codec=None):
+        """Registers a streaming client and starts capturing if needed."""
+        with self._cond:
+            self._clients += 1
+            if tiles:
+                self._tile_clients += 1
+            if controller:
+                self._controllers.add(controller)
+            if codec:
+                self._codec_specs[codec] = self._codec_specs.get(codec, 0) + 1
+            self._ensure_running()
+
+    def detach(self, tiles=False, controller=None, codec=None):
+        """Unregisters a streaming client. Capture stops once all are gone."""
+        with self._cond:
+            self._clients = max(0, self._clients - 1)
+            if tiles:
+                self._tile_clients = max(0, self._tile_clients - 1)
+            self._controllers.discard(controller)
+            if codec and codec in self._codec_specs:
+                self._codec_specs[codec] -= 1
+                if self._codec_specs[codec] <= 0:
+                    del self._codec_specs[codec]
+
+    @property
+    def client_count(self):
+        return self._clients
+
+    def claim(self):
+        """Keeps ScreenHub from evicting this broadcaster until the caller has attached."""
+        with self._cond:
+            self._claimed = time.time()
+
+    @property
+    def is_idle(self):
+        with self._cond:
+            return (self._clients == 0 and self._thread is None and not self._polled_recently()
+                    and time.time() - self._claimed >= _CLAIM_GRACE)
+
+    def _has_viewers(self):
+        # Caller must hold self._cond
+        return self._clients > 0 or self._polled_recently()
+
+    def _polled_recently(self):
+        return (time.time() - self._last_poll) < self.idle_timeout
+
+    def _capture_plan(self):
+        """
+        Caller must hold self._cond. Returns (interval, extra_profiles, want_tiles):
+        capture only as fast as the fastest adaptive client needs, unless
+        snapshot pollers or tile clients are expecting the full rate.
+        """
+        want_tiles = self._tile_clients > 0
+        now = time.time()
+        specs = set(self._codec_specs)
+        specs.update(spec for spec, polled in self._poll_specs.items() if now - polled < self.idle_timeout)
+        profiles = {c.profile for c in self._controllers}
+        profiles.update((self.size[0], self.size[1], self.quality, spec) for spec in specs)
+        profiles.discard(self.profile)
+        interval = self.interval
+        full_rate_readers = want_tiles or self._polled_recently() or self._clients > len(self._controllers)
+        if self._controllers and not full_rate_readers:
+            interval = max(self.interval, min(c.interval for c in self._controllers))
+        return interval, profiles, want_tiles
+
+    def ensure_running(self):
+        """Restarts the capture thread if it died (e.g. on a capture error)."""
+        with self._cond:
+            self._ensure_running()
+
+    def _ensure_running(self):
+        # Caller must hold self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self._thread.start()
+            return False
+        return True
+
+    # --- Capture Thread ---
+
+    def _capture_loop(self):
+        try:
+            self._capture()
+        finally:
+            # A thread that died (e.g. the grabber failed to open) must not look like it is still running
+            with self._cond:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _capture(self):
+        grabber = self.grabber
+        if grabber is None:
+            import mss
+            grabber = mss.mss
+
+        print(f"Screen broadcaster started ({self.source.label}).")
+        # A restarted capture must publish a full frame even if nothing changed
+        self.detector.reset()
+        if self._encoder is None:
+            self._encoder = create_frame_encoder()
+
+        # mss handles are not thread-safe, so the context lives in this thread only
+        with grabber() as sct:
+            area = None
+            resolved_at = 0.0
+
+            while True:
+                with self._cond:
+                    if not self._has_viewers():
+                        # Drain while still marked as running: a new capture thread or a
+                        # ScreenHub eviction (close()) must not touch the encoder before this is done
+                        try:
+                            self._publish_encoded(self._encoder.collect(block=True))
+                        finally:
+                            self._thread = None
+                        break
+                    interval, profiles, want_tiles = self._capture_plan()
+
+                started = time.time()
+                try:
+                    # Windows move and resize, so re-resolve them every second
+                    if area is None or (self.source.window and started - resolved_at > 1.0):
+                        area = None
+                        area = self.source.resolve(sct)
+                        resolved_at = started
+                        self._set_size(fit_size((area['width'], area['height']), self.max_size))
+
+                    sct_img = sct.grab(area)
+                    self._capture_times.append(started)
+                    changed = self.detector.detect(sct_img.bgra, sct_img.size)
+                    if changed.any():
+                        self._submit(sct_img, changed, profiles, want_tiles, started)
+                    # Encodes run in parallel; publish whatever finished, in order
+                    self._publish_encoded(self._encoder.collect())
+                except BrokenProcessPool as e:
+                    print(f"Frame encoder pool crashed ({e}). Encoding inline.")
+                    reset_shared_pool()
+                    self._fallback_to_inline_encoder()
+                    continue
+                except Exception as e:
+                    print(f"Screen capture error: {e}")
+                    time.sleep(1)
+                    continue
+
+                elapsed = time.time() - started
+                time.sleep(max(0.0, interval - elapsed))
+
+        print(f"Screen broadcaster stopped ({self.source.label}, no viewers).")
+
+    def _set_size(self, size):
+        with self._cond:
+            if size == self.size:
+                return
+            self.size = size
+            for controller in self._controllers:
+                controller.base_size = size
+
+    def _submit(self, sct_img, changed, profiles, want_tiles, captured_at):
+        job = {"size": self.size, "quality": self.quality, "codec": self.codec,
+               "profiles": sorted(profiles), "tiles": None, "tile_codec": self.tile_codec,
+               "choices": {}, "trials": []}
+        # Mostly-dirty frames are cheaper to ship whole than as many patches
+        if want_tiles and changed.mean() <= config.SCREEN_TILE_MAX_DIRTY:
+            job["tiles"] = []
+            for rect in self.detector.dirty_rects(changed, sct_img.size):
+                x, y, w, h = scale_rect(rect, sct_img.size, self.size)
+                if w > 0 and h > 0:
+                    job["tiles"].append((x, y, w, h))
+
+        # 'auto' specs need the selector's current picks, and now and then a trial
+        specs = {self.codec, self.tile_codec} | {profile[3] for profile in profiles}
+        for spec in specs:
+            if not spec.startswith('auto:'):
+                continue
+            selector = self._selectors.setdefault(spec, CodecSelector(spec))
+            job["choices"][spec] = selector.choice()
+            if selector.needs_trial():
+                job["trials"].append(spec)
+
+        self._submitted += 1
+        self._encoder.submit(sct_img.bgra, sct_img.size, job, meta=(self._submitted, captured_at))
+
+    def _publish_encoded(self, results):
+        for (submit_id, captured_at), result in results:
+            for spec, (frame_type, sizes) in result["trials"].items():
+                self._selectors[spec].record(frame_type, sizes)
+            tiles = result["tiles"]
+            # Patches are only valid on top of the frame submitted right before;
+            # if that one failed to encode, clients need a full redraw.
+            if submit_id != self._published_id + 1:
+                tiles = None
+            self._published_id = submit_id
+            self._publish(result["codec"], result["data"], captured_at, tiles, result["encodings"])
+
+    def _fallback_to_inline_encoder(self):
+        try:
+            self._encoder.close()
+        except Exception:
+            pass
+        self._encoder = InlineFrameEncoder()
+        # Frames lost with the pool break the patch chain; start from a full frame
+        self.detector.reset()
+
+    def _publish(self, codec, data, captured_at, tiles=None, encodings=None):
+        with self._cond:
+            self._seq += 1
+            self._frames.append(Frame(self._seq, codec, data, captured_at, self.size, self.quality, tiles, encodings))
+            self._cond.notify_all()
+
+    # --- Readers ---
+
+    def latest(self):
+        """Returns the newest frame in the buffer (or None)."""
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0):
+        """Blocks until a frame newer than `after_seq` exists. Returns it, or None on timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self._frames or self._frames[-1].seq <= after_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._frames[-1]
+
+    def snapshot(self, timeout=2.0, codec=None):
+        """
+        Returns a fresh frame for one-off polling clients (e.g. /current_frame).
+        Asking for a non-default `codec` spec makes the following frames carry it.
+        """
+        with self._cond:
+            self._last_poll = time.time()
+            if codec and codec != self.codec:
+                self._poll_specs[codec] = self._last_poll
+            was_running = self._ensure_running()
+            latest = self._frames[-1] if self._frames else None
+
+        if was_running and latest:
+            return latest
+        # Capture was idle, so anything in the buffer is stale. Wait for a new grab.
+        return self.wait_for_frame(latest.seq if latest else 0, timeout=timeout)
+
+    def close(self):
+        """Releases the encoder's shared memory. Only call once the capture thread has stopped."""
+        encoder, self._encoder = self._encoder, None
+        if encoder:
+            encoder.close()
+
+    def stats(self):
+        """Summary for the system_stats event."""
+        with self._cond:
+            times = list(self._capture_times)
+            controllers = list(self._controllers)
+            running = self._thread is not None
+            clients = self._clients
+        capture_fps = 0.0
+        if running and len(times) > 1 and time.time() - times[-1] < 2.0:
+            capture_fps = (len(times) - 1) / max(1e-6, times[-1] - times[0])
+        return {
+            "source": self.source.label,
+            "clients": clients,
+            "capture_fps": round(capture_fps, 1),
+            "last_seq": self._seq,
+            "codecs": {spec: sel.stats() for spec, sel in list(self._selectors.items())},
+            "streams": [c.stats() for c in controllers]
+        }
+
+    def stream(self, codec=None):
+        """Generator yielding multipart parts for /video_feed (JPEG unless `codec` says otherwise)."""
+        parts = self.stream_parts(codec)
+        try:
+            for _, part in parts:
+                yield part
+        finally:
+            parts.close()
+
+    def stream_parts(self, codec=None, stop_event=None):
+        """
+        Like stream(), but yields (frame, part) so callers can time each delivery.
+        Setting `stop_event` ends the generator even while the screen is static.
+        """
+        controller = AdaptiveStreamController(self.size, codec or self.codec)
+        self.attach(controller=controller)
+        try:
+            seq = 0
+            while not (stop_event and stop_event.is_set()):
+                wait = controller.wait_time()
+                if wait > 0:
+                    time.sleep(wait)
+                frame = self.wait_for_frame(seq, timeout=0.5 if stop_event else 2.0)
+                if frame is None:
+                    # Capture thread may have died on an error; bring it back
+                    self.ensure_running()
+                    continue
+                seq = frame.seq
+                part_codec, data = frame.encoded(controller.profile)
+                part = (b'--frame\r\n'
+                        b'Content-Type: ' + CODEC_MIME[part_codec].encode() + b'\r\n\r\n' + data + b'\r\n')
+
+                # The server writes each part synchronously, so the time until we
+                # are resumed is how long the client took to drain it.
+                write_started = time.time()
+                yield frame, part
+                controller.record(len(part), time.time() - write_started, self._seq - seq)
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            self.detach(controller=controller)
+
+
+class ScreenHub:
+    """
+    Keeps one ScreenBroadcaster per capture source, so viewers of the same
+    monitor/region/window share a capture thread while different phones can
+    watch different areas. Idle broadcasters are dropped to make room.
+    """
+
+    def __init__(self, max_sources=None, grabber=None):
+        self.max_sources = max_sources or config.SCREEN_MAX_SOURCES
+        self.grabber = grabber # Passed to every broadcaster (e.g. a SyntheticScreen)
+        self._broadcasters = {}
+        self._lock = threading.Lock()
+
+    def get(self, source=None):
+        """Returns the broadcaster for `source` (default: monitor 1), creating it if needed."""
+        source = source or CaptureSource()
+        with self._lock:
+            broadcaster = self._broadcasters.get(source.key)
+            if broadcaster is None:
+                for key in [k for k, b in self._broadcasters.items() if b.is_idle]:
+                    self._broadcasters.pop(key).close()
+                if len(self._broadcasters) >= self.max_sources:
+                    raise RuntimeError("Too many screen sources are being streamed")
+                broadcaster = ScreenBroadcaster(source, grabber=self.grabber)
+                self._broadcasters[source.key] = broadcaster
+            # Idle until the caller attaches; another get() must not evict it in between
+            broadcaster.claim()
+            return broadcaster
+
+    def stats(self):
+        with self._lock:
+            broadcasters = list(self._broadcasters.values())
+        return [b.stats() for b in broadcasters if not b.is_idle]
+
+    def monitors(self):
+        """Lists monitors as [{'index', 'left', 'top', 'width', 'height'}] (0 = all monitors combined)."""
+        grabber = self.grabber
+        if grabber is None:
+            import mss
+            grabber = mss.mss
+
+        with grabber() as sct:
+            return [dict(index=i, left=m['left'], top=m['top'], width=m['width'], height=m['height'])
+                    for i, m in enumerate(sct.monitors)]
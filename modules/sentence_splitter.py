@@ -0,0 +1,56 @@
+import re
+
+import config
+
+# Sentence end: punctuation (plus closing quotes/brackets) followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+_CLAUSE_END = re.compile(r'[,;:]\s+')
+_ABBREVIATIONS = {'mr.', 'mrs.', 'ms.', 'dr.', 'prof.', 'sr.', 'jr.', 'st.', 'vs.', 'etc.', 'e.g.', 'i.e.', 'approx.'}
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed text (LLM tokens) into pieces that can be spoken on their
+    own: whole sentences, or - once more than `clause_chars` are pending -
+    the clauses so far, so a long sentence doesn't hold up the audio. Text
+    without any punctuation is cut at a space after twice that length.
+    """
+
+    def __init__(self, clause_chars=None):
+        self.clause_chars = clause_chars or config.SPEECH_CLAUSE_CHARS
+        self._pending = ''
+
+    def feed(self, text):
+        """Adds `text`; returns the pieces it completed (possibly none)."""
+        self._pending += text
+        pieces = []
+        while True:
+            end = self._boundary()
+            if end is None:
+                return pieces
+            piece, self._pending = self._pending[:end].strip(), self._pending[end:]
+            if piece:
+                pieces.append(piece)
+
+    def flush(self):
+        """The text still pending at the end of the stream."""
+        piece, self._pending = self._pending.strip(), ''
+        return [piece] if piece else []
+
+    def _boundary(self):
+        for match in _SENTENCE_END.finditer(self._pending):
+            words = self._pending[:match.start() + 1].split()
+            last = words[-1].lower() if words else ''
+            # "Dr. Smith", "e.g. this", "1. First item" don't end a sentence
+            if match.group().strip() and (last in _ABBREVIATIONS or (len(words) == 1 and last[:-1].isdigit())):
+                continue
+            return match.end()
+        if len(self._pending) > self.clause_chars:
+            clauses = list(_CLAUSE_END.finditer(self._pending))
+            if clauses:
+                return clauses[-1].end()
+        if len(self._pending) > 2 * self.clause_chars:
+            space = self._pending.rfind(' ')
+            if space > 0:
+                return space + 1
+        return None
@@ -0,0 +1,161 @@
+import contextlib
+import contextvars
+import re
+import threading
+import time
+
+import config
+
+# History partition and modes of the PC's own microphone (and anything not tied to a client)
+LOCAL_SESSION = 'local'
+
+# The session a command is running for on this thread (or task)
+_current_session = contextvars.ContextVar('sami_session', default=None)
+
+
+class Session:
+    """One client's conversation: its history partition in SQLite and its mode flags."""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        # Start from the configured defaults; toggles only change this session
+        self.quick_mode = config.QUICK_RESPONSE_MODE
+        self.deep_mode = getattr(config, 'DEEP_THINK_MODE', False)
+        self.persona = getattr(config, 'PERSONA', 'professional')
+        self.sids = set()
+        self.last_seen = time.time()
+
+    @property
+    def room(self):
+        """Socket.IO room of this session's clients; None for the local one, whose turns everyone sees."""
+        return None if self.id == LOCAL_SESSION else self.id
+
+    def set_mode(self, quick=None, deep=None, persona=None):
+        """Quick and deep mode are mutually exclusive; turning one on turns the other off."""
+        if quick is not None:
+            self.quick_mode = quick
+            if quick:
+                self.deep_mode = False
+        if deep is not None:
+            self.deep_mode = deep
+            if deep:
+                self.quick_mode = False
+        if persona is not None:
+            self.persona = persona
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'quick_mode': self.quick_mode,
+            'deep_mode': self.deep_mode,
+            'persona': self.persona,
+            'clients': len(self.sids)
+        }
+
+
+class SessionManager:
+    """
+    Maps Socket.IO clients to sessions. A client that connects with a device
+    token (auth={'device': ...}) keeps its session across reconnects and
+    across tabs; otherwise the session lives as long as its sid. Sessions
+    without clients are forgotten after SESSION_IDLE_TIMEOUT (their history
+    stays in the database under the same id).
+    """
+
+    def __init__(self, idle_timeout=None):
+        self.idle_timeout = idle_timeout or config.SESSION_IDLE_TIMEOUT
+        self._lock = threading.Lock()
+        self._sessions = {LOCAL_SESSION: Session(LOCAL_SESSION)}
+        self._by_sid = {}
+
+    @staticmethod
+    def session_id(sid, auth=None):
+        """'device:<token>' for a valid device token, else 'sid:<sid>'."""
+        token = (auth or {}).get('device') if isinstance(auth, dict) else None
+        if isinstance(token, str) and re.fullmatch(r'[\w.-]{8,128}', token):
+            return f'device:{token}'
+        return f'sid:{sid}'
+
+    @property
+    def local(self):
+        return self._sessions[LOCAL_SESSION]
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            session.last_seen = time.time()
+            return session
+
+    def connect(self, sid, auth=None):
+        """Binds `sid` to its session (created on first use) and returns it."""
+        session = self.get(self.session_id(sid, auth))
+        with self._lock:
+            session.sids.add(sid)
+            self._by_sid[sid] = session
+        self._expire()
+        return session
+
+    def room_for_sid(self, sid):
+        """The room of a connected client's session, or None for an unknown sid (nothing is created)."""
+        with self._lock:
+            session = self._by_sid.get(sid)
+        return session.room if session else None
+
+    def for_sid(self, sid):
+        """The session of a connected client (a sid-only one if connect was missed)."""
+        with self._lock:
+            session = self._by_sid.get(sid)
+        if session is None:
+            return self.connect(sid)
+        session.last_seen = time.time()
+        return session
+
+    def disconnect(self, sid):
+        with self._lock:
+            session = self._by_sid.pop(sid, None)
+            if session is None:
+                return
+            session.sids.discard(sid)
+            session.last_seen = time.time()
+            # A sid session can never be resumed
+            if not session.sids and session.id.startswith('sid:'):
+                self._sessions.pop(session.id, None)
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if session_id != LOCAL_SESSION and not session.sids and session.last_seen < cutoff:
+                    del self._sessions[session_id]
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'clients': len(self._by_sid)}
+
+    @staticmethod
+    def current():
+        """The session the running command belongs to (None outside a command)."""
+        return _current_session.get()
+
+    @contextlib.contextmanager
+    def activate(self, session):
+        """Makes `session` current for the block (e.g. on a command worker thread)."""
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+
+_shared_sessions = None
+_shared_sessions_lock = threading.Lock()
+
+
+def get_session_manager():
+    global _shared_sessions
+    with _shared_sessions_lock:
+        if _shared_sessions is None:
+            _shared_sessions = SessionManager()
+        return _shared_sessions
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+import config
+
+# Numeric metrics kept as history; everything else in system_stats is current-value only
+SERIES = ('cpu', 'ram', 'disk', 'proc_cpu', 'proc_rss_mb', 'proc_threads')
+
+
+def default_disk_path():
+    """Root of the drive SAMi runs from: 'C:\\' (or wherever it lives) on Windows, '/' elsewhere."""
+    return os.path.abspath(os.sep)
+
+
+def parse_range(value, default=None):
+    """'90', '90s', '15m', '6h' -> seconds. Raises ValueError."""
+    if value in (None, ''):
+        return default or config.STATS_DEFAULT_RANGE
+    value = str(value).strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    scale = units.get(value[-1], None)
+    number = float(value[:-1] if scale else value)
+    seconds = number * (scale or 1)
+    if seconds <= 0:
+        raise ValueError("range must be positive")
+    return seconds
+
+
+class StatsSampler:
+    """
+    Samples host and brain-process metrics into fixed-size NumPy ring
+    buffers (one per metric in SERIES, sharing a timestamp ring), so the UI
+    can draw trends without the server growing. Also tracks what the last
+    system_stats event carried, so each broadcast only sends changed fields.
+    """
+
+    def __init__(self, capacity=None, disk_path=None):
+        import numpy as np
+        import psutil
+
+        self.capacity = capacity or max(2, int(config.STATS_HISTORY_SECONDS / config.STATS_INTERVAL))
+        self.disk_path = disk_path or config.STATS_DISK_PATH or default_disk_path()
+        self._times = np.zeros(self.capacity)
+        self._series = {name: np.full(self.capacity, np.nan, dtype=np.float32) for name in SERIES}
+        self._index = 0 # Next slot to write
+        self._count = 0
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+        self._children = {} # pid -> psutil.Process (cpu_percent needs the same object each time)
+        self._sent = {} # Field -> value as last broadcast
+        self.latest = {}
+
+        # First cpu_percent() calls only set the baseline
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    def _process_cpu(self):
+        """CPU % of the brain plus its children (the screen encoder workers)."""
+        import psutil
+
+        total = self._process.cpu_percent(interval=None)
+        alive = {}
+        for child in self._process.children(recursive=True):
+            known = self._children.get(child.pid, child)
+            try:
+                total += known.cpu_percent(interval=None)
+                alive[child.pid] = known
+            except psutil.Error:
+                pass
+        self._children = alive
+        return total
+
+    def sample(self):
+        """Reads the metrics in SERIES, stores them and returns them as a dict."""
+        import psutil
+
+        try:
+            disk = psutil.disk_usage(self.disk_path).percent
+        except OSError:
+            disk = 0.0
+        with self._process.oneshot():
+            rss = self._process.memory_info().rss
+            threads = self._process.num_threads()
+        values = {
+            'cpu': psutil.cpu_percent(interval=None),
+            'ram': psutil.virtual_memory().percent,
+            'disk': disk,
+            'proc_cpu': round(self._process_cpu(), 1),
+            'proc_rss_mb': round(rss / 1024 / 1024, 1),
+            'proc_threads': threads
+        }
+        with self._lock:
+            self._times[self._index] = time.time()
+            for name in SERIES:
+                self._series[name][self._index] = values[name]
+            self._index = (self._index + 1) % self.capacity
+            self._count = min(self.capacity, self._count + 1)
+        return values
+
+    def changes(self, stats):
+        """
+        Remembers `stats` as the current state and returns only the fields
+        whose value differs from the previous broadcast (empty if none).
+        """
+        with self._lock:
+            self.latest = dict(stats)
+            changed = {k: v for k, v in stats.items() if self._sent.get(k, self) != v}
+            self._sent.update(changed)
+        return changed
+
+    def history(self, seconds, points=None):
+        """
+        The last `seconds` of every series, averaged into at most `points`
+        buckets. Returns {'range', 'step', 't': [...], 'series': {name: [...]}}.
+        """
+        import numpy as np
+
+        points = max(1, min(points or config.STATS_HISTORY_POINTS, config.STATS_HISTORY_POINTS))
+        with self._lock:
+            # Oldest -> newest
+            order = (np.arange(self._count) + self._index - self._count) % self.capacity
+            times = self._times[order]
+            keep = times >= time.time() - seconds
+            times = times[keep]
+            series = {name: values[order][keep] for name, values in self._series.items()}
+
+        if len(times) > points:
+            chunks = np.array_split(np.arange(len(times)), points)
+            starts = np.array([c[0] for c in chunks])
+            counts = np.array([len(c) for c in chunks])
+            times = np.add.reduceat(times, starts) / counts
+            series = {name: np.add.reduceat(values.astype(np.float64), starts) / counts
+                      for name, values in series.items()}
+        step = float(np.median(np.diff(times))) if len(times) > 1 else config.STATS_INTERVAL
+        return {
+            'range': seconds,
+            'step': round(step, 2),
+            't': [round(float(t), 2) for t in times],
+            'series': {name: [None if np.isnan(v) else round(float(v), 2) for v in values]
+                       for name, values in series.items()}
+        }
@@ -0,0 +1,103 @@
+import time
+
+import config
+
+
+class AdaptiveStreamController:
+    """
+    Per-client congestion controller for the live screen stream.
+    Watches how long each multipart write blocks and how many frames queue up
+    behind it, then walks a quality/resolution ladder and stretches or shrinks
+    the frame interval within the bounds set in config: back off fast on
+    congestion, probe back up one step per second of clean writes.
+    """
+
+    def __init__(self, base_size, codec="jpeg", steps=5):
+        q_min, q_max = config.SCREEN_ADAPT_QUALITY
+        s_min, s_max = config.SCREEN_ADAPT_SCALE
+        fps_min, fps_max = config.SCREEN_ADAPT_FPS
+
+        # Quantized (scale, quality) ladder, best first, so clients share encodes where they can
+        self.ladder = []
+        for i in range(steps):
+            frac = i / max(1, steps - 1)
+            quality = int(round((q_max - (q_max - q_min) * frac) / 5) * 5)
+            scale = round((s_max - (s_max - s_min) * frac) * 20) / 20
+            self.ladder.append((scale, quality))
+        # Output size of the source; the broadcaster updates it if the capture area resizes
+        self.base_size = tuple(base_size)
+        self.codec = codec
+
+        self.min_interval = 1.0 / fps_max
+        self.max_interval = 1.0 / fps_min
+        self.interval = self.min_interval
+        self.level = 0
+
+        self.throughput = None # Bytes/sec (EWMA)
+        self.write_time = 0.0 # Seconds (EWMA)
+        self.queue_depth = 0 # Frames that piled up behind the last write
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self._good_streak = 0
+        self._next_send = 0.0
+        self._started = time.time()
+
+    @property
+    def profile(self):
+        """(width, height, quality, codec) this client should receive right now."""
+        scale, quality = self.ladder[self.level]
+        if scale >= 1.0:
+            return (self.base_size[0], self.base_size[1], quality, self.codec)
+        width = max(2, int(self.base_size[0] * scale) // 2 * 2)
+        height = max(2, int(self.base_size[1] * scale) // 2 * 2)
+        return (width, height, quality, self.codec)
+
+    def wait_time(self):
+        """Seconds to wait before the next frame is due."""
+        return max(0.0, self._next_send - time.time())
+
+    def record(self, nbytes, write_time, queue_depth):
+        """Feeds one completed write back into the controller."""
+        self.frames_sent += 1
+        self.bytes_sent += nbytes
+        self.queue_depth = queue_depth
+        self.write_time = write_time if self.frames_sent == 1 else 0.7 * self.write_time + 0.3 * write_time
+        if write_time > 0:
+            rate = nbytes / write_time
+            self.throughput = rate if self.throughput is None else 0.7 * self.throughput + 0.3 * rate
+
+        congested = write_time > 0.5 * self.interval or queue_depth > 1
+        if congested:
+            self._good_streak = 0
+            self.level = min(len(self.ladder) - 1, self.level + 1)
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        else:
+            self._good_streak += 1
+            # Probe upward slowly, one step per second of clean writes
+            if self._good_streak * self.interval >= 1.0:
+                self._good_streak = 0
+                if self.interval > self.min_interval:
+                    self.interval = max(self.min_interval, self.interval * 0.8)
+                elif self.level > 0:
+                    self.level -= 1
+
+        # Never schedule frames faster than the link can drain them
+        if self.throughput:
+            self.interval = max(self.interval, min(self.max_interval, nbytes / self.throughput * 1.25))
+
+        self._next_send = time.time() + max(0.0, self.interval - write_time)
+
+    def stats(self):
+        width, height, quality, codec = self.profile
+        elapsed = max(1e-6, time.time() - self._started)
+        return {
+            "resolution": f"{width}x{height}",
+            "quality": quality,
+            "codec": codec,
+            "fps": round(1.0 / self.interval, 1),
+            "kbps": round(self.bytes_sent * 8 / 1000 / elapsed, 1),
+            "throughput_kbps": round(self.throughput * 8 / 1000, 1) if self.throughput else None,
+            "write_ms": round(self.write_time * 1000, 1),
+            "queue_depth": self.queue_depth,
+            "frames": self.frames_sent
+        }
@@ -0,0 +1,286 @@
+import threading
+import time
+
+import config
+
+
+class STTError(Exception):
+    """The backend could not transcribe (service down, timeout, model missing) - try the next one."""
+
+
+class STTStream:
+    """
+    Incremental recognition of one utterance: feed() 16-bit mono PCM chunks
+    while the user speaks, finish() for the transcript ('' if nothing was
+    understood). This default just collects the audio for transcribe();
+    backends that can decode as audio arrives override it.
+    """
+
+    def __init__(self, backend, rate, language):
+        self.backend = backend
+        self.rate = rate
+        self.language = language
+        self.chunks = []
+
+    def feed(self, pcm):
+        self.chunks.append(pcm)
+
+    def finish(self):
+        return self.backend.transcribe(b''.join(self.chunks), self.rate, self.language)
+
+
+class STTBackend:
+    name = None
+
+    def supports(self, language):
+        return True
+
+    def transcribe(self, pcm, rate, language):
+        """Text of a complete utterance ('' if no speech was recognised). Raises STTError."""
+        raise NotImplementedError
+
+    def stream(self, rate, language):
+        return STTStream(self, rate, language)
+
+
+class GoogleSTT(STTBackend):
+    """Google's free web speech API via speech_recognition (needs the internet)."""
+    name = 'google'
+
+    def __init__(self, timeout=None):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.recognizer.operation_timeout = timeout or config.STT_TIMEOUT
+
+    def transcribe(self, pcm, rate, language):
+        audio = self.sr.AudioData(pcm, rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio, language=language)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise STTError(str(e))
+        except OSError as e: # Socket timeouts and connection resets
+            raise STTError(str(e))
+
+
+class VoskStream(STTStream):
+    """Decodes with Kaldi while the utterance is still being spoken."""
+
+    def __init__(self, backend, rate, language):
+        super().__init__(backend, rate, language)
+        self.recognizer = backend.recognizer(rate, language)
+
+    def feed(self, pcm):
+        self.recognizer.AcceptWaveform(pcm)
+
+    def finish(self):
+        import json
+
+        return json.loads(self.recognizer.FinalResult()).get('text', '')
+
+
+class VoskSTT(STTBackend):
+    """
+    Offline recognition with Vosk (pip install vosk). Each language needs a
+    model directory in VOSK_MODELS, keyed by language code or its prefix
+    ('en' covers en-in and en-us).
+    """
+    name = 'vosk'
+
+    def __init__(self, models=None):
+        import vosk
+
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.paths = dict(models if models is not None else config.VOSK_MODELS)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _path(self, language):
+        language = language.lower()
+        return self.paths.get(language) or self.paths.get(language.split('-')[0])
+
+    def supports(self, language):
+        return self._path(language) is not None
+
+    def recognizer(self, rate, language):
+        path = self._path(language)
+        if not path:
+            raise STTError(f"no Vosk model for {language}")
+        with self._lock:
+            model = self._models.get(path)
+            if model is None:
+                try:
+                    model = self._models[path] = self.vosk.Model(path)
+                except Exception as e:
+                    raise STTError(f"Vosk model {path}: {e}")
+        return self.vosk.KaldiRecognizer(model, rate)
+
+    def transcribe(self, pcm, rate, language):
+        stream = self.stream(rate, language)
+        stream.feed(pcm)
+        return stream.finish()
+
+    def stream(self, rate, language):
+        return VoskStream(self, rate, language)
+
+
+class StubSTT(STTBackend):
+    """
+    Scripted backend for tests and demos: returns `responses` in turn
+    (repeating the last), or raises STTError while `failing` is set.
+    """
+    name = 'stub'
+
+    def __init__(self, responses=None, languages=None, failing=False):
+        self.responses = list(responses if responses is not None else config.STT_STUB_RESPONSES)
+        self.languages = languages
+        self.failing = failing
+        self.calls = []
+
+    def supports(self, language):
+        return self.languages is None or language in self.languages
+
+    def transcribe(self, pcm, rate, language):
+        self.calls.append((len(pcm), rate, language))
+        if self.failing:
+            raise STTError("stub set to fail")
+        if not self.responses:
+            return ""
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+BACKENDS = {'google': GoogleSTT, 'vosk': VoskSTT, 'stub': StubSTT}
+
+
+class _Health:
+    def __init__(self):
+        self.failures = 0 # Consecutive
+        self.retry_at = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class RouterStream(STTStream):
+    """Streams into the first backend in line; the fallbacks get the collected audio if it fails."""
+
+    def __init__(self, router, rate, language, live=True):
+        super().__init__(None, rate, language)
+        self.router = router
+        self.order = router.order(language)
+        self.live = None
+        if live and self.order:
+            try:
+                self.live = router.backends[self.order[0]].stream(rate, language)
+            except STTError as e:
+                router._failed(self.order[0], e)
+                self.order = self.order[1:]
+
+    def feed(self, pcm):
+        self.chunks.append(pcm)
+        if self.live is not None:
+            try:
+                self.live.feed(pcm)
+            except STTError as e:
+                self.router._failed(self.order[0], e)
+                self.live = None
+                self.order = self.order[1:]
+
+    def finish(self):
+        pcm = b''.join(self.chunks)
+        errors = []
+        for i, name in enumerate(self.order):
+            try:
+                if i == 0 and self.live is not None:
+                    text = self.live.finish()
+                else:
+                    text = self.router.backends[name].transcribe(pcm, self.rate, self.language)
+            except STTError as e:
+                self.router._failed(name, e)
+                errors.append(f"{name}: {e}")
+                continue
+            self.router._succeeded(name)
+            return text
+        raise STTError("; ".join(errors) or f"no speech backend for {self.language}")
+
+
+class STTRouter(STTBackend):
+    """
+    Picks the speech-to-text backend per utterance. The candidates for a
+    language come from STT_LANGUAGE_BACKENDS (exact code, then its prefix)
+    or STT_BACKENDS, in fallback order, minus those that don't support it.
+    A backend that fails STT_FAILURE_LIMIT times in a row is moved to the
+    back of the line for STT_RETRY_AFTER seconds, so a dead connection
+    costs one timeout rather than one per command.
+    """
+    name = 'router'
+
+    def __init__(self, backends=None, order=None, routes=None):
+        self.backends = backends if backends is not None else self._load(
+            set(order or config.STT_BACKENDS).union(*(routes or config.STT_LANGUAGE_BACKENDS).values()))
+        self.default_order = [n for n in (order or config.STT_BACKENDS) if n in self.backends]
+        self.routes = routes if routes is not None else dict(config.STT_LANGUAGE_BACKENDS)
+        self._health = {name: _Health() for name in self.backends}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(names):
+        backends = {}
+        for name in names:
+            try:
+                backends[name] = BACKENDS[name]()
+            except KeyError:
+                print(f"Warning: unknown speech backend '{name}'.")
+            except ImportError as e:
+                print(f"Speech backend '{name}' unavailable ({e}).")
+        return backends
+
+    def order(self, language):
+        """Names of the backends to try for `language`, healthy ones first."""
+        language = (language or '').lower()
+        names = self.routes.get(language) or self.routes.get(language.split('-')[0]) or self.default_order
+        candidates = [n for n in names if n in self.backends and self.backends[n].supports(language)]
+        now = time.time()
+        with self._lock:
+            cooling = lambda name: self._health[name].retry_at > now
+            return [n for n in candidates if not cooling(n)] + [n for n in candidates if cooling(n)]
+
+    def supports(self, language):
+        return bool(self.order(language))
+
+    def _failed(self, name, error):
+        print(f"Speech backend '{name}' failed: {error}")
+        with self._lock:
+            health = self._health[name]
+            health.calls += 1
+            health.errors += 1
+            health.failures += 1
+            health.last_error = str(error)
+            if health.failures >= config.STT_FAILURE_LIMIT:
+                health.retry_at = time.time() + config.STT_RETRY_AFTER
+
+    def _succeeded(self, name):
+        with self._lock:
+            health = self._health[name]
+            health.calls += 1
+            health.failures = 0
+            health.retry_at = 0.0
+
+    def transcribe(self, pcm, rate, language):
+        stream = RouterStream(self, rate, language, live=False)
+        stream.feed(pcm)
+        return stream.finish()
+
+    def stream(self, rate, language):
+        return RouterStream(self, rate, language)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {name: {'healthy': h.retry_at <= now, 'calls': h.calls, 'errors': h.errors,
+                           'last_error': h.last_error}
+                    for name, h in self._health.items()}
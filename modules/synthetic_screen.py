@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+
+# Desktop scenes the benchmark can render: name -> description
+SCENES = {
+    "static": "nothing changes after the first frame",
+    "idle": "static desktop with a blinking text cursor",
+    "scrolling": "editor scrolling one text line per frame",
+    "video": "desktop with a 640x360 video playing",
+}
+
+
+class SyntheticShot:
+    """Mimics an mss ScreenShot: raw BGRA bytes plus (width, height)."""
+    __slots__ = ('bgra', 'size')
+
+    def __init__(self, bgra, size):
+        self.bgra = bgra
+        self.size = size
+
+
+def _text_page(width, height, line_height=18, seed=0):
+    """Dark editor page with random-length lines of light 'glyph' blocks."""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width, 4), (30, 30, 30, 255), dtype=np.uint8)
+    for top in range(0, height - line_height, line_height):
+        x = 40 + int(rng.integers(0, 4)) * 32
+        end = min(width - 20, x + int(rng.integers(0, width * 3 // 4)))
+        while x < end:
+            word = int(rng.integers(2, 10)) * 8
+            color = (120, 180, 250, 255) if rng.random() < 0.2 else (210, 210, 210, 255)
+            page[top + 5:top + 13, x:min(end, x + word)] = color
+            x += word + 8
+    return page
+
+
+class SyntheticScreen:
+    """
+    Drop-in replacement for mss.mss() that renders a synthetic desktop, so the
+    capture -> diff -> encode -> publish pipeline runs without a display.
+    Frames are pre-rendered NumPy BGRA arrays; each grab returns a fresh bytes
+    copy like mss does.
+    """
+
+    def __init__(self, scene="static", size=(1920, 1080)):
+        if scene not in SCENES:
+            raise ValueError(f"Unknown scene '{scene}'. Options: {', '.join(SCENES)}")
+        self.scene = scene
+        self.width, self.height = size
+        self.monitors = [
+            {'left': 0, 'top': 0, 'width': self.width, 'height': self.height},
+            {'left': 0, 'top': 0, 'width': self.width, 'height': self.height},
+        ]
+        self.grabs = 0
+        self._started = time.time()
+
+        self._desktop = _text_page(self.width, self.height)
+        if scene == "scrolling":
+            # Two screens of text so the view can wrap around while scrolling
+            self._page = np.concatenate([self._desktop, _text_page(self.width, self.height, seed=1)])
+        elif scene == "video":
+            rng = np.random.default_rng(2)
+            x, y = np.meshgrid(np.linspace(0, 255, 640), np.linspace(0, 255, 360))
+            base = np.stack([x, y, (x + y) / 2, np.full_like(x, 255)], axis=2)
+            # A short loop of noisy gradient frames stands in for decoded video
+            self._video = [np.clip(base + rng.normal(0, 20, base.shape) * [1, 1, 1, 0], 0, 255).astype(np.uint8)
+                           for _ in range(8)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def _render(self, n):
+        if self.scene == "static":
+            return self._desktop
+        if self.scene == "idle":
+            frame = self._desktop.copy()
+            # Cursor blinks twice a second, so most grabs are identical
+            if int((time.time() - self._started) * 2) % 2 == 0:
+                frame[40:56, 300:302] = (255, 255, 255, 255)
+            return frame
+        if self.scene == "scrolling":
+            offset = (n * 18) % self.height
+            return self._page[offset:offset + self.height]
+        frame = self._desktop.copy()
+        top, left = (self.height - 360) // 2, (self.width - 640) // 2
+        frame[top:top + 360, left:left + 640] = self._video[n % len(self._video)]
+        return frame
+
+    def grab(self, area):
+        frame = self._render(self.grabs)
+        self.grabs += 1
+        left, top = area['left'], area['top']
+        crop = frame[top:top + area['height'], left:left + area['width']]
+        return SyntheticShot(np.ascontiguousarray(crop).tobytes(), (crop.shape[1], crop.shape[0]))
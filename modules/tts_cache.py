@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import config
+from modules.disk_lru import DiskLRU, remove_file
+
+
+class TTSCache:
+    """
+    Synthesized speech (MP3 bytes) addressed by a hash of (engine, voice,
+    rate, text), so a phrase SAMi has said before is played without going
+    back to the TTS service. Entries live in a size-bounded on-disk LRU;
+    the most recently played ones are also held in memory.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, memory_bytes=None):
+        self.cache_dir = cache_dir or config.TTS_CACHE_DIR
+        self.max_bytes = max_bytes or config.TTS_CACHE_MAX_MB * 1024 * 1024
+        self.memory_bytes = memory_bytes if memory_bytes is not None else config.TTS_CACHE_MEMORY_MB * 1024 * 1024
+        self._memory = OrderedDict() # key -> audio, least recently used first
+        self._memory_total = 0
+        self.hits = 0
+        self.misses = 0
+        self.lru = DiskLRU(self.cache_dir, self.max_bytes, '.mp3', on_evict=self._forget)
+        self._lock = self.lru.lock
+
+    @staticmethod
+    def key(text, voice, rate, engine):
+        text = ' '.join(str(text).split())
+        return hashlib.sha256(json.dumps([engine, voice, rate, text]).encode('utf-8')).hexdigest()
+
+    def _forget(self, key):
+        # Caller holds the lock
+        audio = self._memory.pop(key, None)
+        if audio is not None:
+            self._memory_total -= len(audio)
+
+    def _remember(self, key, audio):
+        """Adds `audio` to the in-memory hot set (caller holds the lock)."""
+        self._forget(key)
+        if len(audio) > self.memory_bytes:
+            return
+        self._memory[key] = audio
+        self._memory_total += len(audio)
+        while self._memory_total > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_total -= len(old)
+
+    def __contains__(self, key):
+        return key in self.lru
+
+    def get(self, key):
+        """The cached audio for `key`, or None."""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+            elif key not in self.lru:
+                self.misses += 1
+                return None
+        if audio is not None:
+            self.lru.touch(key)
+            return audio
+        try:
+            with open(self.lru.path(key), 'rb') as f:
+                audio = f.read()
+        except OSError:
+            self.lru.discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        self.lru.touch(key)
+        with self._lock:
+            self._remember(key, audio)
+            self.hits += 1
+        return audio
+
+    def put(self, key, audio):
+        if not audio or len(audio) > self.max_bytes:
+            return
+        tmp_path = f"{self.lru.path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            self.lru.store(key, tmp_path, lambda: self._remember(key, audio))
+        except OSError as e:
+            print(f"TTS cache write failed: {e}")
+            remove_file(tmp_path)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.lru), "bytes": self.lru.total, "max_bytes": self.max_bytes,
+                    "memory_entries": len(self._memory), "memory_bytes": self._memory_total,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,176 @@
+import contextlib
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import config
+
+# The turn whose spans are being recorded on this thread (or task)
+_current_turn = contextvars.ContextVar('sami_turn', default=None)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram (bucket counts, sum, count)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        label = ','.join(f'{k}="{v}"' for k, v in labels.items())
+        prefix = label + ',' if label else ''
+        out = [f'{name}_bucket{{{prefix}le="{bound:g}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        out.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        out.append(f'{name}_sum{{{label}}} {self.sum:.6f}')
+        out.append(f'{name}_count{{{label}}} {self.count}')
+        return out
+
+
+class Turn:
+    """One voice or text exchange: when it started and how long each stage took."""
+
+    def __init__(self, source):
+        self.id = uuid.uuid4().hex[:10]
+        self.source = source
+        self.started = time.time()
+        self.spans = [] # (stage, start offset s, duration s)
+        self.outcome = None
+        self.total = None
+
+    def to_dict(self):
+        return {
+            'turn_id': self.id,
+            'source': self.source,
+            'started': self.started,
+            'outcome': self.outcome,
+            'total_ms': round((self.total or 0) * 1000, 1),
+            'spans': [{'stage': stage, 'start_ms': round(start * 1000, 1), 'ms': round(duration * 1000, 1)}
+                      for stage, start, duration in self.spans]
+        }
+
+
+class TurnTracer:
+    """
+    Lightweight per-turn tracing for the voice/text pipeline (listen -> STT ->
+    NLU -> LLM -> TTS). A turn is started where a request enters, passed along
+    explicitly across threads (turn=...) and picked up from a context variable
+    below that, so deep helpers only need `with tracer.span('stage'):`.
+    Every span feeds a per-stage histogram (served at /metrics in Prometheus
+    text format) and finished turns go to `on_turn` for the UI waterfall.
+    """
+
+    def __init__(self, on_turn=None, buckets=None, history=None):
+        self.on_turn = on_turn # on_turn(turn_dict)
+        self.buckets = tuple(buckets or config.TRACE_BUCKETS)
+        self.history = history or config.TRACE_HISTORY
+        self._lock = threading.Lock()
+        self._stages = {} # stage -> Histogram
+        self._turns = {} # (source, outcome) -> Histogram of whole-turn time
+        self._recent = OrderedDict() # turn_id -> dict, newest last
+
+    def start_turn(self, source):
+        """Starts a turn and makes it current on this thread."""
+        turn = Turn(source)
+        _current_turn.set(turn)
+        return turn
+
+    @staticmethod
+    def current():
+        return _current_turn.get()
+
+    @contextlib.contextmanager
+    def activate(self, turn):
+        """Makes `turn` current for the block (e.g. on a command worker thread)."""
+        token = _current_turn.set(turn)
+        try:
+            yield turn
+        finally:
+            _current_turn.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, stage, turn=None):
+        """Times the block as `stage` of `turn` (default: the current turn)."""
+        turn = turn or _current_turn.get()
+        started = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - started
+            with self._lock:
+                histogram = self._stages.get(stage)
+                if histogram is None:
+                    histogram = self._stages[stage] = Histogram(self.buckets)
+                histogram.observe(duration)
+                if turn is not None:
+                    turn.spans.append((stage, started - turn.started, duration))
+
+    def finish(self, turn, outcome='ok'):
+        """Closes `turn`, records its total time and hands it to on_turn."""
+        if turn is None or turn.total is not None:
+            return
+        turn.total = time.time() - turn.started
+        turn.outcome = outcome
+        turn.spans.sort(key=lambda span: span[1])
+        data = turn.to_dict()
+        with self._lock:
+            key = (turn.source, outcome)
+            histogram = self._turns.get(key)
+            if histogram is None:
+                histogram = self._turns[key] = Histogram(self.buckets)
+            histogram.observe(turn.total)
+            self._recent[turn.id] = data
+            while len(self._recent) > self.history:
+                self._recent.popitem(last=False)
+        if _current_turn.get() is turn:
+            _current_turn.set(None)
+        if self.on_turn:
+            try:
+                self.on_turn(data)
+            except Exception as e:
+                print(f"Turn trace notify failed: {e}")
+
+    def discard(self, turn):
+        """Drops a turn that never became an exchange (e.g. silence). Its spans stay in the histograms."""
+        if _current_turn.get() is turn:
+            _current_turn.set(None)
+
+    def recent(self, limit=20):
+        with self._lock:
+            return list(self._recent.values())[-limit:]
+
+    def prometheus(self):
+        """All histograms in the Prometheus text exposition format."""
+        with self._lock:
+            lines = ['# HELP sami_stage_seconds Time spent in each stage of a voice/text turn.',
+                     '# TYPE sami_stage_seconds histogram']
+            for stage in sorted(self._stages):
+                lines += self._stages[stage].lines('sami_stage_seconds', {'stage': stage})
+            lines += ['# HELP sami_turn_seconds End-to-end time of a voice/text turn.',
+                      '# TYPE sami_turn_seconds histogram']
+            for source, outcome in sorted(self._turns):
+                lines += self._turns[(source, outcome)].lines('sami_turn_seconds',
+                                                              {'source': source, 'outcome': outcome})
+        return '\n'.join(lines) + '\n'
+
+
+_shared_tracer = None
+_shared_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _shared_tracer
+    with _shared_tracer_lock:
+        if _shared_tracer is None:
+            _shared_tracer = TurnTracer()
+        return _shared_tracer
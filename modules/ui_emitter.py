@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import deque
+
+import config
+
+
+class UIEmitter:
+    """
+    Sends UI events from one background thread so callers on the voice and
+    command paths never block on (or sleep after) socket writes.
+    State events (status, mic state) are coalesced per event and recipient:
+    only the newest value is sent, superseded ones are dropped. Everything
+    else (conversation updates) is kept in order and flushed together once
+    per UI_EMIT_WINDOW, after which the latest state goes out.
+    """
+
+    STATE_EVENTS = {'status_update', 'mic_state_update', 'mic_state'}
+
+    def __init__(self, emit, window=None, max_pending=None):
+        self._emit = emit # emit(event, data, to)
+        self.window = window if window is not None else config.UI_EMIT_WINDOW
+        self.max_pending = max_pending or config.UI_EMIT_MAX_PENDING
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = deque() # (event, data, to) in order
+        self._state = {} # (event, to) -> data, newest only
+        self.emitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._thread = None # Started by the first publish(), not on import of main
+
+    def publish(self, event, data, to=None):
+        """Queues an event for the emitter thread. Never blocks on the socket."""
+        with self._lock:
+            if event in self.STATE_EVENTS:
+                key = (event, to)
+                if self._state.pop(key, None) is not None:
+                    self.coalesced += 1
+                self._state[key] = data
+            else:
+                self._events.append((event, data, to))
+                if len(self._events) > self.max_pending:
+                    # A client this far behind only needs the recent history
+                    self._events.popleft()
+                    self.dropped += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ui-emitter")
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Let a burst (e.g. user text + status + reply) land in one flush
+            if self.window:
+                time.sleep(self.window)
+            with self._lock:
+                self._wake.clear()
+                events, self._events = self._events, deque()
+                state, self._state = self._state, {}
+
+            batch = list(events) + [(event, data, to) for (event, to), data in state.items()]
+            for event, data, to in batch:
+                try:
+                    self._emit(event, data, to)
+                    self.emitted += 1
+                except Exception as e:
+                    print(f"UI emit error ({event}): {e}")
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._events) + len(self._state)
+        return {"pending": pending, "emitted": self.emitted, "coalesced": self.coalesced, "dropped": self.dropped}
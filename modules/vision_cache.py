@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def prepare_image(img, long_edge=None):
+    """
+    Normalizes an image before it goes to the vision model: applies the EXIF
+    orientation, converts to RGB and downscales so the longest side is at most
+    `long_edge` (VISION_MAX_EDGE) pixels. Never upscales.
+    """
+    from PIL import Image, ImageOps
+
+    long_edge = long_edge or config.VISION_MAX_EDGE
+    if img.format == 'JPEG' and max(img.size) > long_edge * 2:
+        # Let the JPEG decoder skip most of the pixels instead of resizing them afterwards
+        img.draft('RGB', (long_edge, long_edge))
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel('A'))
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if max(img.size) > long_edge:
+        scale = long_edge / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    return img
+
+
+def perceptual_hash(img, hash_size=None):
+    """
+    Difference hash (dHash) over rows and columns of a tiny grayscale
+    thumbnail, plus a thermometer code of the mean brightness so flat or
+    evenly shaded images of different tones don't collide. Near-identical
+    images (re-encodes, resizes, a blinking cursor) get hashes a few bits
+    apart. Returns an int of 2 * hash_size**2 + 16 bits.
+    """
+    import numpy as np
+    from PIL import Image
+
+    hash_size = hash_size or config.VISION_HASH_SIZE
+    gray = img.convert('L')
+    rows = np.asarray(gray.resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    cols = np.asarray(gray.resize((hash_size, hash_size + 1), Image.BILINEAR), dtype=np.int16)
+    level = int(rows.mean()) // 16
+    bits = np.concatenate([
+        (rows[:, 1:] > rows[:, :-1]).flatten(),
+        (cols[1:, :] > cols[:-1, :]).flatten(),
+        np.arange(16) < level
+    ])
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class VisionResultCache:
+    """
+    Remembers vision answers by (perceptual hash, prompt). A lookup matches
+    when the prompt is the same and the hash is within VISION_HASH_MAX_DISTANCE
+    bits, so asking about an unchanged screen or a re-sent photo skips the
+    paid model call. Bounded LRU with a TTL.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, max_distance=None):
+        self.max_entries = max_entries or config.VISION_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.VISION_CACHE_TTL
+        self.max_distance = max_distance if max_distance is not None else config.VISION_HASH_MAX_DISTANCE
+        self._entries = OrderedDict() # (prompt, hash) -> (result, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _prompt_key(prompt):
+        return ' '.join(str(prompt).lower().split())
+
+    def get(self, image_hash, prompt):
+        prompt = self._prompt_key(prompt)
+        now = time.time()
+        with self._lock:
+            best = None
+            for key, (result, stored_at) in list(self._entries.items()):
+                if now - stored_at > self.ttl:
+                    del self._entries[key]
+                    continue
+                if key[0] != prompt:
+                    continue
+                distance = hamming(key[1], image_hash)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, key, result)
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best[1])
+            self.hits += 1
+            return best[2]
+
+    def put(self, image_hash, prompt, result):
+        with self._lock:
+            key = (self._prompt_key(prompt), image_hash)
+            self._entries[key] = (result, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from modules.vision_cache import perceptual_hash
+
+
+class VisionJobQueue:
+    """
+    Runs vision calls for /analyze_image?async=1 off the request threads.
+    A fixed pool of VISION_JOB_WORKERS threads does the model calls; at most
+    VISION_JOB_MAX_QUEUE jobs may wait or run at once, beyond that submit()
+    raises queue.Full (HTTP 429). The same image + prompt submitted while a
+    job for it is in flight is attached to that job instead of queued again.
+    on_result gets the session rooms of everyone who submitted the job.
+    """
+
+    def __init__(self, run, on_result=None, workers=None, max_queue=None):
+        self._run = run # run(prompt, image) -> str
+        self.on_result = on_result # on_result(job_dict, rooms)
+        self.max_queue = max_queue or config.VISION_JOB_MAX_QUEUE
+        self._pool = ThreadPoolExecutor(max_workers=workers or config.VISION_JOB_WORKERS,
+                                        thread_name_prefix="vision-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict() # job_id -> job dict, most recent last
+        self._active = {} # (image_hash, prompt) -> job_id while queued/running
+        self._rooms = {} # job_id -> session rooms of its submitters while queued/running
+        self.deduplicated = 0
+        self.rejected = 0
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._active)
+
+    def submit(self, prompt, image, room=None):
+        """
+        Queues a vision call and returns its job dict. Raises queue.Full when saturated.
+        `room` is the submitter's session room (None: it only polls /jobs/<id>).
+        """
+        key = (perceptual_hash(image), ' '.join(prompt.lower().split()))
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id in self._jobs:
+                if room:
+                    self._rooms[job_id].add(room)
+                self.deduplicated += 1
+                return dict(self._jobs[job_id], deduplicated=True)
+            if len(self._active) >= self.max_queue:
+                self.rejected += 1
+                raise queue.Full("Vision queue is full")
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'prompt': prompt,
+                'status': 'queued',
+                'created': time.time()
+            }
+            self._jobs[job['job_id']] = job
+            self._active[key] = job['job_id']
+            self._rooms[job['job_id']] = {room} if room else set()
+            while len(self._jobs) > config.VISION_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        self._pool.submit(self._work, key, job['job_id'], prompt, image)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def _work(self, key, job_id, prompt, image):
+        started = time.time()
+        self._update(job_id, status='running', started=started)
+        try:
+            result = self._run(prompt, image)
+            job = self._update(job_id, status='done', response=result, seconds=round(time.time() - started, 2))
+        except Exception as e:
+            print(f"Vision job {job_id} failed: {e}")
+            job = self._update(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                if self._active.get(key) == job_id:
+                    del self._active[key]
+                rooms = sorted(self._rooms.pop(job_id, ()))
+
+        if job and self.on_result:
+            try:
+                self.on_result(job, rooms)
+            except Exception as e:
+                print(f"vision_result notify failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._active), "max_queue": self.max_queue,
+                    "deduplicated": self.deduplicated, "rejected": self.rejected}
@@ -1,7 +1,19 @@
 import pyttsx3
 import speech_recognition as sr
 import config
+import contextlib
+import itertools
+import queue
 import threading
+import time
+import uuid
+from modules.audio_playback import AudioPlayer, ChunkBuffer, TTS_SAMPLE_RATE, decode_mp3
+from modules.mic_capture import MicCapture
+from modules.sentence_splitter import SentenceSplitter
+from modules.stt_backends import STTError, STTRouter
+from modules.tts_cache import TTSCache
+from modules.turn_trace import get_tracer
+from modules.wake_word import load_wake_detector
 
 class VoiceEngine:
     def __init__(self, on_update=None):
@@ -21,10 +33,34 @@ class VoiceEngine:
             print("Warning: PyAudio not found or microphone unavailable. Voice input disabled.")
             self.microphone = None
             self.has_mic = False
+
+        # Speech-to-text backends (online/offline) with per-language routing and fallback
+        self.stt = STTRouter()
+
+        # Always-on capture: utterances are cut by VAD in the background and queued for listen()
+        self.capture = None
+        if self.has_mic and getattr(config, 'MIC_ALWAYS_ON', False):
+            try:
+                self.capture = MicCapture().start()
+                print(f"Mic capture running ({self.capture.vad.name} VAD).")
+            except Exception as e:
+                print(f"Warning: Always-on mic capture failed ({e}). Opening the mic per listen instead.")
+                self.capture = None
+
+        # Offline wake word on the capture frames; without it standby sends every utterance to STT
+        self.wake = None
+        self._wake_armed = False
+        if self.capture and getattr(config, 'WAKE_ENGINE', 'stt') == 'template':
+            self.wake = load_wake_detector()
+            if self.wake:
+                self.capture.listeners.append(self._feed_wake)
+                print(f"Offline wake word ready ({len(self.wake.templates)} recordings).")
         
         # Callback for UI updates
         self.on_update = on_update
         self.lock = threading.Lock()
+        self.player = AudioPlayer() # Streams TTS audio from memory when PyAudio + miniaudio are available
+        self.tts_cache = TTSCache() # Synthesized phrases by (text, voice, rate, engine)
 
     def set_voice_properties(self):
         """Configures voice rate and volume."""
@@ -36,58 +72,337 @@ class VoiceEngine:
             
         self.engine.setProperty('rate', config.SPEECH_RATE)
 
+    async def _render_edge_tts(self, text, voice, rate, on_chunk=None):
+        """Downloads the Edge TTS MP3 for `text` into memory; `on_chunk` gets each piece as it arrives."""
+        import edge_tts
+
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+                if on_chunk:
+                    on_chunk(chunk["data"])
+        return b''.join(chunks)
+
     async def _speak_edge_tts(self, text, voice="en-US-AriaNeural"):
-        """Async helper for Edge TTS."""
+        """
+        Async helper for Edge TTS. MP3 chunks are decoded and played as they
+        arrive, so speech starts with the first chunk instead of after the
+        whole file; nothing touches the disk. Phrases in the TTS cache are
+        played without a request.
+        """
         import edge_tts
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        turn = get_tracer().current() # Executor threads don't inherit it
+        rate = getattr(config, 'EDGE_TTS_RATE', "+0%")
+        key = self._cache_key(text, voice, rate, 'edge')
+        audio = self.tts_cache.get(key) if key else None
+        if audio:
+            await loop.run_in_executor(None, self._play_cached, audio, turn)
+            return
+
+        if not self.player.streaming:
+            # No decoder: download into memory, then play with pygame
+            audio = await self._render_edge_tts(text, voice, rate)
+            self._cache_put(key, audio)
+            await loop.run_in_executor(None, self._play_mp3_pygame, audio, turn)
+            return
+
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        buffer = ChunkBuffer()
+        chunks = []
+        playback = loop.run_in_executor(None, self._play_mp3_stream, buffer, turn)
+        download_error = None
+        try:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    buffer.write(chunk["data"])
+                    chunks.append(chunk["data"])
+        except Exception as e:
+            download_error = e
+        finally:
+            buffer.close()
+        if not download_error:
+            self._cache_put(key, b''.join(chunks))
+        played = (await asyncio.gather(playback, return_exceptions=True))[0]
+        if download_error or isinstance(played, Exception):
+            print(f"EdgeTTS Playback Error: {download_error or played}")
+            raise download_error or played # Re-raise to trigger fallback
+
+    def _cache_key(self, text, voice, rate, engine):
+        """TTS cache key, or None for replies too long to be worth caching."""
+        if len(text) > getattr(config, 'TTS_CACHE_MAX_CHARS', 300):
+            return None
+        return TTSCache.key(text, voice, rate, engine)
+
+    def _cache_put(self, key, audio):
+        if key:
+            self.tts_cache.put(key, audio)
+
+    def _play_cached(self, audio, turn=None):
+        """Plays MP3 bytes that are already in memory (a TTS cache hit)."""
+        if not self.player.streaming:
+            self._play_mp3_pygame(audio, turn)
+            return
+        buffer = ChunkBuffer()
+        buffer.write(audio)
+        buffer.close()
+        self._play_mp3_stream(buffer, turn)
+
+    def _play_mp3_stream(self, buffer, turn=None, wait_stage='tts.first_audio'):
+        """
+        Decodes MP3 from `buffer` while it fills and plays it; `wait_stage`
+        is the wait for sound. False if no audio came.
+        """
+        tracer = get_tracer()
+        blocks = decode_mp3(buffer)
+        with tracer.span(wait_stage, turn):
+            first = next(blocks, None)
+        if first is None:
+            return False
+        with tracer.span('tts.play', turn):
+            self.player.play(itertools.chain([first], blocks), TTS_SAMPLE_RATE)
+        return True
+
+    def _play_mp3_pygame(self, audio, turn=None):
+        """Plays a complete MP3 from memory with pygame (fallback when streaming isn't available)."""
+        import io
         import os
-        import tempfile
-        
+
         # Suppress pygame welcome message
         os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
         import pygame
-        # playsound import moved to fallback block
 
-        import uuid
-        import time
-        import asyncio
-        
-        temp_dir = tempfile.gettempdir()
-        # Use unique filename to avoid "Permission denied" or file lock errors
-        unique_id = str(uuid.uuid4())
-        output_file = os.path.join(temp_dir, f"sami_edge_{unique_id}.mp3")
-        
-        try:
-            communicate = edge_tts.Communicate(text, voice)
-            await communicate.save(output_file)
-            
-            # Play audio
+        with get_tracer().span('tts.play', turn):
             pygame.mixer.init()
-            pygame.mixer.music.load(output_file)
+            pygame.mixer.music.load(io.BytesIO(audio), "mp3")
             pygame.mixer.music.play()
             while pygame.mixer.music.get_busy():
-                await asyncio.sleep(0.1) # Async sleep to allow other tasks
-                
-            # Cleanup
+                time.sleep(0.05)
             pygame.mixer.music.unload()
+
+    def _play_mp3(self, chunks, cache_key=None):
+        """
+        Plays MP3 bytes from an iterator of chunks (e.g. gTTS.stream()),
+        streaming when possible. A complete download is stored under
+        `cache_key` in the TTS cache.
+        """
+        if not self.player.streaming:
+            audio = b''.join(chunks)
+            self._cache_put(cache_key, audio)
+            self._play_mp3_pygame(audio)
+            return
+        buffer = ChunkBuffer()
+
+        def download():
+            received = []
             try:
-                os.remove(output_file)
-            except: pass
-            
+                for chunk in chunks:
+                    buffer.write(chunk)
+                    received.append(chunk)
+                self._cache_put(cache_key, b''.join(received))
+            finally:
+                buffer.close()
+
+        threading.Thread(target=download, daemon=True, name="tts-download").start()
+        self._play_mp3_stream(buffer)
+
+    async def speak_async(self, text, language='en', turn=None, to=None):
+        """
+        speak() for asyncio callers. Edge TTS is awaited on the caller's event
+        loop; the local and gTTS engines block, so they run in an executor.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if not getattr(config, 'USE_LIFELIKE_TTS', False):
+            return await loop.run_in_executor(None, self.speak, text, language, turn, to)
+
+        print(f"{config.SYSTEM_NAME}: {text}")
+        if self.on_update:
+            self.on_update("conversation", {"role": "sami", "text": text}, to=to)
+            self.on_update("status", {"status": "Speaking..."}, to=to)
+
+        # Same lock as speak(), so threaded and async speech never overlap
+        tracer = get_tracer()
+        turn = turn or tracer.current()
+        with tracer.span('tts.wait', turn):
+            await loop.run_in_executor(None, self.lock.acquire)
+        try:
+            try:
+                with tracer.activate(turn), self._mic_hold(), tracer.span('tts'):
+                    await self._speak_edge_tts(text, getattr(config, 'EDGE_TTS_VOICE', "en-US-AriaNeural"))
+            except Exception as e:
+                print(f"EdgeTTS Error: {e}. Switching to Local Fallback.")
+                await loop.run_in_executor(None, self._speak_local, text)
+        finally:
+            self.lock.release()
+
+    def _speak_local(self, text):
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        except RuntimeError:
+            pass # Already running
         except Exception as e:
-            print(f"EdgeTTS Playback Error: {e}")
-            raise e # Re-raise to trigger fallback
+            print(f"CRITICAL: Local TTS also failed: {e}")
+
+    @contextlib.contextmanager
+    def _speech_lock(self, turn=None):
+        """Holds self.lock; the wait for it is the turn's 'tts.wait' stage."""
+        with get_tracer().span('tts.wait', turn):
+            self.lock.acquire()
+        try:
+            with self._mic_hold():
+                yield
+        finally:
+            self.lock.release()
+
+    def _mic_hold(self):
+        """Keeps SAMi's own voice from being captured as an utterance."""
+        return self.capture.hold() if self.capture else contextlib.nullcontext()
+
+    def _feed_wake(self, frame, speech):
+        if self._wake_armed:
+            self.wake.feed(frame, speech)
+
+    def wait_for_wake(self, timeout=None):
+        """
+        Standby: True once the offline detector hears the wake word (False
+        after `timeout`). Speech from before it is dropped, so the next
+        listen() returns the utterance that carried the wake word.
+        """
+        if not self._wake_armed:
+            self.wake.reset()
+            self._wake_armed = True
+        fired_at = self.wake.wait(timeout)
+        if fired_at is None:
+            return False
+        self._wake_armed = False # Not needed while a conversation is active
+        self.capture.clear(before=fired_at)
+        return True
+
+    @staticmethod
+    def _gtts_voice(language):
+        """gTTS language code and TLD (accent) for a code like 'en-in'."""
+        # gTTS usually takes 2 letter code, but some like 'en-in' work or map to 'en'
+        lang_code = language.split('-')[0]
+        tld = 'com'
+        if 'in' in language:
+            tld = 'co.in'
+        elif 'uk' in language:
+            tld = 'co.uk'
+        return lang_code, tld
+
+    def _tts_settings(self, language='en'):
+        """(voice, rate, engine) of the network voice speak() uses for `language`; None for the local voice."""
+        if getattr(config, 'USE_LIFELIKE_TTS', False):
+            return (getattr(config, 'EDGE_TTS_VOICE', "en-US-AriaNeural"), getattr(config, 'EDGE_TTS_RATE', "+0%"),
+                    'edge')
+        if config.USE_FAST_TTS:
+            return None
+        lang_code, tld = self._gtts_voice(language)
+        return f"{lang_code}.{tld}", 'normal', 'gtts'
+
+    def _render(self, text, settings, on_chunk=None):
+        """Downloads the MP3 for `text` with `settings` (see _tts_settings); `on_chunk` gets each piece."""
+        voice, rate, engine = settings
+        if engine == 'edge':
+            import asyncio
+            return asyncio.run(self._render_edge_tts(text, voice, rate, on_chunk))
+        from gtts import gTTS
+        lang_code, tld = voice.split('.', 1)
+        chunks = []
+        for chunk in gTTS(text=text, lang=lang_code, tld=tld, slow=False).stream():
+            chunks.append(chunk)
+            if on_chunk:
+                on_chunk(chunk)
+        return b''.join(chunks)
 
-    def speak(self, text, language='en'):
-        """Converts text to speech."""
+    def _synthesize(self, text, language, buffer):
+        """
+        Writes the MP3 for `text` into `buffer` as it downloads, or straight
+        from the TTS cache. Does nothing for the local voice.
+        """
+        settings = self._tts_settings(language)
+        if settings is None:
+            return
+        key = self._cache_key(text, *settings)
+        audio = self.tts_cache.get(key) if key else None
+        if audio:
+            buffer.write(audio)
+        else:
+            self._cache_put(key, self._render(text, settings, buffer.write))
+
+    def prerender(self, phrases, language='en'):
+        """
+        Synthesizes `phrases` into the TTS cache with the current voice
+        settings without playing them, so they start instantly the first
+        time they are said. Returns how many were fetched.
+        """
+        settings = self._tts_settings(language)
+        if settings is None:
+            return 0 # Local voice: nothing to fetch
+        rendered = 0
+        for text in dict.fromkeys(phrases):
+            key = self._cache_key(text, *settings)
+            if not key or key in self.tts_cache:
+                continue
+            try:
+                audio = self._render(text, settings)
+            except Exception as e:
+                print(f"TTS pre-render stopped: {e}")
+                break
+            self.tts_cache.put(key, audio)
+            rendered += 1
+        return rendered
+
+    def reply_stream(self, language='en', turn=None, to=None):
+        """A ReplySpeech for a reply that is still being generated (see nova.process(on_delta=...))."""
+        return ReplySpeech(self, language, turn, to)
+
+    def _play_sentence(self, sentence, turn, wait_stage):
+        """Plays one ReplySpeech sentence; the local voice stands in when none of its audio arrived."""
+        if not sentence.local:
+            played = False
+            try:
+                if self.player.streaming:
+                    played = self._play_mp3_stream(sentence.buffer, turn, wait_stage)
+                else:
+                    audio = b''.join(iter(lambda: sentence.buffer.read(64 * 1024), b''))
+                    if audio:
+                        self._play_mp3_pygame(audio, turn)
+                        played = True
+            except Exception as e:
+                print(f"TTS Playback Error: {e}")
+            if played:
+                return
+            print(f"TTS Error: {sentence.error or 'no audio'}. Switching to Local Fallback.")
+        self._speak_local(sentence.text)
+
+    def set_listening(self, enabled):
+        """Mic on/off from the UI; with always-on capture this opens/closes the device."""
+        if self.capture:
+            self.capture.set_enabled(enabled)
+
+    def speak(self, text, language='en', turn=None, to=None):
+        """
+        Converts text to speech. `turn` (default: the current one) gets the TTS
+        stage timings; `to` limits the UI updates to one client/session room.
+        """
         print(f"{config.SYSTEM_NAME}: {text}")
         
         # Notify UI
         if self.on_update:
-            self.on_update("conversation", {"role": "sami", "text": text})
-            self.on_update("status", {"status": "Speaking..."})
+            self.on_update("conversation", {"role": "sami", "text": text}, to=to)
+            self.on_update("status", {"status": "Speaking..."}, to=to)
 
+        tracer = get_tracer()
+        turn = turn or tracer.current()
         # Use lock to prevent overlapping speech and race conditions
-        with self.lock:
+        with tracer.activate(turn), self._speech_lock(turn), tracer.span('tts'):
             # LIFELIKE MODE (Edge TTS)
             if hasattr(config, 'USE_LIFELIKE_TTS') and config.USE_LIFELIKE_TTS:
                 import asyncio
@@ -126,48 +441,16 @@ class VoiceEngine:
             else:
                 try:
                     # Map full language code (e.g., 'en-in') to gTTS code (e.g., 'en') and TLD
-                    # gTTS usually takes 2 letter code, but some like 'en-in' work or map to 'en'
-                    lang_code = language.split('-')[0]
-                    tld = 'com'
-                    if 'in' in language:
-                        tld = 'co.in' 
-                    elif 'uk' in language:
-                        tld = 'co.uk'
-                    
-                    # Create MP3
-                    from gtts import gTTS
-                    import os
-                    import tempfile
-                    
-                    # Use temp directory to avoid path issues with spaces (Error 277)
-                    temp_dir = tempfile.gettempdir()
-                    filename = os.path.join(temp_dir, "sami_response.mp3")
-                    
-                    tts = gTTS(text=text, lang=lang_code, tld=tld, slow=False)
-                    
-                    # Remove old file if exists
-                    if os.path.exists(filename):
-                        try:
-                            os.remove(filename)
-                        except:
-                            pass
-                    
-                    tts.save(filename)
-                    
-                    # Play MP3 using Pygame for consistency
-                    import os
-                    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
-                    import pygame
-                    try:
-                        pygame.mixer.init()
-                        pygame.mixer.music.load(filename)
-                        pygame.mixer.music.play()
-                        while pygame.mixer.music.get_busy():
-                            pygame.time.Clock().tick(10)
-                    except Exception:
-                        # Fallback to playsound
-                        from playsound import playsound
-                        playsound(filename)
+                    lang_code, tld = self._gtts_voice(language)
+                    key = self._cache_key(text, f"{lang_code}.{tld}", 'normal', 'gtts')
+                    audio = self.tts_cache.get(key) if key else None
+                    if audio:
+                        self._play_cached(audio)
+                    else:
+                        # Played from memory as it downloads (no temp file)
+                        from gtts import gTTS
+                        tts = gTTS(text=text, lang=lang_code, tld=tld, slow=False)
+                        self._play_mp3(tts.stream(), key)
                         
                 except Exception as e:
                     print(f"gTTS Error: {e}. Fallback to pyttsx3.")
@@ -178,29 +461,60 @@ class VoiceEngine:
                         pass
 
         if self.on_update:
-            self.on_update("status", {"status": "Idle"})
+            self.on_update("status", {"status": "Idle"}, to=to)
+
+    def _recognize_next_utterance(self, language):
+        """
+        Streams the next complete utterance from the capture thread into an
+        STT stream and returns it (ready for finish()). Raises
+        sr.WaitTimeoutError if nobody speaks within MIC_LISTEN_TIMEOUT.
+        """
+        deadline = time.time() + config.MIC_LISTEN_TIMEOUT
+        while True:
+            try:
+                utterance = self.capture.get(timeout=max(0.01, deadline - time.time()))
+            except queue.Empty:
+                raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+            recognition = self.stt.stream(utterance.rate, language)
+            for chunk in utterance.chunks(timeout=2):
+                recognition.feed(chunk)
+            if utterance.wait(timeout=0):
+                return recognition
+            # A click or bump rather than speech: wait for the next one
 
-    def listen(self, language=config.DEFAULT_LANG):
-        """Listens to the user via microphone and returns text."""
+    def listen(self, language=config.DEFAULT_LANG, turn=None):
+        """Listens to the user via microphone and returns text. Stage timings go to `turn` (default: current)."""
         if not self.has_mic:
             import time
             time.sleep(1) # Prevent tight loop if called in loop
             return ""
 
+        tracer = get_tracer()
         try:
-            with self.microphone as source:
-                print("Listening...")
-                if self.on_update:
-                    self.on_update("status", {"status": f"Listening ({language})..."})
-                
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5) # Better calib
-                audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
+            if self.on_update:
+                self.on_update("status", {"status": f"Listening ({language})..."})
+            print("Listening...")
+            if self.capture:
+                # Audio is fed to the recognizer while the user is still speaking
+                with tracer.span('listen.capture', turn):
+                    recognition = self._recognize_next_utterance(language)
+            else:
+                with self.microphone as source:
+                    with tracer.span('listen.calibrate', turn):
+                        self.recognizer.adjust_for_ambient_noise(source, duration=0.5) # Better calib
+                    with tracer.span('listen.capture', turn):
+                        audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
+                recognition = self.stt.stream(audio.sample_rate, language)
+                recognition.feed(audio.get_raw_data(convert_width=2))
             
             print("Recognizing...")
             if self.on_update:
                 self.on_update("status", {"status": "Processing..."})
                 
-            text = self.recognizer.recognize_google(audio, language=language)
+            with tracer.span('stt', turn):
+                text = recognition.finish()
+            if not text:
+                raise sr.UnknownValueError()
             print(f"User: {text}")
             
             if self.on_update:
@@ -214,10 +528,139 @@ class VoiceEngine:
         except sr.UnknownValueError:
             print(">> Audio unclear (or no speech detected).")
             return ""
-        except sr.RequestError as e:
+        except STTError as e:
             print(f">> Speech API Error: {e}")
             self.speak("Sorry, my speech service is down.")
             return ""
         except Exception as e:
             print(f"Error: {e}")
             return ""
+
+
+class _Sentence:
+    def __init__(self, text, local):
+        self.text = text
+        self.local = local # Spoken by pyttsx3, nothing to fetch
+        self.buffer = ChunkBuffer() # MP3, filled while it may already be playing
+        self.error = None
+
+
+class ReplySpeech:
+    """
+    Speaks a reply while it is still being generated. feed() takes text
+    deltas (LLM tokens), passes them on to the UI as conversation deltas
+    and cuts them into sentences. A synthesis thread fetches each sentence's
+    audio while the one before it plays on a playback thread, so the first
+    audio waits for the first sentence rather than the whole answer.
+    finish() speaks what is left and returns once SAMi has stopped talking;
+    cancel() ends a reply that will never be finished (call one of them, or
+    the playback thread holds the speech lock forever).
+    UI updates go to `to` (a client/session room), or to everyone.
+    """
+
+    def __init__(self, voice, language='en', turn=None, to=None):
+        self.voice = voice
+        self.language = language
+        self.turn = turn or get_tracer().current()
+        self.to = to
+        self.id = uuid.uuid4().hex[:10] # Ties the UI deltas to the final message
+        self.text = '' # Everything fed so far
+        self.splitter = SentenceSplitter()
+        self._sentences = queue.Queue() # Text waiting for synthesis (None ends it)
+        self._ready = queue.Queue() # _Sentence in speaking order (None ends it)
+        self._threads = []
+        self._ended = False
+
+    def feed(self, delta):
+        if not delta or self._ended:
+            return
+        self.text += delta
+        if self.voice.on_update:
+            self.voice.on_update("conversation", {"role": "sami", "reply_id": self.id, "delta": delta}, to=self.to)
+        for sentence in self.splitter.feed(delta):
+            self._queue(sentence)
+
+    def _queue(self, sentence):
+        if not self._threads:
+            if self.voice.on_update:
+                self.voice.on_update("status", {"status": "Speaking..."}, to=self.to)
+            self._threads = [threading.Thread(target=self._synthesize_all, daemon=True, name="tts-synth"),
+                             threading.Thread(target=self._play_all, daemon=True, name="tts-play")]
+            for thread in self._threads:
+                thread.start()
+        self._sentences.put(sentence)
+
+    def finish(self, text=None):
+        """
+        Ends the reply. `text` is the engine's final answer: what wasn't fed
+        (all of it if the reply wasn't streamed, e.g. a rule or cloud reply)
+        is spoken too. Blocks until playback is done.
+        """
+        if self._ended:
+            return
+        text, fed = (text or '').strip(), self.text.strip()
+        if text.startswith(fed):
+            rest, full = text[len(fed):], text
+        else:
+            # Something else came back after streaming (e.g. an error): say it after what was said
+            for sentence in self.splitter.flush():
+                self._queue(sentence)
+            rest, full = text, f"{fed}\n{text}" if fed else text
+        if full:
+            print(f"{config.SYSTEM_NAME}: {full}")
+            if self.voice.on_update:
+                self.voice.on_update("conversation", {"role": "sami", "reply_id": self.id, "text": full}, to=self.to)
+        for sentence in self.splitter.feed(rest) + self.splitter.flush():
+            self._queue(sentence)
+        self._end()
+
+    def cancel(self):
+        """
+        Ends the reply without the rest of it (e.g. generation failed): text
+        not yet synthesized is dropped. Blocks until the playback thread has
+        let go of the speech lock. Does nothing after finish().
+        """
+        if self._ended:
+            return
+        while True:
+            try:
+                self._sentences.get_nowait()
+            except queue.Empty:
+                break
+        self._end()
+
+    def _end(self):
+        self._ended = True # Late deltas (a generation that outlived its caller) are ignored
+        if not self._threads:
+            return
+        self._sentences.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.voice.on_update:
+            self.voice.on_update("status", {"status": "Idle"}, to=self.to)
+
+    def _synthesize_all(self):
+        while True:
+            text = self._sentences.get()
+            if text is None:
+                self._ready.put(None)
+                return
+            sentence = _Sentence(text, local=self.voice._tts_settings(self.language) is None)
+            self._ready.put(sentence)
+            if not sentence.local:
+                try:
+                    self.voice._synthesize(text, self.language, sentence.buffer)
+                except Exception as e:
+                    sentence.error = e
+            sentence.buffer.close()
+
+    def _play_all(self):
+        tracer = get_tracer()
+        wait_stage = 'tts.first_audio'
+        with tracer.activate(self.turn), self.voice._speech_lock(self.turn), tracer.span('tts'):
+            while True:
+                sentence = self._ready.get()
+                if sentence is None:
+                    return
+                self.voice._play_sentence(sentence, self.turn, wait_stage)
+                wait_stage = 'tts.sentence_wait' # Later sentences only wait if synthesis fell behind
@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+import wave
+
+import config
+
+# MFCC front end: 25 ms windows every 10 ms, 26 mel bands, cepstra 1-12 (c0 is
+# dropped so loudness doesn't matter)
+WINDOW_MS = 25
+HOP_MS = 10
+MEL_BANDS = 26
+CEPSTRA = 12
+
+_mel_cache = {}
+
+
+def _mel_filterbank(rate, n_fft):
+    import numpy as np
+
+    key = (rate, n_fft)
+    if key not in _mel_cache:
+        to_mel = lambda hz: 2595 * np.log10(1 + hz / 700)
+        to_hz = lambda mel: 700 * (10 ** (mel / 2595) - 1)
+        edges = to_hz(np.linspace(to_mel(60), to_mel(rate / 2), MEL_BANDS + 2))
+        bins = np.floor((n_fft + 1) * edges / rate).astype(int)
+        bank = np.zeros((MEL_BANDS, n_fft // 2 + 1))
+        for m in range(1, MEL_BANDS + 1):
+            left, center, right = bins[m - 1], bins[m], bins[m + 1]
+            if center > left:
+                bank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+            if right > center:
+                bank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+        n = np.arange(MEL_BANDS)
+        dct = np.cos(np.pi / MEL_BANDS * (n + 0.5)[None, :] * np.arange(1, CEPSTRA + 1)[:, None])
+        _mel_cache[key] = (bank, dct)
+    return _mel_cache[key]
+
+
+def mfcc(samples, rate):
+    """MFCC frames (n_frames x CEPSTRA) of int16/float samples; empty if shorter than one window."""
+    import numpy as np
+
+    window = int(rate * WINDOW_MS / 1000)
+    hop = int(rate * HOP_MS / 1000)
+    x = np.asarray(samples, dtype=np.float32)
+    if len(x) < window:
+        return np.zeros((0, CEPSTRA), dtype=np.float32)
+    x = np.append(x[0], x[1:] - 0.97 * x[:-1]) # Pre-emphasis
+    count = 1 + (len(x) - window) // hop
+    frames = np.lib.stride_tricks.sliding_window_view(x, window)[::hop][:count] * np.hamming(window)
+    n_fft = 1 << (window - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames, n_fft)) ** 2 / n_fft
+    bank, dct = _mel_filterbank(rate, n_fft)
+    energies = np.log(power @ bank.T + 1e-6)
+    return (energies @ dct.T).astype(np.float32)
+
+
+def trim_silence(samples, rate, ratio=0.1):
+    """Cuts leading/trailing audio quieter than `ratio` of the loudest 10 ms."""
+    import numpy as np
+
+    hop = int(rate * HOP_MS / 1000)
+    x = np.asarray(samples, dtype=np.float32)
+    if len(x) < hop:
+        return x
+    rms = np.sqrt(np.mean(x[:len(x) // hop * hop].reshape(-1, hop) ** 2, axis=1))
+    voiced = np.nonzero(rms > rms.max() * ratio)[0]
+    if not len(voiced):
+        return x[:0]
+    return x[voiced[0] * hop:(voiced[-1] + 1) * hop]
+
+
+def subsequence_dtw(template, window):
+    """
+    Cost of the best alignment of the whole `template` with any stretch of
+    `window` ending at each window frame (both MFCC arrays), divided by the
+    template length. Each template frame advances the window by 0-2 frames,
+    which allows the keyword to be said up to twice as fast or much slower,
+    and lets every row be computed as one vector operation.
+    """
+    import numpy as np
+
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    inf = np.float32(np.inf)
+    row = cost[0].copy() # Free start anywhere in the window
+    for i in range(1, len(template)):
+        stay = row
+        step = np.concatenate(([inf], row[:-1]))
+        skip = np.concatenate(([inf, inf], row[:-2]))
+        row = cost[i] + np.minimum(np.minimum(stay, step), skip)
+    return row / len(template)
+
+
+def _normalize(features):
+    """Cepstral mean normalisation (removes the microphone/room colouring)."""
+    return features - features.mean(axis=0) if len(features) else features
+
+
+def read_wav(path):
+    """(int16 mono samples, rate) of a 16-bit PCM WAV."""
+    import numpy as np
+
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        if f.getnchannels() > 1:
+            samples = samples.reshape(-1, f.getnchannels())[:, 0]
+        return samples, f.getframerate()
+
+
+def write_wav(path, samples, rate):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.astype('int16').tobytes())
+
+
+class WakeWordDetector:
+    """
+    Offline keyword spotter for the standby loop. The wake word is enrolled
+    as a few recordings (WAVs in WAKE_TEMPLATE_DIR, see enroll_wake_word.py);
+    the live mic frames are turned into MFCCs as they arrive and, every
+    WAKE_CHECK_MS while there is speech, the last stretch of audio is matched
+    against each recording with subsequence DTW. The detector fires when the
+    best match is closer than the threshold, which is calibrated from how far
+    the recordings are from each other and scaled by `sensitivity`
+    (0 = strict .. 1 = loose).
+    """
+
+    def __init__(self, templates, rate=None, sensitivity=None, on_wake=None):
+        import numpy as np
+
+        self.rate = rate or config.MIC_SAMPLE_RATE
+        self.templates = [_normalize(mfcc(trim_silence(t, self.rate), self.rate)) for t in templates]
+        self.templates = [t for t in self.templates if len(t) >= 10]
+        if len(self.templates) < 2:
+            raise ValueError("need at least 2 wake word recordings")
+        self.on_wake = on_wake
+        self.window = int(self.rate * WINDOW_MS / 1000)
+        self.hop = int(self.rate * HOP_MS / 1000)
+        # The window searched must fit the slowest template said a bit slower
+        self.max_frames = int(max(len(t) for t in self.templates) * 1.5)
+        self.check_every = max(1, int(config.WAKE_CHECK_MS / HOP_MS))
+        self.refractory = int(config.WAKE_REFRACTORY * 1000 / HOP_MS)
+        self.base_distance = self._calibrate()
+        self.set_sensitivity(config.WAKE_SENSITIVITY if sensitivity is None else sensitivity)
+
+        self._pending = np.zeros(0, dtype=np.float32) # Samples not yet in a full MFCC window
+        self._features = np.zeros((0, CEPSTRA), dtype=np.float32)
+        self._voiced = np.zeros(0, dtype=bool)
+        self._frames = 0 # MFCC frames produced so far (detector clock, HOP_MS each)
+        self._since_check = 0
+        self._quiet_until = 0
+        self._fired = threading.Event()
+        self.fired_at = None # Wall time of the last detection
+        self.detections = 0
+        self.checks = 0
+        self.last_distance = None
+
+    @classmethod
+    def from_directory(cls, path=None, **kwargs):
+        """Loads every .wav in `path` (default WAKE_TEMPLATE_DIR) as a template."""
+        path = path or config.WAKE_TEMPLATE_DIR
+        rate = kwargs.get('rate') or config.MIC_SAMPLE_RATE
+        templates = []
+        for name in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+            if name.lower().endswith('.wav'):
+                samples, file_rate = read_wav(os.path.join(path, name))
+                if file_rate != rate:
+                    raise ValueError(f"{name}: recorded at {file_rate} Hz, the mic runs at {rate} Hz")
+                templates.append(samples)
+        return cls(templates, **kwargs)
+
+    def _calibrate(self):
+        """Median distance from each recording to its nearest other recording."""
+        import numpy as np
+
+        nearest = []
+        for i, template in enumerate(self.templates):
+            distances = [subsequence_dtw(template, other).min()
+                         for j, other in enumerate(self.templates) if j != i]
+            nearest.append(min(distances))
+        return float(np.median(nearest))
+
+    def set_sensitivity(self, sensitivity):
+        self.sensitivity = min(1.0, max(0.0, float(sensitivity)))
+        self.threshold = self.base_distance * (0.8 + 0.8 * self.sensitivity)
+
+    def reset(self):
+        import numpy as np
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._features = self._features[:0]
+        self._voiced = self._voiced[:0]
+
+    def feed(self, samples, speech=True):
+        """
+        Adds int16 mic samples (`speech`: the VAD's verdict for them). Returns
+        True when the wake word ended in this audio.
+        """
+        import numpy as np
+
+        x = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        count = 0 if len(x) < self.window else 1 + (len(x) - self.window) // self.hop
+        if not count:
+            self._pending = x
+            return False
+        used = (count - 1) * self.hop + self.window
+        features = mfcc(x[:used], self.rate)
+        self._pending = x[count * self.hop:]
+        self._features = np.concatenate((self._features, features))[-self.max_frames:]
+        self._voiced = np.concatenate((self._voiced, np.full(count, bool(speech))))[-self.max_frames:]
+        self._frames += count
+        self._since_check += count
+
+        if self._since_check < self.check_every or self._frames < self._quiet_until:
+            return False
+        checked = self._since_check
+        self._since_check = 0
+        if not self._voiced.any() or len(self._features) < min(len(t) for t in self.templates):
+            return False
+        return self._check(checked)
+
+    def _check(self, new_frames):
+        self.checks += 1
+        # Mean over the voiced frames only, like the trimmed recordings
+        voiced = self._features[self._voiced]
+        window = self._features - voiced.mean(axis=0)
+        # Best match ending in any of the frames added since the last check
+        best = min(subsequence_dtw(template, window)[-new_frames:].min() for template in self.templates)
+        self.last_distance = float(best)
+        if best > self.threshold:
+            return False
+        self.detections += 1
+        self._quiet_until = self._frames + self.refractory
+        self.reset()
+        self.fired_at = time.time()
+        self._fired.set()
+        if self.on_wake:
+            try:
+                self.on_wake(self.fired_at)
+            except Exception as e:
+                print(f"Wake word callback failed: {e}")
+        return True
+
+    def wait(self, timeout=None):
+        """Blocks until the wake word is heard; returns its wall time, or None after `timeout`."""
+        if not self._fired.wait(timeout):
+            return None
+        self._fired.clear()
+        return self.fired_at
+
+    def stats(self):
+        return {
+            'templates': len(self.templates),
+            'sensitivity': self.sensitivity,
+            'threshold': round(self.threshold, 3),
+            'last_distance': None if self.last_distance is None else round(self.last_distance, 3),
+            'detections': self.detections
+        }
+
+
+def load_wake_detector(**kwargs):
+    """The enrolled detector, or None (with a hint) when there are not enough recordings."""
+    try:
+        return WakeWordDetector.from_directory(**kwargs)
+    except (OSError, ValueError) as e:
+        print(f"Offline wake word unavailable ({e}). Run enroll_wake_word.py to record it; using cloud STT meanwhile.")
+        return None
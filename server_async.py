@@ -0,0 +1,416 @@
+"""
+Alternate entry point for the SAMi backend: the same web UI, HTTP routes and
+Socket.IO events as main.py, served from one asyncio event loop (FastAPI +
+python-socketio on uvicorn) instead of Flask-SocketIO's thread per client.
+
+Screen streams and /screen push subscribers are coroutines fed by one
+executor wait per capture source; Edge TTS is awaited on the loop; blocking
+work (the microphone loop, NovaEngine routing and its LLM calls, the image
+proxy, image decoding) runs on the existing worker pools or the default
+executor. Voice commands and shared state (nova, voice, queues) are the ones
+main.py creates, so both modes behave the same.
+
+Usage:
+    python server_async.py [--host 0.0.0.0] [--port 5000] [--no-voice]
+"""
+import argparse
+import asyncio
+import contextlib
+import queue
+import tempfile
+import threading
+
+import socketio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from jinja2 import Environment, FileSystemLoader
+from starlette.concurrency import run_in_threadpool
+
+import config
+import main
+from modules.async_stream import AsyncScreenPushManager, stream_parts_async
+from modules.frame_codecs import CODEC_MIME, negotiate_codec
+from modules.frame_encoder import warm_shared_pool
+from modules.image_upload import UploadTooLarge, check_upload_size, decode_json_image, open_image
+from modules.screen_stream import CaptureSource
+from modules.stats_sampler import parse_range
+from modules.vision_cache import prepare_image
+
+_loop = None
+_start_voice = False
+
+
+@contextlib.asynccontextmanager
+async def lifespan(api):
+    global _loop
+    _loop = asyncio.get_running_loop()
+    # UI events from the voice/command threads now go out through this loop
+    main.socket_emit = _threadsafe_emit
+    main.on_vision_result = on_vision_result
+    stats_task = _loop.create_task(emit_system_stats())
+    if _start_voice:
+        # The microphone loop blocks, so it keeps its own thread
+        threading.Thread(target=main.run_voice_assistant, daemon=True).start()
+    yield
+    stats_task.cancel()
+
+
+sio = socketio.AsyncServer(async_mode='asgi')
+api = FastAPI(lifespan=lifespan)
+api.mount('/static', StaticFiles(directory='web/static'), name='static')
+templates = Environment(loader=FileSystemLoader('web/templates'), autoescape=True)
+# index.html is written for Flask; only static URLs are needed
+templates.globals['url_for'] = lambda endpoint, filename: f'/{endpoint}/{filename}'
+app = socketio.ASGIApp(sio, other_asgi_app=api)
+screen_push = None # Built by run() on main's screen hub
+
+
+def _threadsafe_emit(event, data, to=None):
+    """main.socket_emit for this server: hands the emit to the event loop and waits for it."""
+    asyncio.run_coroutine_threadsafe(sio.emit(event, data, to=to), _loop).result(timeout=5)
+
+
+def _conditional(request, response, etag):
+    """Sets the ETag and turns a matching If-None-Match into a 304."""
+    tag = f'"{etag}"'
+    if request.headers.get('if-none-match') in (tag, f'W/{tag}'):
+        headers = {k: v for k, v in response.headers.items() if k not in ('content-length', 'content-type')}
+        response = Response(status_code=304, headers=headers)
+    response.headers['ETag'] = tag
+    return response
+
+
+@api.get('/', response_class=HTMLResponse)
+async def index():
+    return templates.get_template('index.html').render()
+
+
+@api.get('/video_feed')
+async def video_feed(request: Request):
+    args = request.query_params
+    try:
+        screen = main.screen_hub.get(CaptureSource.from_args(args))
+        # MJPEG viewers (<img> tags) stay on JPEG unless they ask for a format
+        codec = None
+        if args.get('format'):
+            codec = negotiate_codec(args.get('format'), request.headers.get('accept'))
+    except ValueError as e:
+        return PlainTextResponse(f"Bad screen source: {e}", 400)
+    except RuntimeError as e:
+        return PlainTextResponse(f"Error: {e}", 503)
+    return StreamingResponse(stream_parts_async(screen, codec), media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+@api.get('/current_frame')
+async def current_frame(request: Request):
+    """Returns a single snapshot for the Flutter app polling."""
+    try:
+        screen = main.screen_hub.get(CaptureSource.from_args(request.query_params))
+        spec = negotiate_codec(request.query_params.get('format'), request.headers.get('accept'))
+    except ValueError as e:
+        return PlainTextResponse(f"Bad screen source: {e}", 400)
+    except RuntimeError as e:
+        return PlainTextResponse(f"Error: {e}", 503)
+    try:
+        frame = await run_in_threadpool(screen.snapshot, codec=spec)
+        if frame is None:
+            return PlainTextResponse("Error: Screen capture unavailable", 503)
+        codec, data = frame.encoded_as(spec)
+        # Unchanged screens keep the same sequence number -> 304 for If-None-Match
+        response = Response(data, media_type=CODEC_MIME[codec],
+                            headers={'Cache-Control': 'no-cache', 'Vary': 'Accept'})
+        return _conditional(request, response, f"{frame.seq}-{codec}")
+    except Exception as e:
+        return PlainTextResponse(f"Error: {e}", 500)
+
+
+@api.get('/monitors')
+async def list_monitors():
+    try:
+        return {'monitors': await run_in_threadpool(main.screen_hub.monitors)}
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, 500)
+
+
+@api.get('/proxy_image')
+async def proxy_image(request: Request):
+    """Same as main.proxy_image; the cache lookup and upstream fetch run in the threadpool."""
+    image_url = request.query_params.get('url')
+    if not image_url:
+        return PlainTextResponse("No URL provided", 400)
+    try:
+        width = int(request.query_params.get('w') or 0)
+        image = await run_in_threadpool(main.image_proxy.get, image_url, width=width if width > 0 else None)
+    except ValueError as e:
+        return PlainTextResponse(f"Bad proxy request: {e}", 400)
+    except RuntimeError as e:
+        print(f"Proxy Upstream Error: {e}")
+        return PlainTextResponse(str(e), 502)
+    except Exception as e:
+        print(f"Proxy Exception: {e}")
+        return PlainTextResponse(f"Proxy Error: {e}", 500)
+
+    print(f"Proxying Image ({image.cache_status}): {image_url}")
+    headers = {'Cache-Control': f'public, max-age={image.max_age}', 'X-Cache': image.cache_status}
+    if image.length is not None:
+        headers['Content-Length'] = str(image.length)
+    if request.headers.get('if-none-match') == f'"{image.etag}"':
+        image.chunks.close()
+        return _conditional(request, Response(headers=headers), image.etag)
+    # Starlette iterates the (blocking) chunk generator in its threadpool
+    response = StreamingResponse(image.chunks, media_type=image.content_type, headers=headers)
+    return _conditional(request, response, image.etag)
+
+
+@api.get('/stats/history')
+async def stats_history(request: Request):
+    try:
+        seconds = parse_range(request.query_params.get('range'))
+        points = int(request.query_params.get('points') or 0) or None
+    except ValueError as e:
+        return JSONResponse({'error': f"Bad range: {e}"}, 400)
+    return main.stats_sampler.history(seconds, points)
+
+
+@api.get('/metrics')
+async def metrics():
+    return PlainTextResponse(main.tracer.prometheus(), media_type='text/plain; version=0.0.4')
+
+
+@api.get('/traces')
+async def recent_traces(limit: int = 20):
+    return {'turns': main.tracer.recent(limit)}
+
+
+@api.get('/jobs/{job_id}')
+async def job_status(job_id: str):
+    job = main.vision_jobs.get(job_id) or (main.nova.images.get(job_id) if main.nova else None)
+    if not job:
+        return JSONResponse({'error': 'Unknown job'}, 404)
+    return job
+
+
+async def _read_image_upload(request):
+    """image_upload.read_image_upload() for Starlette requests. Returns (file_object, message)."""
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    check_upload_size(mimetype, int(request.headers.get('content-length') or 0))
+
+    if mimetype == 'multipart/form-data':
+        # python-multipart spools large files to disk
+        form = await request.form()
+        upload = form.get('image')
+        if not hasattr(upload, 'file'):
+            upload = next((v for v in form.values() if hasattr(v, 'file')), None)
+        if upload is None:
+            raise ValueError("No image received.")
+        return upload.file, form.get('message')
+
+    if mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+        limit = config.VISION_UPLOAD_MAX_MB * 1024 * 1024
+        spool = tempfile.SpooledTemporaryFile(max_size=config.VISION_UPLOAD_SPOOL_KB * 1024)
+        total = 0
+        async for chunk in request.stream():
+            total += len(chunk)
+            if total > limit:
+                spool.close()
+                raise UploadTooLarge(f"Image is larger than {config.VISION_UPLOAD_MAX_MB} MB")
+            spool.write(chunk)
+        if total == 0:
+            spool.close()
+            raise ValueError("No image received.")
+        spool.seek(0)
+        return spool, request.query_params.get('message')
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    return decode_json_image(data)
+
+
+def _decode_upload(upload):
+    try:
+        return prepare_image(open_image(upload))
+    finally:
+        upload.close()
+
+
+@api.post('/analyze_image')
+async def analyze_image(request: Request):
+    """Same contract as main.analyze_image (multipart, raw image/* or JSON; ?async=1 -> 202)."""
+    try:
+        upload, message = await _read_image_upload(request)
+        message = message or 'What is in this image?'
+        img = await run_in_threadpool(_decode_upload, upload)
+
+        # ?sid= is the uploading page's Socket.IO id; the result only goes to its session
+        room = main.sessions.room_for_sid(request.query_params.get('sid'))
+        if request.query_params.get('async') in ('1', 'true'):
+            job = await run_in_threadpool(main.vision_jobs.submit, message, img, room)
+            return JSONResponse(job, 202)
+
+        if not main.nova:
+            return JSONResponse({'response': "SAMi is still starting up."}, 503)
+        response = await run_in_threadpool(main.nova.process_vision, message, img)
+        if main.voice:
+            asyncio.get_running_loop().create_task(main.voice.speak_async(response, to=room))
+        return {'response': response}
+
+    except UploadTooLarge as e:
+        return JSONResponse({'error': str(e)}, 413)
+    except queue.Full as e:
+        return JSONResponse({'error': str(e)}, 429, headers={'Retry-After': '5'})
+    except ValueError as e:
+        return JSONResponse({'response': str(e)}, 400)
+    except Exception as e:
+        print(f"Image Analysis Error: {e}")
+        return JSONResponse({'error': str(e)}, 500)
+
+
+def on_vision_result(job, rooms):
+    """main.on_vision_result, speaking on the event loop instead of the command workers."""
+    for room in rooms:
+        main.ui_emitter.publish('vision_result', job, room)
+    if job.get('response') and rooms and main.voice:
+        asyncio.run_coroutine_threadsafe(main.voice.speak_async(job['response'], to=tuple(rooms)), _loop)
+
+
+# --- Socket.IO events ---
+
+@sio.on('connect')
+async def handle_connect(sid, environ, auth=None):
+    # Each session has a room, so a text turn's updates reach only the tabs/devices it came from
+    await sio.enter_room(sid, main.sessions.connect(sid, auth).id)
+    if main.stats_sampler.latest:
+        await sio.emit('system_stats', main.stats_sampler.latest, to=sid)
+
+
+@sio.on('disconnect')
+async def handle_disconnect(sid, *args):
+    main.sessions.disconnect(sid)
+
+
+@sio.on('toggle_listening')
+async def handle_toggle_listening(sid, data):
+    main.apply_listening_action((data or {}).get('action'))
+
+
+async def _speak_reply(text, turn, reply, to):
+    """main.speak_reply without blocking the event loop."""
+    if reply:
+        await run_in_threadpool(reply.finish, text)
+    elif text:
+        await main.voice.speak_async(text, turn=turn, to=to)
+
+
+@sio.on('text_command')
+async def handle_text_command(sid, data):
+    """Runs the command on the shared command workers and awaits the reply."""
+    text = (data or {}).get('text')
+    print(f"Text Input Received: {text}")
+    if not main.nova:
+        return
+    turn = main.tracer.start_turn('text')
+    session = main.sessions.for_sid(sid)
+    to = session.room
+    await sio.enter_room(sid, to) # Already in it unless connect was missed
+    reply = main.voice.reply_stream(turn=turn, to=to) if config.SPEECH_PIPELINE and main.voice else None
+    try:
+        # Language defaults to English for text; a local model's reply is spoken as it streams
+        future = main.command_executor.submit(main.nova.process, text, turn=turn, session=session,
+                                              on_delta=reply.feed if reply else None)
+    except queue.Full:
+        main.tracer.finish(turn, 'busy')
+        print("Text command rejected: command queue is full")
+        main.notify_ui('conversation', {'role': 'sami', 'text': "I'm busy with other requests. Please try again in a moment.", 'busy': True},
+                       to=sid)
+        main.notify_ui('status', {'status': 'Busy'}, to=sid)
+        return
+
+    main.notify_ui('conversation', {'role': 'user', 'text': text}, to=to)
+    main.notify_ui('status', {'status': 'Processing Text...'}, to=to)
+    try:
+        try:
+            response = await asyncio.wrap_future(future)
+        except Exception:
+            response = None
+
+        if isinstance(response, dict):
+            # Rich response (Text + Image job)
+            text_resp = response.get('text', '')
+            await _speak_reply(text_resp, turn, reply, to)
+            main.notify_ui('conversation', {'role': 'sami', 'text': text_resp, 'image': response.get('image'),
+                                            'job_id': response.get('job_id')}, to=to)
+        else:
+            await _speak_reply(response, turn, reply, to)
+    finally:
+        if reply:
+            await run_in_threadpool(reply.cancel) # Releases the speech lock if speaking failed
+    main.tracer.finish(turn, 'ok' if response else 'empty')
+    main.notify_ui('status', {'status': 'Idle'}, to=to)
+
+
+@sio.on('subscribe', namespace='/screen')
+async def handle_screen_subscribe(sid, data=None):
+    data = data or {}
+    try:
+        source = CaptureSource.from_args(data)
+        codec = negotiate_codec(data.get('format'), accepted=data.get('accept') or ['jpeg'])
+        screen_push.subscribe(sid, mode=data.get('mode', 'frame'), credits=data.get('credits'),
+                              source=source, codec=codec)
+    except (ValueError, RuntimeError) as e:
+        await sio.emit('error', {'error': str(e)}, to=sid, namespace='/screen')
+
+
+@sio.on('ack', namespace='/screen')
+async def handle_screen_ack(sid, data=None):
+    screen_push.ack(sid, int((data or {}).get('credits', 1)))
+
+
+@sio.on('unsubscribe', namespace='/screen')
+async def handle_screen_unsubscribe(sid, data=None):
+    screen_push.unsubscribe(sid)
+
+
+@sio.on('disconnect', namespace='/screen')
+async def handle_screen_disconnect(sid, *args):
+    screen_push.unsubscribe(sid)
+
+
+async def emit_system_stats():
+    """Async counterpart of main.emit_system_stats."""
+    while True:
+        try:
+            stats = await run_in_threadpool(main.collect_system_stats)
+            changes = main.stats_sampler.changes(stats)
+            if changes:
+                await sio.emit('system_stats', changes)
+            await asyncio.sleep(config.STATS_INTERVAL)
+        except Exception as e:
+            print(f"Error fetching stats: {e}")
+            await asyncio.sleep(5)
+
+
+def run(host='0.0.0.0', port=5000, voice=True):
+    global _start_voice, screen_push
+    _start_voice = voice
+    warm_shared_pool() # Before uvicorn binds its socket or any thread starts
+    main.init_services()
+    screen_push = AsyncScreenPushManager(
+        main.screen_hub,
+        emit=lambda event, data, sid: sio.emit(event, data, to=sid, namespace='/screen')
+    )
+    main.screen_push = screen_push # So system_stats reports the async subscribers
+    print(f"SAMi async server on http://{host}:{port}")
+    uvicorn.run(app, host=host, port=port, log_level='warning')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve SAMi from an asyncio event loop (ASGI).")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--no-voice', action='store_true', help="Don't start the microphone/assistant loop")
+    args = parser.parse_args()
+    run(args.host, args.port, voice=not args.no_voice)
@@ -1,4 +1,13 @@
-const socket = io();
+// A per-browser token keeps this client's conversation and modes separate (and across reloads)
+function deviceToken() {
+    let token = localStorage.getItem('sami-device');
+    if (!token) {
+        token = 'web-' + Array.from(crypto.getRandomValues(new Uint8Array(12)), b => b.toString(16).padStart(2, '0')).join('');
+        localStorage.setItem('sami-device', token);
+    }
+    return token;
+}
+const socket = io({ auth: { device: deviceToken() } });
 
 // UI Elements
 const statusText = document.getElementById('listening-status');
@@ -12,6 +21,21 @@ const modeScreenBtn = document.getElementById('mode-screen');
 const viewRobot = document.getElementById('view-robot');
 const viewScreen = document.getElementById('view-screen');
 const liveFeedImg = document.getElementById('live-feed');
+const liveCanvas = document.getElementById('live-canvas');
+// Patch a canvas with changed tiles when the browser can decode them off-thread,
+// otherwise fall back to the plain MJPEG stream.
+const useTileStream = !!(liveCanvas && window.createImageBitmap);
+// Screen frames are pushed on their own namespace with credit-based flow control
+const screenSocket = io('/screen');
+// Browsers decode every codec the server offers, so let it pick the smallest per frame
+const screenSubscription = {
+    mode: 'tiles', credits: 2, format: 'auto',
+    accept: ['jpeg', 'webp', 'webp-lossless', 'png-palette']
+};
+const FRAME_MIME = {
+    'jpeg': 'image/jpeg', 'webp': 'image/webp',
+    'webp-lossless': 'image/webp', 'png-palette': 'image/png'
+};
 
 function switchMode(mode) {
     if (mode === 'robot') {
@@ -21,13 +45,20 @@ function switchMode(mode) {
         viewScreen.style.display = 'none';
         // Stop fetching video to save bandwidth
         liveFeedImg.src = '';
+        if (useTileStream) screenSocket.emit('unsubscribe');
     } else {
         modeScreenBtn.classList.add('active');
         modeRobotBtn.classList.remove('active');
         viewScreen.style.display = 'flex';
         viewRobot.style.display = 'none';
         // Start fetching video
-        liveFeedImg.src = '/video_feed';
+        if (useTileStream) {
+            liveFeedImg.style.display = 'none';
+            liveCanvas.style.display = 'block';
+            screenSocket.emit('subscribe', screenSubscription);
+        } else {
+            liveFeedImg.src = '/video_feed';
+        }
     }
 }
 
@@ -130,12 +161,8 @@ if (uploadBtn && imageUploadInput) {
     imageUploadInput.addEventListener('change', (e) => {
         const file = e.target.files[0];
         if (file) {
-            const reader = new FileReader();
-            reader.onload = function (event) {
-                const base64Image = event.target.result;
-                sendImageForAnalysis(base64Image, "Analyze this uploaded image.");
-            };
-            reader.readAsDataURL(file);
+            // Sent as-is (multipart), no base64 round trip
+            sendImageForAnalysis(file, "Analyze this uploaded image.");
         }
     });
 }
@@ -161,12 +188,12 @@ if (cameraBtn) {
             const ctx = canvas.getContext('2d');
             ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-            const base64Image = canvas.toDataURL('image/jpeg');
-
             // Stop stream
             stream.getTracks().forEach(track => track.stop());
 
-            sendImageForAnalysis(base64Image, "What do use see in this camera view?");
+            canvas.toBlob(blob => {
+                sendImageForAnalysis(blob, "What do use see in this camera view?");
+            }, 'image/jpeg', 0.9);
 
         } catch (err) {
             addLog(`Camera Error: ${err.message}`, "system");
@@ -175,12 +202,13 @@ if (cameraBtn) {
     });
 }
 
-function sendImageForAnalysis(imageBase64, message) {
+function sendImageForAnalysis(imageBlob, message) {
     addLog("System: Sending Image to Neural Engine...", "system");
 
     // Show preview in log (optional)
     const preview = document.createElement('img');
-    preview.src = imageBase64;
+    preview.src = URL.createObjectURL(imageBlob);
+    preview.onload = () => URL.revokeObjectURL(preview.src);
     preview.style.maxWidth = "200px";
     preview.style.borderRadius = "10px";
     preview.style.marginTop = "10px";
@@ -191,19 +219,22 @@ function sendImageForAnalysis(imageBase64, message) {
     conversationLog.scrollTop = conversationLog.scrollHeight;
 
     // Send to Backend
-    fetch('/analyze_image', {
+    const form = new FormData();
+    form.append('image', imageBlob, imageBlob.name || 'image.jpg');
+    form.append('message', message);
+    // Async: the answer arrives as a 'vision_result' event
+    // sid: the result is only pushed to this page's session
+    fetch('/analyze_image?async=1&sid=' + encodeURIComponent(socket.id || ''), {
         method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-            image: imageBase64,
-            message: message
-        })
+        body: form
     })
-        .then(response => response.json())
-        .then(data => {
-            if (data.response) {
+        .then(response => response.json().then(data => ({ status: response.status, data })))
+        .then(({ status, data }) => {
+            if (status === 429) {
+                addLog("System: Vision engine is busy, try again in a moment.", "system");
+            } else if (data.job_id) {
+                pendingVisionJobs.add(data.job_id);
+            } else if (data.response) {
                 addLog(`SAMi: ${data.response}`, "sami");
             } else if (data.error) {
                 addLog(`Error: ${data.error}`, "system");
@@ -275,19 +306,25 @@ window.addEventListener('resize', () => {
 /* -------------------------------------------------------------------------- */
 
 // Helper to add log
-function addLog(text, type, imageUrl = null) {
+function addLog(text, type, imageUrl = null, jobId = null) {
     const entry = document.createElement('div');
     entry.className = `log-entry ${type}`;
     entry.textContent = text;
 
-    if (imageUrl) {
+    if (imageUrl || jobId) {
         const img = document.createElement('img');
-        img.src = imageUrl;
         img.style.maxWidth = "100%";
         img.style.borderRadius = "10px";
         img.style.marginTop = "10px";
         img.style.display = "block";
         img.alt = "Generated Image";
+        if (imageUrl) {
+            img.src = imageUrl;
+        } else {
+            // Filled in by the 'image_ready' event
+            img.dataset.jobId = jobId;
+            img.style.display = 'none';
+        }
 
         // Error Handler
         img.onerror = function () {
@@ -314,7 +351,13 @@ function addLog(text, type, imageUrl = null) {
     }
 
     conversationLog.appendChild(entry);
+    // The render may have finished before this reply was logged (e.g. while SAMi was speaking)
+    if (jobId && readyImageJobs.has(jobId)) {
+        showImageJob(readyImageJobs.get(jobId));
+        readyImageJobs.delete(jobId);
+    }
     conversationLog.scrollTop = conversationLog.scrollHeight;
+    return entry;
 }
 
 // Socket Events
@@ -341,40 +384,215 @@ socket.on('mic_state', (data) => {
     }
 });
 
-socket.on('system_stats', (data) => {
-    // Update Bars
-    const cpuBar = document.getElementById('cpu-bar');
-    const ramBar = document.getElementById('ram-bar');
-    const diskBar = document.getElementById('disk-bar');
+// After the first event, system_stats only carries fields that changed; keep the merged state
+const systemStats = {};
+const TREND_POINTS = 150;
+const cpuTrend = [];   // Whole machine
+const procTrend = [];  // SAMi itself (brain + encoder workers)
+
+function pushTrend(series, value) {
+    series.push(Math.min(100, value || 0));
+    if (series.length > TREND_POINTS) series.shift();
+}
 
-    if (cpuBar) cpuBar.style.width = data.cpu + '%';
-    if (document.getElementById('cpu-text')) document.getElementById('cpu-text').textContent = data.cpu + '%';
+function drawTrend() {
+    const canvas = document.getElementById('stats-trend');
+    if (!canvas) return;
+    const ctx = canvas.getContext('2d');
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    [[cpuTrend, 'rgba(0, 255, 255, 0.9)'], [procTrend, 'rgba(188, 19, 254, 0.9)']].forEach(([series, color]) => {
+        if (series.length < 2) return;
+        ctx.strokeStyle = color;
+        ctx.lineWidth = 1.5;
+        ctx.beginPath();
+        series.forEach((value, i) => {
+            const x = (i / (TREND_POINTS - 1)) * canvas.width;
+            const y = canvas.height - (value / 100) * canvas.height;
+            if (i === 0) ctx.moveTo(x, y); else ctx.lineTo(x, y);
+        });
+        ctx.stroke();
+    });
+}
 
-    if (ramBar) ramBar.style.width = data.ram + '%';
-    if (document.getElementById('ram-text')) document.getElementById('ram-text').textContent = data.ram + '%';
+// Fill the trend from the server's history so it isn't empty after a reload
+fetch(`/stats/history?range=${TREND_POINTS * 2}s&points=${TREND_POINTS}`)
+    .then(res => res.json())
+    .then(history => {
+        if (!history.series || cpuTrend.length) return;
+        history.series.cpu.forEach(v => pushTrend(cpuTrend, v));
+        history.series.proc_cpu.forEach(v => pushTrend(procTrend, v));
+        drawTrend();
+    })
+    .catch(() => {});
 
-    if (diskBar) diskBar.style.width = data.disk + '%';
-    if (document.getElementById('disk-text')) document.getElementById('disk-text').textContent = data.disk + '%';
+function setBar(name, value) {
+    const bar = document.getElementById(`${name}-bar`);
+    const text = document.getElementById(`${name}-text`);
+    if (bar) bar.style.width = value + '%';
+    if (text) text.textContent = value + '%';
+}
+
+socket.on('system_stats', (data) => {
+    Object.assign(systemStats, data);
+
+    // Update Bars
+    ['cpu', 'ram', 'disk'].forEach(name => {
+        if (name in data) setBar(name, data[name]);
+    });
+
+    if ('proc_cpu' in data || 'proc_rss_mb' in data) {
+        const procText = document.getElementById('proc-text');
+        if (procText) procText.textContent = `${systemStats.proc_cpu}% · ${Math.round(systemStats.proc_rss_mb)} MB`;
+    }
+    pushTrend(cpuTrend, systemStats.cpu);
+    pushTrend(procTrend, systemStats.proc_cpu);
+    drawTrend();
 
     // Update Info
-    if (document.getElementById('clock')) document.getElementById('clock').textContent = data.time;
-    if (document.getElementById('date')) document.getElementById('date').textContent = data.date;
-    if (document.getElementById('weather')) document.getElementById('weather').textContent = data.weather;
+    if ('time' in data && document.getElementById('clock')) document.getElementById('clock').textContent = data.time;
+    if ('date' in data && document.getElementById('date')) document.getElementById('date').textContent = data.date;
+    if ('weather' in data && document.getElementById('weather')) document.getElementById('weather').textContent = data.weather;
 });
 
+// Stage waterfall of the last voice/text turn (listen -> STT -> NLU -> LLM -> TTS)
+function renderTurnTrace(trace) {
+    const box = document.getElementById('turn-waterfall');
+    if (!box || !trace) return;
+    const total = Math.max(trace.total_ms, 1);
+    const totalText = document.getElementById('turn-total');
+    if (totalText) totalText.textContent = `${(trace.total_ms / 1000).toFixed(2)}s · ${trace.source}`;
+
+    box.innerHTML = '';
+    trace.spans.forEach(span => {
+        const row = document.createElement('div');
+        row.className = 'waterfall-row';
+
+        const label = document.createElement('div');
+        label.className = 'waterfall-label';
+        label.textContent = span.stage;
+
+        const track = document.createElement('div');
+        track.className = 'waterfall-track';
+        const bar = document.createElement('div');
+        bar.className = 'waterfall-bar';
+        bar.style.left = (span.start_ms / total * 100) + '%';
+        bar.style.width = (span.ms / total * 100) + '%';
+        track.appendChild(bar);
+
+        const ms = document.createElement('div');
+        ms.className = 'waterfall-ms';
+        ms.textContent = span.ms >= 1000 ? `${(span.ms / 1000).toFixed(2)}s` : `${Math.round(span.ms)}ms`;
+
+        row.append(label, track, ms);
+        box.appendChild(row);
+    });
+}
+
+socket.on('turn_trace', renderTurnTrace);
+
+fetch('/traces?limit=1')
+    .then(res => res.json())
+    .then(data => renderTurnTrace(data.turns[data.turns.length - 1]))
+    .catch(() => {});
+
+// SAMi's replies that are still streaming in, by reply_id
+const streamingReplies = {};
+
 socket.on('conversation_update', (data) => {
     if (data.role === 'user') {
         addLog(`USER: ${data.text}`, 'user');
+    } else if (data.reply_id && data.delta !== undefined) {
+        // Partial reply while the model is still generating
+        let entry = streamingReplies[data.reply_id];
+        if (!entry) {
+            entry = streamingReplies[data.reply_id] = addLog('SAMi: ', 'sami');
+        }
+        entry.textContent += data.delta;
+        conversationLog.scrollTop = conversationLog.scrollHeight;
+    } else if (data.reply_id && streamingReplies[data.reply_id]) {
+        // The complete reply replaces what was streamed
+        streamingReplies[data.reply_id].textContent = `SAMi: ${data.text}`;
+        delete streamingReplies[data.reply_id];
     } else {
-        // Check for image
-        if (data.image) {
-            addLog(`SAMi: ${data.text}`, 'sami', data.image);
+        // Check for image (or a pending image job)
+        if (data.image || data.job_id) {
+            addLog(`SAMi: ${data.text}`, 'sami', data.image, data.job_id);
         } else {
             addLog(`SAMi: ${data.text}`, 'sami');
         }
     }
 });
 
+// Image jobs that finished before their conversation entry was added (oldest first)
+const readyImageJobs = new Map();
+const READY_IMAGE_JOBS_MAX = 20;
+
+function showImageJob(job) {
+    const img = document.querySelector(`img[data-job-id="${job.job_id}"]`);
+    if (!img) return false;
+    // job.url already goes through the local proxy cache, so there is nothing to retry
+    img.dataset.retry = "true";
+    if (job.status === 'ready') {
+        img.src = job.url;
+        img.style.display = 'block';
+    } else {
+        img.onerror();
+    }
+    conversationLog.scrollTop = conversationLog.scrollHeight;
+    return true;
+}
+
+// Vision jobs this page submitted (another tab may have shared the same job)
+const pendingVisionJobs = new Set();
+
+socket.on('vision_result', (job) => {
+    if (!pendingVisionJobs.delete(job.job_id)) return;
+    if (job.status === 'done') {
+        addLog(`SAMi: ${job.response}`, "sami");
+    } else {
+        addLog(`Error: ${job.error}`, "system");
+    }
+});
+
+socket.on('image_ready', (job) => {
+    if (showImageJob(job)) return;
+    readyImageJobs.set(job.job_id, job);
+    // An entry that never shows up (e.g. the reply failed) must not pin the job forever
+    if (readyImageJobs.size > READY_IMAGE_JOBS_MAX) {
+        readyImageJobs.delete(readyImageJobs.keys().next().value);
+    }
+});
+
+// Live screen tile patches: decode every tile of a frame, then draw them together.
+// Frames are chained so a slow decode never paints an older frame over a newer one,
+// and a credit goes back to the server only once the frame is on the canvas.
+let tileDrawChain = Promise.resolve();
+screenSocket.on('connect', () => {
+    // Subscriptions don't survive a reconnect
+    if (useTileStream && viewScreen && viewScreen.style.display !== 'none') {
+        screenSocket.emit('subscribe', screenSubscription);
+    }
+});
+
+screenSocket.on('frame', (data) => {
+    if (!useTileStream) return;
+    const decodes = data.tiles.map(t =>
+        createImageBitmap(new Blob([t.data], { type: FRAME_MIME[t.format] || 'image/jpeg' })).then(bmp => [t, bmp])
+    );
+    tileDrawChain = tileDrawChain.then(() => Promise.all(decodes)).then(bitmaps => {
+        if (liveCanvas.width !== data.width || liveCanvas.height !== data.height) {
+            liveCanvas.width = data.width;
+            liveCanvas.height = data.height;
+        }
+        const liveCtx = liveCanvas.getContext('2d');
+        bitmaps.forEach(([t, bmp]) => {
+            liveCtx.drawImage(bmp, t.x, t.y, t.w, t.h);
+            bmp.close();
+        });
+    }).catch(err => console.error("Tile draw error:", err))
+      .then(() => screenSocket.emit('ack', { seq: data.seq, credits: 1 }));
+});
+
 /* -------------------------------------------------------------------------- */
 /*                            WEB SPEECH API (MOBILE MIC)                     */
 /* -------------------------------------------------------------------------- */